@@ -6,14 +6,27 @@ FastAPI backend that interfaces with all agent systems and provides REST APIs
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Optional, Any
-import requests
+from typing import List, Dict, Optional, Any, Tuple
 import os
+import sys
+import uuid
+import importlib
 from dotenv import load_dotenv
 import json
+import re
 from datetime import datetime
 import asyncio
 
+from common.llm import asi_client
+from common.llm_metrics import llm_metrics
+from common.prompts import layout, pack_memories, prefix_tracker
+from common.profiler import check_token, run_profile
+from common.watchdog import LoopWatchdog
+from common.memory_store import load_memory_file
+from common.memory_index import MemoryIndex, build_index, watch_sources
+from common.identities import agent_address
+from common.tracing import tracer
+
 # Load environment variables
 load_dotenv()
 
@@ -32,10 +45,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ASI API Configuration
-ASI_API_URL = "https://api.asi1.ai/v1/chat/completions"
-ASI_API_KEY = os.getenv("ASI_ONE_API_KEY")
-
 # Agent system ports
 AGENT_PORTS = {
     "medical": 8000,
@@ -133,57 +142,537 @@ class MemoryResponse(BaseModel):
     memories: List[Dict[str, Any]]
     count: int
 
+class ProfileRequest(BaseModel):
+    token: str
+    seconds: float = 10.0
+    interval: float = 0.005  # seconds between stack samples
+    cprofile: bool = False
+
 # ============ HELPER FUNCTIONS ============
 
-def call_asi_api(system_prompt: str, user_message: str) -> str:
-    """Call ASI API for LLM inference"""
+async def call_asi_api(system_prompt: str, user_message: str, template: str = "") -> str:
+    """Call ASI API for LLM inference (template tags the call's usage metrics)"""
     try:
-        headers = {
-            "Authorization": f"Bearer {ASI_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": "asi1-mini",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 1000
-        }
-        
-        response = requests.post(ASI_API_URL, json=payload, headers=headers)
-        response.raise_for_status()
-        
-        return response.json()["choices"][0]["message"]["content"]
+        return await asi_client.chat(layout(system_prompt, user_message),
+                                     max_tokens=1000, template=template, temperature=0.7)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"ASI API Error: {str(e)}")
 
+# Memory exports per agent type
+MEMORY_FILES = {
+    "medical": "medical/user_memories.json",
+    "legal": "law/case_memories.json",
+    "customer_support": "customer-support/customer_memories.json",
+    "education": "education/student_memories.json",
+    "financial": "financial/portfolio_memories.json"
+}
+
+# Shared read-only index written by the multi-worker launcher (see __main__)
+_memory_index: Optional[MemoryIndex] = None
+
+
+def get_memory_index() -> Optional[MemoryIndex]:
+    """Map the memory index named by MEMORY_INDEX_PATH, if there is one"""
+    global _memory_index
+    index_path = os.getenv("MEMORY_INDEX_PATH")
+    if _memory_index is None and index_path and os.path.exists(index_path):
+        _memory_index = MemoryIndex(index_path)
+    return _memory_index
+
+
 def load_memories(agent_type: str, user_id: str) -> List[Dict]:
-    """Load user memories from JSON file"""
-    memory_files = {
-        "medical": "medical/user_memories.json",
-        "legal": "law/case_memories.json",
-        "customer_support": "customer-support/customer_memories.json",
-        "education": "education/student_memories.json",
-        "financial": "financial/portfolio_memories.json"
-    }
-    
+    """Load user memories from the shared index or the JSON file"""
     try:
-        file_path = memory_files.get(agent_type)
+        index = get_memory_index()
+        if index is not None:
+            return index.lookup(agent_type, user_id)
+
+        file_path = MEMORY_FILES.get(agent_type)
         if not file_path or not os.path.exists(file_path):
             return []
         
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-            memories = data.get('memories', [])
-            # Filter by user_id if needed
-            return [m for m in memories if m.get('user_id') == user_id or m.get('patient_id') == user_id]
+        memories = load_memory_file(file_path)
+        # Filter by user_id if needed
+        return [m for m in memories if m.get('user_id') == user_id or m.get('patient_id') == user_id]
     except Exception as e:
         print(f"Error loading memories: {e}")
         return []
 
+# ============ PROMPTS AND RESPONSE PARSING ============
+# Direct mode builds its prompts and reads the completions with these helpers
+# (timed by benchmarks/microbench.py)
+LIST_MARKERS = ("1.", "2.", "3.", "4.", "5.", "-", "•")
+
+
+def format_memory_context(memories: List[Dict], domain: str, query: str = "") -> str:
+    """Bullet list of the most valuable memories' context that fits the domain's token budget"""
+    return pack_memories(memories, domain, query=query, line=lambda m: f"- {m.get('context', '')}").text
+
+
+# System prompts hold only static instructions, so they are byte-identical on
+# every call and cacheable by the provider; everything per request goes into
+# the user message after them (see common/prompts.py)
+MEDICAL_SYSTEM_PROMPT = """You are an expert AI medical consultant. Provide professional medical advice.
+
+Consider the patient's history from memory, symptoms, medical history, and urgency level.
+Provide diagnosis, recommendations, and determine if follow-up is required.
+
+Please provide:
+1. Preliminary diagnosis
+2. Recommendations (as a numbered list)
+3. Whether follow-up is required (Yes/No)
+4. Urgency assessment"""
+
+LEGAL_SYSTEM_PROMPT = """You are an expert AI legal consultant. Provide professional legal advice.
+
+Consider the client's case history, the case description, legal history, and case type.
+Provide legal analysis, recommendations, and next steps.
+
+Please provide:
+1. Legal analysis
+2. Recommendations
+3. Next steps
+4. Whether in-person consultation is required"""
+
+SUPPORT_SYSTEM_PROMPT = """You are an expert AI customer support agent. Provide helpful solutions.
+
+Consider the customer's history.
+Analyze the issue and provide solutions, recommendations, and estimate resolution time.
+
+Please provide:
+1. Solution
+2. Recommendations
+3. Whether escalation is needed
+4. Estimated resolution time"""
+
+EDUCATION_SYSTEM_PROMPT = """You are an expert AI tutor. Provide clear, educational explanations.
+
+Consider the student's learning history.
+Adapt your teaching to the student's level and provide examples and practice problems.
+
+Please provide:
+1. Clear explanation
+2. Examples (with steps)
+3. Practice problems
+4. Additional resources"""
+
+FINANCIAL_SYSTEM_PROMPT = """You are an expert AI financial advisor. Provide professional investment advice.
+
+Consider the investor's history.
+Analyze the portfolio, risk tolerance, and provide recommendations.
+
+Please provide:
+1. Financial analysis
+2. Recommendations
+3. Risk assessment
+4. Suggested actions"""
+
+
+def medical_prompts(request: MedicalConsultationRequest, memories: List[Dict]) -> Tuple[str, str]:
+    """System prompt and user message of a direct-mode medical consultation"""
+    memory_context = format_memory_context(memories, "medical", request.symptoms)
+
+    user_message = f"""Patient History from Memory:
+{memory_context if memory_context else "No previous medical history available"}
+
+Patient ID: {request.patient_id}
+Symptoms: {request.symptoms}
+Medical History: {request.medical_history}
+Urgency Level: {request.urgency_level}"""
+    return MEDICAL_SYSTEM_PROMPT, user_message
+
+
+def legal_prompts(request: LegalConsultationRequest, memories: List[Dict]) -> Tuple[str, str]:
+    """System prompt and user message of a direct-mode legal consultation"""
+    memory_context = format_memory_context(memories, "legal", request.case_description)
+
+    user_message = f"""Client Case History:
+{memory_context if memory_context else "No previous case history available"}
+
+Client ID: {request.client_id}
+Case Description: {request.case_description}
+Legal History: {request.legal_history}
+Case Type: {request.case_type}
+Urgency: {request.urgency_level}"""
+    return LEGAL_SYSTEM_PROMPT, user_message
+
+
+def support_prompts(request: SupportTicketRequest, memories: List[Dict]) -> Tuple[str, str]:
+    """System prompt and user message of a direct-mode support ticket"""
+    memory_context = format_memory_context(memories, "support", request.issue_description)
+
+    user_message = f"""Customer History:
+{memory_context if memory_context else "No previous support history available"}
+
+Customer ID: {request.customer_id}
+Issue: {request.issue_description}
+History: {request.ticket_history}
+Priority: {request.priority}
+Category: {request.category}"""
+    return SUPPORT_SYSTEM_PROMPT, user_message
+
+
+def education_topic(request: EducationRequest) -> str:
+    """Topic of a tutoring request in both modes: the question's first sentence (8 words at most), else the subject"""
+    first_sentence = re.split(r"[.?!]", request.question, maxsplit=1)[0]
+    return " ".join(first_sentence.split()[:8]) or request.subject
+
+
+def education_prompts(request: EducationRequest, memories: List[Dict]) -> Tuple[str, str]:
+    """System prompt and user message of a direct-mode tutoring request"""
+    memory_context = format_memory_context(memories, "education", request.question)
+
+    user_message = f"""Student Learning History:
+{memory_context if memory_context else "No previous learning history available"}
+
+Student ID: {request.student_id}
+Question: {request.question}
+Topic: {education_topic(request)}
+Subject: {request.subject}
+Level: {request.learning_level}
+History: {request.learning_history}"""
+    return EDUCATION_SYSTEM_PROMPT, user_message
+
+
+def financial_prompts(request: FinancialAdvisoryRequest, memories: List[Dict]) -> Tuple[str, str]:
+    """System prompt and user message of a direct-mode financial advisory"""
+    memory_context = format_memory_context(memories, "financial", request.query)
+
+    portfolio_str = json.dumps(request.portfolio, indent=2) if request.portfolio else "No portfolio provided"
+
+    user_message = f"""Investor History:
+{memory_context if memory_context else "No previous investment history available"}
+
+Investor ID: {request.investor_id}
+Query: {request.query}
+Portfolio: {portfolio_str}
+Risk Tolerance: {request.risk_tolerance}
+History: {request.investment_history}"""
+    return FINANCIAL_SYSTEM_PROMPT, user_message
+
+
+def parse_list_item(line: str) -> str:
+    return line.lstrip("12345.-• ")
+
+
+def parse_medical_response(response: str, urgency_level: str) -> Dict[str, Any]:
+    """Diagnosis, recommendations, follow-up and urgency from a medical completion"""
+    lines = response.strip().split('\n')
+    diagnosis = ""
+    recommendations = []
+    follow_up = False
+    urgency = urgency_level
+
+    current_section = ""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if "diagnosis" in line.lower() and ":" in line:
+            current_section = "diagnosis"
+            diagnosis = line.split(":", 1)[1].strip() if ":" in line else line
+        elif "recommendation" in line.lower() and ":" in line:
+            current_section = "recommendations"
+        elif "follow" in line.lower() and ":" in line:
+            follow_up = "yes" in line.lower()
+        elif "urgency" in line.lower() and ":" in line:
+            urgency = line.split(":", 1)[1].strip()
+        elif line.startswith(LIST_MARKERS):
+            recommendations.append(parse_list_item(line))
+
+    if not diagnosis:
+        diagnosis = response[:200]
+
+    return {
+        "diagnosis": diagnosis,
+        "recommendations": recommendations if recommendations else ["General care recommended"],
+        "follow_up_required": follow_up,
+        "urgency_assessment": urgency,
+    }
+
+
+def parse_legal_response(response: str, urgency_level: str) -> Dict[str, Any]:
+    """Analysis, recommendations and next steps from a legal completion"""
+    analysis = response[:300]
+    recommendations = []
+    next_steps = []
+    consultation_required = "consultation required" in response.lower()
+
+    lines = response.strip().split('\n')
+    current_section = ""
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if "analysis" in line.lower():
+            current_section = "analysis"
+        elif "recommendation" in line.lower():
+            current_section = "recommendations"
+        elif "next step" in line.lower() or "action" in line.lower():
+            current_section = "next_steps"
+        elif line.startswith(LIST_MARKERS):
+            clean_line = parse_list_item(line)
+            if current_section == "recommendations":
+                recommendations.append(clean_line)
+            elif current_section == "next_steps":
+                next_steps.append(clean_line)
+
+    return {
+        "legal_analysis": analysis,
+        "recommendations": recommendations if recommendations else ["Seek legal counsel"],
+        "next_steps": next_steps if next_steps else ["Schedule consultation"],
+        "consultation_required": consultation_required,
+        "urgency_assessment": urgency_level,
+    }
+
+
+def parse_support_response(response: str) -> Dict[str, Any]:
+    """Solution, recommendations, escalation and resolution time from a support completion"""
+    solution = response[:300]
+    recommendations = []
+    escalation = "escalat" in response.lower()
+    resolution_time = "24-48 hours"
+
+    lines = response.strip().split('\n')
+    for line in lines:
+        line = line.strip()
+        if line.startswith(LIST_MARKERS):
+            recommendations.append(parse_list_item(line))
+        if "hour" in line.lower() or "day" in line.lower():
+            resolution_time = line
+
+    return {
+        "solution": solution,
+        "recommendations": recommendations if recommendations else ["Follow standard procedure"],
+        "escalation_required": escalation,
+        "estimated_resolution_time": resolution_time,
+    }
+
+
+def parse_education_response(response: str) -> Dict[str, Any]:
+    """Explanation, examples, practice problems and resources from a tutoring completion"""
+    explanation = response[:400]
+    examples = []
+    practice_problems = []
+    resources = []
+
+    lines = response.strip().split('\n')
+    current_section = ""
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if "example" in line.lower():
+            current_section = "examples"
+        elif "practice" in line.lower() or "problem" in line.lower():
+            current_section = "practice"
+        elif "resource" in line.lower() or "reference" in line.lower():
+            current_section = "resources"
+        elif line.startswith(LIST_MARKERS):
+            clean_line = parse_list_item(line)
+            if current_section == "examples":
+                examples.append(clean_line)
+            elif current_section == "practice":
+                practice_problems.append(clean_line)
+            elif current_section == "resources":
+                resources.append(clean_line)
+
+    return {
+        "explanation": explanation,
+        "examples": examples if examples else ["Example: See explanation above"],
+        "practice_problems": practice_problems if practice_problems else ["Try solving similar problems"],
+        "additional_resources": resources if resources else ["Refer to textbook"],
+    }
+
+
+def parse_financial_response(response: str, risk_tolerance: str) -> Dict[str, Any]:
+    """Analysis, recommendations, risk assessment and actions from a financial completion"""
+    analysis = response[:300]
+    recommendations = []
+    risk_assessment = f"{risk_tolerance} risk profile"
+    suggested_actions = []
+
+    lines = response.strip().split('\n')
+    current_section = ""
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if "recommendation" in line.lower():
+            current_section = "recommendations"
+        elif "risk" in line.lower():
+            current_section = "risk"
+            if ":" in line:
+                risk_assessment = line.split(":", 1)[1].strip()
+        elif "action" in line.lower() or "step" in line.lower():
+            current_section = "actions"
+        elif line.startswith(LIST_MARKERS):
+            clean_line = parse_list_item(line)
+            if current_section == "recommendations":
+                recommendations.append(clean_line)
+            elif current_section == "actions":
+                suggested_actions.append(clean_line)
+
+    return {
+        "analysis": analysis,
+        "recommendations": recommendations if recommendations else ["Diversify portfolio"],
+        "risk_assessment": risk_assessment,
+        "suggested_actions": suggested_actions if suggested_actions else ["Review portfolio quarterly"],
+    }
+
+# ============ AGENT GATEWAY ============
+# With API_MODE=gateway consultations are answered by the running agent
+# Bureaus (see AGENT_PORTS) instead of the server's own prompts.
+GATEWAY_MODE = os.getenv("API_MODE", "direct").lower() == "gateway"
+AGENT_HOST = os.getenv("AGENT_HOST", "127.0.0.1")
+
+# Agent type -> (directory, module with the agent's messages, name of its seed constant)
+GATEWAY_AGENTS = {
+    "medical": ("medical", "medical_messages", "DOCTOR_AGENT_SEED"),
+    "legal": ("law", "legal_messages", "LAWYER_AGENT_SEED"),
+    "customer_support": ("customer-support", "support_messages", "SUPPORT_AGENT_SEED"),
+    "education": ("education", "tutoring_messages", "TUTOR_AGENT_SEED"),
+    "financial": ("financial", "financial_messages", "ADVISOR_AGENT_SEED")
+}
+
+# Created on first use; direct mode never imports the agent stack
+_gateway = None
+
+
+def agent_module(agent_type: str):
+    """Import the module holding an agent type's message models (gateway mode only)"""
+    directory, module, _ = GATEWAY_AGENTS[agent_type]
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), directory)
+    if path not in sys.path:
+        sys.path.append(path)
+    return importlib.import_module(module)
+
+
+def get_gateway():
+    """Create the gateway and route every agent type to its Bureau"""
+    global _gateway
+    if _gateway is None:
+        from common.gateway import AgentGateway
+        _gateway = AgentGateway()
+        for agent_type, (_, _, seed_name) in GATEWAY_AGENTS.items():
+            # Addresses come from the identity cache, no agent is constructed here
+            address = agent_address(getattr(agent_module(agent_type), seed_name))
+            endpoint = os.getenv(f"{agent_type.upper()}_AGENT_ENDPOINT",
+                                 f"http://{AGENT_HOST}:{AGENT_PORTS[agent_type]}/submit")
+            _gateway.register(agent_type, address, endpoint)
+    return _gateway
+
+
+async def ask_agent(agent_type: str, message, reply_model):
+    """Send a protocol message through the gateway and map failures to HTTP errors"""
+    from common.gateway import GatewayError, GatewayTimeout
+    from common.scheduling import ServiceBusy
+    # Root span of the consultation; agents whose messages carry a
+    # traceparent continue the trace (see common/tracing.py)
+    with tracer.span(f"gateway {agent_type}", "api_server", agent_type=agent_type) as span:
+        if hasattr(message, "traceparent") and span.sampled:
+            message.traceparent = span.traceparent
+        try:
+            reply = await get_gateway().request(agent_type, message, (reply_model, ServiceBusy))
+        except GatewayTimeout as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except GatewayError as e:
+            raise HTTPException(status_code=502, detail=str(e))
+        span.set(reply=type(reply).__name__)
+    if isinstance(reply, ServiceBusy):
+        raise HTTPException(status_code=503, detail=reply.reason,
+                            headers={"Retry-After": str(int(reply.retry_after + 0.999))})
+    return reply
+
+
+async def medical_via_gateway(request: MedicalConsultationRequest) -> MedicalConsultationResponse:
+    agents = agent_module("medical")
+    advice = await ask_agent("medical", agents.MedicalQuery(
+        patient_id=request.patient_id,
+        symptoms=request.symptoms,
+        medical_history=request.medical_history or "",
+        urgency_level=request.urgency_level or "normal"
+    ), agents.MedicalAdvice)
+    return MedicalConsultationResponse(**advice.model_dump(), timestamp=datetime.now().isoformat())
+
+
+async def legal_via_gateway(request: LegalConsultationRequest) -> LegalConsultationResponse:
+    agents = agent_module("legal")
+    advice = await ask_agent("legal", agents.LegalQuery(
+        client_id=request.client_id,
+        case_description=request.case_description,
+        legal_history=request.legal_history or "",
+        case_type=request.case_type or "general",
+        urgency_level=request.urgency_level or "normal"
+    ), agents.LegalAdvice)
+    return LegalConsultationResponse(**advice.model_dump(), timestamp=datetime.now().isoformat())
+
+
+async def support_via_gateway(request: SupportTicketRequest) -> SupportTicketResponse:
+    agents = agent_module("customer_support")
+    response = await ask_agent("customer_support", agents.SupportTicket(
+        customer_id=request.customer_id,
+        ticket_id=f"TKT-{uuid.uuid4().hex[:8].upper()}",
+        issue_description=request.issue_description,
+        customer_history=request.ticket_history or "",
+        category=request.category or "general",
+        priority=request.priority or "normal"
+    ), agents.SupportResponse)
+    return SupportTicketResponse(
+        customer_id=response.customer_id,
+        ticket_id=response.ticket_id,
+        solution=response.solution,
+        recommendations=response.suggestions,
+        escalation_required=response.escalation_required,
+        estimated_resolution_time=response.estimated_resolution_time,
+        timestamp=datetime.now().isoformat()
+    )
+
+
+async def education_via_gateway(request: EducationRequest) -> EducationResponse:
+    agents = agent_module("education")
+    response = await ask_agent("education", agents.LearningQuery(
+        student_id=request.student_id,
+        subject=request.subject,
+        topic=education_topic(request),
+        question=request.question,
+        learning_history=request.learning_history or "",
+        difficulty_level=request.learning_level or "intermediate"
+    ), agents.TutoringResponse)
+    return EducationResponse(
+        student_id=response.student_id,
+        explanation=response.explanation,
+        examples=response.examples,
+        practice_problems=response.practice_problems,
+        additional_resources=response.additional_resources,
+        timestamp=datetime.now().isoformat()
+    )
+
+
+async def financial_via_gateway(request: FinancialAdvisoryRequest) -> FinancialAdvisoryResponse:
+    agents = agent_module("financial")
+    history = request.investment_history or ""
+    if request.portfolio:
+        history = f"{history}\nPortfolio: {json.dumps(request.portfolio)}".strip()
+    advice = await ask_agent("financial", agents.FinancialQuery(
+        client_id=request.investor_id,
+        query_type="general",
+        question=request.query,
+        financial_history=history,
+        risk_tolerance=request.risk_tolerance or "moderate"
+    ), agents.FinancialAdvice)
+    return FinancialAdvisoryResponse(
+        investor_id=advice.client_id,
+        analysis=advice.analysis,
+        recommendations=advice.recommendations,
+        risk_assessment=advice.risk_assessment,
+        suggested_actions=advice.action_items,
+        timestamp=datetime.now().isoformat()
+    )
+
 # ============ API ENDPOINTS ============
 
 @app.get("/")
@@ -200,70 +689,43 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.get("/metrics/llm")
+async def llm_usage_metrics():
+    """Token, latency and finish reason histograms, prompt-prefix reuse and adaptive max_tokens of this worker's ASI calls, per template"""
+    return {**llm_metrics.snapshot(), "prefixes": prefix_tracker.snapshot(), "limits": asi_client.limits.snapshot()}
+
+@app.get("/debug/loop")
+async def debug_loop():
+    """Event-loop lag histogram and the call sites that blocked this worker's loop"""
+    return loop_watchdog.report()
+
+@app.post("/debug/profile")
+async def debug_profile(request: ProfileRequest):
+    """Sampling profile of this worker's event loop (collapsed stacks, optional cProfile summary)"""
+    refused = check_token(request.token)
+    if refused:
+        raise HTTPException(status_code=403, detail=refused)
+    try:
+        return await run_profile(request.seconds, request.interval, request.cprofile)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 # ============ MEDICAL AGENT ENDPOINTS ============
 
 @app.post("/api/medical/consult", response_model=MedicalConsultationResponse)
 async def medical_consultation(request: MedicalConsultationRequest):
     """Get medical consultation"""
+    if GATEWAY_MODE:
+        return await medical_via_gateway(request)
     try:
         # Load patient memories
         memories = load_memories("medical", request.patient_id)
-        memory_context = "\n".join([f"- {m.get('context', '')}" for m in memories[:5]])
-        
-        system_prompt = f"""You are an expert AI medical consultant. Provide professional medical advice.
-        
-Patient History from Memory:
-{memory_context if memory_context else "No previous medical history available"}
-
-Consider the patient's symptoms, medical history, and urgency level.
-Provide diagnosis, recommendations, and determine if follow-up is required."""
-
-        user_message = f"""Patient ID: {request.patient_id}
-Symptoms: {request.symptoms}
-Medical History: {request.medical_history}
-Urgency Level: {request.urgency_level}
-
-Please provide:
-1. Preliminary diagnosis
-2. Recommendations (as a numbered list)
-3. Whether follow-up is required (Yes/No)
-4. Urgency assessment"""
-
-        response = call_asi_api(system_prompt, user_message)
-        
-        # Parse response
-        lines = response.strip().split('\n')
-        diagnosis = ""
-        recommendations = []
-        follow_up = False
-        urgency = request.urgency_level
-        
-        current_section = ""
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            if "diagnosis" in line.lower() and ":" in line:
-                current_section = "diagnosis"
-                diagnosis = line.split(":", 1)[1].strip() if ":" in line else line
-            elif "recommendation" in line.lower() and ":" in line:
-                current_section = "recommendations"
-            elif "follow" in line.lower() and ":" in line:
-                follow_up = "yes" in line.lower()
-            elif "urgency" in line.lower() and ":" in line:
-                urgency = line.split(":", 1)[1].strip()
-            elif line.startswith(("1.", "2.", "3.", "4.", "5.", "-", "•")):
-                recommendations.append(line.lstrip("12345.-• "))
-        
-        if not diagnosis:
-            diagnosis = response[:200]
+        system_prompt, user_message = medical_prompts(request, memories)
+        response = await call_asi_api(system_prompt, user_message, "medical.api")
         
         return MedicalConsultationResponse(
             patient_id=request.patient_id,
-            diagnosis=diagnosis,
-            recommendations=recommendations if recommendations else ["General care recommended"],
-            follow_up_required=follow_up,
-            urgency_assessment=urgency,
+            **parse_medical_response(response, request.urgency_level),
             timestamp=datetime.now().isoformat()
         )
     except Exception as e:
@@ -284,65 +746,16 @@ async def get_medical_memories(request: MemoryRequest):
 @app.post("/api/legal/consult", response_model=LegalConsultationResponse)
 async def legal_consultation(request: LegalConsultationRequest):
     """Get legal consultation"""
+    if GATEWAY_MODE:
+        return await legal_via_gateway(request)
     try:
         memories = load_memories("legal", request.client_id)
-        memory_context = "\n".join([f"- {m.get('context', '')}" for m in memories[:5]])
-        
-        system_prompt = f"""You are an expert AI legal consultant. Provide professional legal advice.
-
-Client Case History:
-{memory_context if memory_context else "No previous case history available"}
-
-Consider the case description, legal history, and case type.
-Provide legal analysis, recommendations, and next steps."""
-
-        user_message = f"""Client ID: {request.client_id}
-Case Description: {request.case_description}
-Legal History: {request.legal_history}
-Case Type: {request.case_type}
-Urgency: {request.urgency_level}
-
-Please provide:
-1. Legal analysis
-2. Recommendations
-3. Next steps
-4. Whether in-person consultation is required"""
-
-        response = call_asi_api(system_prompt, user_message)
-        
-        # Parse response
-        analysis = response[:300]
-        recommendations = []
-        next_steps = []
-        consultation_required = "consultation required" in response.lower()
-        
-        lines = response.strip().split('\n')
-        current_section = ""
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            if "analysis" in line.lower():
-                current_section = "analysis"
-            elif "recommendation" in line.lower():
-                current_section = "recommendations"
-            elif "next step" in line.lower() or "action" in line.lower():
-                current_section = "next_steps"
-            elif line.startswith(("1.", "2.", "3.", "4.", "5.", "-", "•")):
-                clean_line = line.lstrip("12345.-• ")
-                if current_section == "recommendations":
-                    recommendations.append(clean_line)
-                elif current_section == "next_steps":
-                    next_steps.append(clean_line)
+        system_prompt, user_message = legal_prompts(request, memories)
+        response = await call_asi_api(system_prompt, user_message, "legal.api")
         
         return LegalConsultationResponse(
             client_id=request.client_id,
-            legal_analysis=analysis,
-            recommendations=recommendations if recommendations else ["Seek legal counsel"],
-            next_steps=next_steps if next_steps else ["Schedule consultation"],
-            consultation_required=consultation_required,
-            urgency_assessment=request.urgency_level,
+            **parse_legal_response(response, request.urgency_level),
             timestamp=datetime.now().isoformat()
         )
     except Exception as e:
@@ -363,55 +776,17 @@ async def get_legal_memories(request: MemoryRequest):
 @app.post("/api/support/ticket", response_model=SupportTicketResponse)
 async def create_support_ticket(request: SupportTicketRequest):
     """Create and resolve support ticket"""
+    if GATEWAY_MODE:
+        return await support_via_gateway(request)
     try:
         memories = load_memories("customer_support", request.customer_id)
-        memory_context = "\n".join([f"- {m.get('context', '')}" for m in memories[:5]])
-        
-        system_prompt = f"""You are an expert AI customer support agent. Provide helpful solutions.
-
-Customer History:
-{memory_context if memory_context else "No previous support history available"}
-
-Analyze the issue and provide solutions, recommendations, and estimate resolution time."""
-
-        user_message = f"""Customer ID: {request.customer_id}
-Issue: {request.issue_description}
-History: {request.ticket_history}
-Priority: {request.priority}
-Category: {request.category}
-
-Please provide:
-1. Solution
-2. Recommendations
-3. Whether escalation is needed
-4. Estimated resolution time"""
-
-        response = call_asi_api(system_prompt, user_message)
-        
-        # Parse response
-        solution = response[:300]
-        recommendations = []
-        escalation = "escalat" in response.lower()
-        resolution_time = "24-48 hours"
-        
-        lines = response.strip().split('\n')
-        for line in lines:
-            line = line.strip()
-            if line.startswith(("1.", "2.", "3.", "4.", "5.", "-", "•")):
-                recommendations.append(line.lstrip("12345.-• "))
-            if "hour" in line.lower() or "day" in line.lower():
-                resolution_time = line
-        
-        import uuid
-        ticket_id = f"TKT-{uuid.uuid4().hex[:8].upper()}"
+        system_prompt, user_message = support_prompts(request, memories)
+        response = await call_asi_api(system_prompt, user_message, "support.api")
         
         return SupportTicketResponse(
             customer_id=request.customer_id,
-            ticket_id=ticket_id,
-            solution=solution,
-            recommendations=recommendations if recommendations else ["Follow standard procedure"],
-            escalation_required=escalation,
-            estimated_resolution_time=resolution_time,
+            ticket_id=f"TKT-{uuid.uuid4().hex[:8].upper()}",
+            **parse_support_response(response),
             timestamp=datetime.now().isoformat()
         )
     except Exception as e:
@@ -432,65 +807,16 @@ async def get_support_memories(request: MemoryRequest):
 @app.post("/api/education/tutor", response_model=EducationResponse)
 async def education_tutoring(request: EducationRequest):
     """Get educational tutoring"""
+    if GATEWAY_MODE:
+        return await education_via_gateway(request)
     try:
         memories = load_memories("education", request.student_id)
-        memory_context = "\n".join([f"- {m.get('context', '')}" for m in memories[:5]])
-        
-        system_prompt = f"""You are an expert AI tutor. Provide clear, educational explanations.
-
-Student Learning History:
-{memory_context if memory_context else "No previous learning history available"}
-
-Adapt your teaching to the student's level and provide examples and practice problems."""
-
-        user_message = f"""Student ID: {request.student_id}
-Question: {request.question}
-Subject: {request.subject}
-Level: {request.learning_level}
-History: {request.learning_history}
-
-Please provide:
-1. Clear explanation
-2. Examples (with steps)
-3. Practice problems
-4. Additional resources"""
-
-        response = call_asi_api(system_prompt, user_message)
-        
-        # Parse response
-        explanation = response[:400]
-        examples = []
-        practice_problems = []
-        resources = []
-        
-        lines = response.strip().split('\n')
-        current_section = ""
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            if "example" in line.lower():
-                current_section = "examples"
-            elif "practice" in line.lower() or "problem" in line.lower():
-                current_section = "practice"
-            elif "resource" in line.lower() or "reference" in line.lower():
-                current_section = "resources"
-            elif line.startswith(("1.", "2.", "3.", "4.", "5.", "-", "•")):
-                clean_line = line.lstrip("12345.-• ")
-                if current_section == "examples":
-                    examples.append(clean_line)
-                elif current_section == "practice":
-                    practice_problems.append(clean_line)
-                elif current_section == "resources":
-                    resources.append(clean_line)
+        system_prompt, user_message = education_prompts(request, memories)
+        response = await call_asi_api(system_prompt, user_message, "education.api")
         
         return EducationResponse(
             student_id=request.student_id,
-            explanation=explanation,
-            examples=examples if examples else ["Example: See explanation above"],
-            practice_problems=practice_problems if practice_problems else ["Try solving similar problems"],
-            additional_resources=resources if resources else ["Refer to textbook"],
+            **parse_education_response(response),
             timestamp=datetime.now().isoformat()
         )
     except Exception as e:
@@ -511,67 +837,16 @@ async def get_education_memories(request: MemoryRequest):
 @app.post("/api/financial/advise", response_model=FinancialAdvisoryResponse)
 async def financial_advisory(request: FinancialAdvisoryRequest):
     """Get financial advisory"""
+    if GATEWAY_MODE:
+        return await financial_via_gateway(request)
     try:
         memories = load_memories("financial", request.investor_id)
-        memory_context = "\n".join([f"- {m.get('context', '')}" for m in memories[:5]])
-        
-        portfolio_str = json.dumps(request.portfolio, indent=2) if request.portfolio else "No portfolio provided"
-        
-        system_prompt = f"""You are an expert AI financial advisor. Provide professional investment advice.
-
-Investor History:
-{memory_context if memory_context else "No previous investment history available"}
-
-Analyze the portfolio, risk tolerance, and provide recommendations."""
-
-        user_message = f"""Investor ID: {request.investor_id}
-Query: {request.query}
-Portfolio: {portfolio_str}
-Risk Tolerance: {request.risk_tolerance}
-History: {request.investment_history}
-
-Please provide:
-1. Financial analysis
-2. Recommendations
-3. Risk assessment
-4. Suggested actions"""
-
-        response = call_asi_api(system_prompt, user_message)
-        
-        # Parse response
-        analysis = response[:300]
-        recommendations = []
-        risk_assessment = f"{request.risk_tolerance} risk profile"
-        suggested_actions = []
-        
-        lines = response.strip().split('\n')
-        current_section = ""
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            if "recommendation" in line.lower():
-                current_section = "recommendations"
-            elif "risk" in line.lower():
-                current_section = "risk"
-                if ":" in line:
-                    risk_assessment = line.split(":", 1)[1].strip()
-            elif "action" in line.lower() or "step" in line.lower():
-                current_section = "actions"
-            elif line.startswith(("1.", "2.", "3.", "4.", "5.", "-", "•")):
-                clean_line = line.lstrip("12345.-• ")
-                if current_section == "recommendations":
-                    recommendations.append(clean_line)
-                elif current_section == "actions":
-                    suggested_actions.append(clean_line)
+        system_prompt, user_message = financial_prompts(request, memories)
+        response = await call_asi_api(system_prompt, user_message, "financial.api")
         
         return FinancialAdvisoryResponse(
             investor_id=request.investor_id,
-            analysis=analysis,
-            recommendations=recommendations if recommendations else ["Diversify portfolio"],
-            risk_assessment=risk_assessment,
-            suggested_actions=suggested_actions if suggested_actions else ["Review portfolio quarterly"],
+            **parse_financial_response(response, request.risk_tolerance),
             timestamp=datetime.now().isoformat()
         )
     except Exception as e:
@@ -587,6 +862,40 @@ async def get_financial_memories(request: MemoryRequest):
         count=len(memories)
     )
 
+# Watches this worker's event loop for blocking calls (common/watchdog.py)
+loop_watchdog = LoopWatchdog()
+
+@app.on_event("startup")
+async def start_loop_watchdog():
+    loop_watchdog.start()
+    if GATEWAY_MODE:
+        # Importing the agent stack blocks the loop for a few hundred ms (the
+        # watchdog's first finding); pay for it before the first request
+        get_gateway()
+
+@app.on_event("shutdown")
+async def close_asi_client():
+    await asi_client.close()
+    if _gateway is not None:
+        await _gateway.close()
+    if _memory_index is not None:
+        _memory_index.close()
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+
+    # API_WORKERS > 1 runs several worker processes; this process then builds
+    # one memory index that every worker maps read-only instead of each
+    # worker parsing its own copy of the memory files.
+    workers = int(os.getenv("API_WORKERS", "1"))
+    if workers > 1:
+        index_path = os.getenv("MEMORY_INDEX_PATH", os.path.join("data", "memory_index.bin"))
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        stats = build_index(MEMORY_FILES, index_path)
+        print(f"💾 Memory index {index_path}: {stats['entries']} users, {stats['bytes']} bytes")
+        os.environ["MEMORY_INDEX_PATH"] = index_path  # inherited by the workers
+        watch_sources(MEMORY_FILES, index_path, float(os.getenv("MEMORY_INDEX_REFRESH", "5")))
+        uvicorn.run("api_server:app", host="0.0.0.0", port=8080, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8080)
@@ -0,0 +1,385 @@
+"""
+Fake ASI Server - local stand-in for the ASI chat completions API
+Implements POST /v1/chat/completions (plain and streamed as server-sent
+events) with configurable latency, failure injection and canned or
+templated outputs per domain, so benchmarks and CI run offline and
+reproducibly. Point the agents and the API server at it with:
+
+    ASI_API_URL=http://127.0.0.1:9999/v1/chat/completions ASI_ONE_API_KEY=offline
+
+Behaviour:
+    - Domain (medical, legal, support, education, financial) is detected
+      from the prompt; replies use that domain's templates, or --responses
+      (JSON: {"<domain>": {"text": [...], "list": [...]}}).
+    - Prompts asking for a JSON object get one shaped like the example in
+      the prompt; prompts asking for a list get a numbered list.
+    - Reply length follows --length (tokens are words here) and is cut at
+      max_tokens with finish_reason "length".
+    - Latency = time to first token (--latency) + per-token time (--token-delay).
+    - --error-rate answers 500, --throttle-rate answers 429, and --rpm
+      enforces a requests-per-minute budget with real 429s and Retry-After.
+    - With --seed, each request's draws depend only on the seed and the
+      request body, so repeated runs see the same outputs and latencies.
+    - Like a provider prefix cache, a request whose messages before the last
+      one were sent before reports those tokens as
+      usage.prompt_tokens_details.cached_tokens.
+
+Distributions are written "fixed:0.2", "uniform:0.1,0.5", "normal:0.5,0.1"
+or "lognormal:<median>,<sigma>".
+
+Usage:
+    python benchmarks/fake_asi_server.py [--port 9999] [--latency lognormal:0.4,0.5] [--token-delay 0.005]
+        [--length normal:120,40] [--error-rate 0.01] [--throttle-rate 0.02] [--rpm 600] [--seed 7]
+
+GET /stats reports request, error, 429 and cached prompt token counts.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional
+
+from aiohttp import web
+
+# Prompt keywords identifying each domain
+DOMAIN_KEYWORDS = {
+    "medical": ("medical", "symptom", "patient", "diagnos"),
+    "legal": ("legal", "lawyer", "attorney", "case"),
+    "support": ("support", "customer", "ticket"),
+    "education": ("tutor", "student", "learning", "explain"),
+    "financial": ("financial", "invest", "portfolio", "retirement"),
+}
+
+# Canned outputs per domain; {topic} is filled with words from the prompt
+TEMPLATES = {
+    "medical": {
+        "text": ["The symptoms described are consistent with {topic}.",
+                 "This is a preliminary assessment and not a diagnosis.",
+                 "Monitor the symptoms closely over the next 48 hours.",
+                 "Seek in-person care if they worsen or new symptoms appear."],
+        "list": ["Rest and stay hydrated", "Monitor temperature twice a day",
+                 "Avoid known allergens and conflicting medications", "Consult a healthcare provider if symptoms persist"],
+    },
+    "legal": {
+        "text": ["Based on the facts provided, this matter concerns {topic}.",
+                 "The applicable rules depend on the jurisdiction and the documents involved.",
+                 "Deadlines may apply, so the situation should be reviewed promptly.",
+                 "This is general information, not legal advice."],
+        "list": ["Gather all relevant documents and correspondence", "Note every deadline mentioned in the notices",
+                 "Avoid signing anything before a review", "Consult a qualified attorney in your jurisdiction"],
+    },
+    "support": {
+        "text": ["Thanks for reaching out about {topic}.",
+                 "We have reviewed your account and identified the likely cause.",
+                 "The steps below should resolve the issue within one business day.",
+                 "Reply to this ticket if the problem continues."],
+        "list": ["Sign out and sign back in", "Clear the application cache",
+                 "Check the billing history for duplicate entries", "Contact support with the ticket number if needed"],
+    },
+    "education": {
+        "text": ["Let's work through {topic} step by step.",
+                 "First, identify what the question is really asking.",
+                 "Then apply the core rule to a simple example before the general case.",
+                 "Finally, check the answer against the original question."],
+        "list": ["Review the key definitions", "Work through two solved examples",
+                 "Practice three problems on your own", "Summarise the method in your own words"],
+    },
+    "financial": {
+        "text": ["Regarding {topic}, the answer depends on your goals and time horizon.",
+                 "Diversification reduces the impact of any single position.",
+                 "Costs and taxes compound over time and deserve attention.",
+                 "This is general information, not personalised investment advice."],
+        "list": ["Review your current asset allocation", "Keep an emergency fund of 3-6 months",
+                 "Prefer low-cost diversified funds", "Rebalance once or twice a year"],
+    },
+    "general": {
+        "text": ["Here is a response about {topic}.", "It is generated by the local fake ASI server."],
+        "list": ["First point", "Second point", "Third point"],
+    },
+}
+
+
+# ============ DISTRIBUTIONS ============
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+    """'fixed:x', 'uniform:a,b', 'normal:mean,sd' or 'lognormal:median,sigma' -> sampler (>= 0)"""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0]) if values[0] > 0 else 0.0
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Invalid distribution '{spec}'")
+
+
+# ============ COMPLETIONS ============
+def prompt_text(messages: List[Dict]) -> str:
+    return "\n".join(str(m.get("content", "")) for m in messages)
+
+
+def detect_domain(text: str) -> str:
+    lowered = text.lower()
+    scores = {domain: sum(lowered.count(word) for word in words) for domain, words in DOMAIN_KEYWORDS.items()}
+    best = max(scores, key=scores.get)
+    return best if scores[best] else "general"
+
+
+def prompt_topic(messages: List[Dict]) -> str:
+    """A few words of the last user message, to make replies look related"""
+    user = [m for m in messages if m.get("role") == "user"] or messages
+    for line in str(user[-1].get("content", "")).splitlines():
+        if ":" in line and line.split(":", 1)[1].strip():
+            first_sentence = re.split(r"[.?!]", line.split(":", 1)[1])[0]
+            return " ".join(first_sentence.split()[:6]) or "your request"
+    return "your request"
+
+
+def json_example(text: str) -> Optional[Dict]:
+    """The example object of a 'respond with a JSON object ... in this form' prompt"""
+    if "json" not in text.lower():
+        return None
+    for match in re.finditer(r"\{.*\}", text):
+        try:
+            example = json.loads(match.group(0))
+        except ValueError:
+            continue
+        if isinstance(example, dict):
+            return example
+    return None
+
+
+def sentences(templates: Dict, topic: str, words: int, rng: random.Random) -> str:
+    """Template sentences (cycled) until roughly `words` words"""
+    parts, count = [], 0
+    pool = templates["text"]
+    start = rng.randrange(len(pool))
+    index = 0
+    while count < max(words, 1):
+        sentence = pool[(start + index) % len(pool)].format(topic=topic)
+        parts.append(sentence)
+        count += len(sentence.split())
+        index += 1
+    return " ".join(parts)
+
+
+def render(messages: List[Dict], templates: Dict[str, Dict], length: float, rng: random.Random) -> str:
+    text = prompt_text(messages)
+    domain_templates = templates.get(detect_domain(text), templates["general"])
+    topic = prompt_topic(messages)
+    words = max(1, int(length))
+
+    example = json_example(text)
+    if example is not None:
+        reply = {}
+        for key, value in example.items():
+            if isinstance(value, list):
+                reply[key] = rng.sample(domain_templates["list"], min(4, len(domain_templates["list"])))
+            elif isinstance(value, bool):
+                reply[key] = rng.random() < 0.5
+            elif isinstance(value, (int, float)):
+                reply[key] = value
+            else:
+                reply[key] = sentences(domain_templates, topic, max(8, words // 2), rng)
+        return json.dumps(reply)
+
+    if "list" in text.lower():
+        items = rng.sample(domain_templates["list"], min(4, len(domain_templates["list"])))
+        return "\n".join(f"{i}. {item}" for i, item in enumerate(items, 1))
+    return sentences(domain_templates, topic, words, rng)
+
+
+def truncate(content: str, max_tokens: int) -> tuple:
+    """Cut content to max_tokens words; returns (content, finish_reason)"""
+    tokens = re.findall(r"\S+\s*", content)
+    if len(tokens) <= max_tokens:
+        return content, "stop"
+    return "".join(tokens[:max_tokens]).rstrip(), "length"
+
+
+def count_tokens(text: str) -> int:
+    return len(text.split())
+
+
+# ============ SERVER ============
+class FakeASI:
+    def __init__(self, args):
+        self.args = args
+        self.latency = parse_distribution(args.latency)
+        self.length = parse_distribution(args.length)
+        self.templates = dict(TEMPLATES)
+        if args.responses:
+            with open(args.responses, "r") as f:
+                for domain, custom in json.load(f).items():
+                    self.templates[domain] = {**self.templates.get(domain, TEMPLATES["general"]), **custom}
+        self.stats: Counter = Counter()
+        self._seen: Dict[str, int] = defaultdict(int)
+        self._prefixes: set = set()
+        self._bucket = float(args.rpm or 0)
+        self._bucket_updated = time.monotonic()
+
+    def rng_for(self, body: bytes) -> random.Random:
+        if self.args.seed is None:
+            return random.Random()
+        digest = hashlib.sha256(body).hexdigest()
+        self._seen[digest] += 1
+        return random.Random(f"{self.args.seed}|{digest}|{self._seen[digest]}")
+
+    def take_rate_token(self) -> Optional[float]:
+        """None if the request fits the --rpm budget, else seconds until it would"""
+        if not self.args.rpm:
+            return None
+        now = time.monotonic()
+        per_second = self.args.rpm / 60.0
+        self._bucket = min(float(self.args.rpm), self._bucket + (now - self._bucket_updated) * per_second)
+        self._bucket_updated = now
+        if self._bucket >= 1:
+            self._bucket -= 1
+            return None
+        return (1 - self._bucket) / per_second
+
+    def cached_prefix_tokens(self, messages: List[Dict]) -> int:
+        """Tokens of the messages before the last one if that prefix was seen before"""
+        prefix = messages[:-1]
+        if not prefix:
+            return 0
+        key = hashlib.sha256(json.dumps(prefix, sort_keys=True).encode()).hexdigest()
+        if key in self._prefixes:
+            return count_tokens(prompt_text(prefix))
+        if len(self._prefixes) >= 100_000:
+            self._prefixes.clear()
+        self._prefixes.add(key)
+        return 0
+
+    @staticmethod
+    def error(status: int, message: str, kind: str, headers: Optional[Dict] = None) -> web.Response:
+        return web.json_response({"error": {"message": message, "type": kind}}, status=status, headers=headers)
+
+    async def completions(self, request: web.Request) -> web.StreamResponse:
+        self.stats["requests"] += 1
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            self.stats["unauthorized"] += 1
+            return self.error(401, "Missing bearer token", "authentication_error")
+        raw = await request.read()
+        try:
+            body = json.loads(raw)
+            messages = body["messages"]
+        except (ValueError, KeyError, TypeError):
+            self.stats["bad_requests"] += 1
+            return self.error(400, "Body must be JSON with a messages list", "invalid_request_error")
+
+        rng = self.rng_for(raw)
+        retry_after = self.take_rate_token()
+        if retry_after is None and rng.random() < self.args.throttle_rate:
+            retry_after = 1.0
+        if retry_after is not None:
+            self.stats["throttled"] += 1
+            return self.error(429, "Rate limit exceeded", "rate_limit_error",
+                              {"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+        first_token = self.latency(rng)
+        if rng.random() < self.args.error_rate:
+            await asyncio.sleep(first_token)
+            self.stats["errors"] += 1
+            return self.error(500, "Injected server error", "server_error")
+
+        max_tokens = int(body.get("max_tokens") or 1024)
+        content, finish_reason = truncate(render(messages, self.templates, self.length(rng), rng), max_tokens)
+        prompt_tokens = count_tokens(prompt_text(messages))
+        completion_tokens = count_tokens(content)
+        cached_tokens = self.cached_prefix_tokens(messages)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens,
+                 "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "asi1-mini")
+        self.stats["completion_tokens"] += completion_tokens
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["cached_prompt_tokens"] += cached_tokens
+
+        if body.get("stream"):
+            return await self.stream(request, completion_id, model, content, finish_reason, usage,
+                                     first_token, bool((body.get("stream_options") or {}).get("include_usage")))
+
+        await asyncio.sleep(first_token + completion_tokens * self.args.token_delay)
+        self.stats["completed"] += 1
+        return web.json_response({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": finish_reason}],
+            "usage": usage,
+        })
+
+    async def stream(self, request: web.Request, completion_id: str, model: str, content: str,
+                     finish_reason: str, usage: Dict, first_token: float, include_usage: bool) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        created = int(time.time())
+
+        async def send(delta: Dict, finish: Optional[str] = None, extra: Optional[Dict] = None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            chunk.update(extra or {})
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        await asyncio.sleep(first_token)
+        await send({"role": "assistant", "content": ""})
+        for piece in re.findall(r"\S+\s*", content):
+            if self.args.token_delay:
+                await asyncio.sleep(self.args.token_delay)
+            await send({"content": piece})
+        await send({}, finish_reason)
+        if include_usage:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": [], "usage": usage}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        self.stats["completed"] += 1
+        return response
+
+    async def stats_handler(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats))
+
+
+def build_app(args) -> web.Application:
+    fake = FakeASI(args)
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", fake.completions)
+    app.router.add_get("/stats", fake.stats_handler)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake ASI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--latency", default="lognormal:0.4,0.5", help="Time to first token (seconds)")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="Seconds per generated token")
+    parser.add_argument("--length", default="normal:120,40", help="Reply length in tokens (words)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before real 429s (0 = unlimited)")
+    parser.add_argument("--responses", help="JSON file of per-domain templates overriding the built-in ones")
+    parser.add_argument("--seed", type=int, help="Make outputs and latencies reproducible per request body")
+    args = parser.parse_args()
+
+    for spec in (args.latency, args.length):
+        parse_distribution(spec)  # fail fast on a bad flag
+    print(f"🧪 Fake ASI server on http://{args.host}:{args.port}/v1/chat/completions "
+          f"(latency {args.latency}, {args.token_delay}s/token, errors {args.error_rate:.0%}, "
+          f"429s {args.throttle_rate:.0%}{f', {args.rpm} rpm' if args.rpm else ''})")
+    web.run_app(build_app(args), host=args.host, port=args.port, print=None)
@@ -0,0 +1,372 @@
+"""
+Load Generator
+Drives one domain at a target request rate (open loop) or concurrency
+(closed loop), either through the API server's REST endpoints or straight at
+a Bureau's agent protocol via the agent gateway, and reports throughput,
+p50/p95/p99 latency and error rates.
+
+Request bodies are drawn from a built-in sample set per domain (or a JSONL
+file of bodies), user ids from a uniform or Zipf distribution over a user
+population, and any field can be given a weighted mix (e.g. urgency levels).
+
+Usage:
+    python benchmarks/loadgen.py --domain medical --rate 20 --duration 60
+    python benchmarks/loadgen.py --domain legal --concurrency 16 --requests 500 --mode protocol
+    python benchmarks/loadgen.py --domain support --rate 50 --users 10000 --user-dist zipf \\
+        --mix priority=normal:7,high:2,urgent:1 --json results.json
+
+In open-loop mode latency is measured from each request's scheduled send
+time, so a backed-up server cannot hide queueing delay (coordinated omission).
+"""
+
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# Domain -> REST path, id field, agent type in the API gateway, sample bodies
+DOMAINS = {
+    "medical": {
+        "path": "/api/medical/consult", "id_field": "patient_id", "agent_type": "medical",
+        "bodies": [
+            {"symptoms": "fever and cough for 3 days, feeling very tired", "urgency_level": "normal"},
+            {"symptoms": "mild headache in the afternoons", "urgency_level": "low"},
+            {"symptoms": "chest pain and difficulty breathing", "urgency_level": "emergency"},
+            {"symptoms": "sore throat and runny nose", "urgency_level": "normal"},
+            {"symptoms": "high fever and vomiting since last night", "urgency_level": "high"},
+        ],
+    },
+    "legal": {
+        "path": "/api/legal/consult", "id_field": "client_id", "agent_type": "legal",
+        "bodies": [
+            {"case_description": "I received a contract termination notice without proper cause.", "case_type": "employment"},
+            {"case_description": "My landlord is keeping my deposit after I moved out.", "case_type": "property"},
+            {"case_description": "A supplier breached our delivery contract.", "case_type": "contract"},
+            {"case_description": "I was served with a lawsuit and the court hearing is tomorrow.", "urgency_level": "urgent"},
+        ],
+    },
+    "support": {
+        "path": "/api/support/ticket", "id_field": "customer_id", "agent_type": "customer_support",
+        "bodies": [
+            {"issue_description": "I was charged twice for my monthly subscription.", "category": "billing"},
+            {"issue_description": "The app crashes when I open settings.", "category": "technical"},
+            {"issue_description": "I cannot log in to my account.", "category": "account", "priority": "high"},
+            {"issue_description": "How do I export my data?", "category": "general", "priority": "low"},
+        ],
+    },
+    "education": {
+        "path": "/api/education/tutor", "id_field": "student_id", "agent_type": "education",
+        "bodies": [
+            {"question": "How do I solve quadratic equations?", "subject": "mathematics"},
+            {"question": "What causes the seasons on Earth?", "subject": "science"},
+            {"question": "How do recursive functions work?", "subject": "programming", "learning_level": "beginner"},
+        ],
+    },
+    "financial": {
+        "path": "/api/financial/advise", "id_field": "investor_id", "agent_type": "financial",
+        "bodies": [
+            {"query": "Should I rebalance my portfolio towards bonds?", "risk_tolerance": "conservative"},
+            {"query": "How much should I save for retirement each month?"},
+            {"query": "Is it a good time to invest in index funds?", "risk_tolerance": "aggressive"},
+        ],
+    },
+}
+
+
+# ============ DISTRIBUTIONS ============
+def user_sampler(users: int, dist: str, zipf_s: float, rng: random.Random) -> Callable[[], str]:
+    """Draw user ids uniformly or with Zipf popularity (a few heavy users)"""
+    if dist == "uniform":
+        return lambda: f"user_{rng.randrange(users):06d}"
+    cumulative = list(itertools.accumulate(1.0 / (rank ** zipf_s) for rank in range(1, users + 1)))
+    total = cumulative[-1]
+    return lambda: f"user_{min(users - 1, bisect.bisect(cumulative, rng.random() * total)):06d}"
+
+
+def parse_mix(spec: str) -> tuple:
+    """'field=value:weight,value:weight' -> (field, values, weights)"""
+    field, _, choices = spec.partition("=")
+    values, weights = [], []
+    for choice in choices.split(","):
+        value, _, weight = choice.partition(":")
+        values.append(value)
+        weights.append(float(weight or 1))
+    if not field or not values:
+        raise ValueError(f"Invalid --mix '{spec}' (expected field=value:weight,...)")
+    return field, values, weights
+
+
+def body_sampler(domain: str, bodies: List[Dict], users: Callable[[], str], mixes: List[tuple],
+                 rng: random.Random) -> Callable[[], Dict]:
+    id_field = DOMAINS[domain]["id_field"]
+
+    def sample() -> Dict:
+        body = dict(rng.choice(bodies))
+        for field, values, weights in mixes:
+            body[field] = rng.choices(values, weights)[0]
+        body[id_field] = users()
+        return body
+    return sample
+
+
+# ============ TARGETS ============
+class RestTarget:
+    """POSTs request bodies to the API server"""
+
+    def __init__(self, domain: str, url: str, connections: int):
+        import aiohttp
+        self.aiohttp = aiohttp
+        self.url = url.rstrip("/") + DOMAINS[domain]["path"]
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=connections),
+            timeout=aiohttp.ClientTimeout(total=float(os.getenv("LOADGEN_TIMEOUT", "120")))
+        )
+
+    async def send(self, body: Dict) -> Optional[str]:
+        """Returns None on success, else an error kind"""
+        try:
+            async with self.session.post(self.url, json=body) as response:
+                await response.read()
+                return None if response.status == 200 else f"http_{response.status}"
+        except asyncio.TimeoutError:
+            return "timeout"
+        except self.aiohttp.ClientError as e:
+            return type(e).__name__
+
+    async def close(self):
+        await self.session.close()
+
+
+class ProtocolTarget:
+    """Sends the domain's protocol message to its Bureau through the agent gateway"""
+
+    def __init__(self, domain: str, endpoint: Optional[str]):
+        agent_type = DOMAINS[domain]["agent_type"]
+        if endpoint:
+            os.environ[f"{agent_type.upper()}_AGENT_ENDPOINT"] = endpoint
+        # The API server's converters build the same messages its gateway mode sends
+        import api_server
+        from fastapi import HTTPException
+        self.api_server = api_server
+        self.HTTPException = HTTPException
+        self.request_model, self.convert = {
+            "medical": (api_server.MedicalConsultationRequest, api_server.medical_via_gateway),
+            "legal": (api_server.LegalConsultationRequest, api_server.legal_via_gateway),
+            "support": (api_server.SupportTicketRequest, api_server.support_via_gateway),
+            "education": (api_server.EducationRequest, api_server.education_via_gateway),
+            "financial": (api_server.FinancialAdvisoryRequest, api_server.financial_via_gateway),
+        }[domain]
+
+    async def send(self, body: Dict) -> Optional[str]:
+        try:
+            await self.convert(self.request_model(**body))
+            return None
+        except self.HTTPException as e:
+            return f"http_{e.status_code}"
+
+    async def close(self):
+        await self.api_server.get_gateway().close()
+
+
+# ============ LOAD LOOP ============
+class Recorder:
+    def __init__(self, warmup_until: float):
+        self.warmup_until = warmup_until
+        self.latencies: List[float] = []
+        self.errors: Counter = Counter()
+        self.sent = 0
+        self.completed = 0
+        self.dropped = 0
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+
+    def record(self, scheduled: float, finished: float, error: Optional[str]):
+        if scheduled < self.warmup_until:
+            return
+        self.first = scheduled if self.first is None else min(self.first, scheduled)
+        self.last = finished if self.last is None else max(self.last, finished)
+        self.completed += 1
+        if error:
+            self.errors[error] += 1
+        else:
+            self.latencies.append(finished - scheduled)
+
+
+async def run_open_loop(target, sample, recorder: Recorder, rate: float, arrival: str,
+                        deadline: float, max_requests: Optional[int], max_in_flight: int,
+                        rng: random.Random):
+    """Send at a target rate regardless of how fast responses come back"""
+    in_flight: set = set()
+
+    async def one(scheduled: float, body: Dict):
+        error = await target.send(body)
+        recorder.record(scheduled, time.perf_counter(), error)
+
+    next_send = time.perf_counter()
+    while time.perf_counter() < deadline and (max_requests is None or recorder.sent < max_requests):
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            recorder.dropped += 1  # the generator itself is saturated
+        else:
+            task = asyncio.ensure_future(one(next_send, sample()))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            recorder.sent += 1
+        next_send += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+
+async def run_closed_loop(target, sample, recorder: Recorder, concurrency: int,
+                          deadline: float, max_requests: Optional[int]):
+    """Keep `concurrency` requests outstanding"""
+    async def worker():
+        while time.perf_counter() < deadline and (max_requests is None or recorder.sent < max_requests):
+            recorder.sent += 1
+            started = time.perf_counter()
+            error = await target.send(sample())
+            recorder.record(started, time.perf_counter(), error)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def report_progress(recorder: Recorder, interval: float):
+    last_completed = 0
+    while True:
+        await asyncio.sleep(interval)
+        done = recorder.completed - last_completed
+        last_completed = recorder.completed
+        errors = sum(recorder.errors.values())
+        print(f"   ⏱️  {done / interval:6.1f} req/s, {recorder.completed} completed, {errors} errors")
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(recorder: Recorder, args) -> Dict:
+    ordered = sorted(recorder.latencies)
+    window = (recorder.last - recorder.first) if recorder.first is not None else 0.0
+    errors = sum(recorder.errors.values())
+    return {
+        "domain": args.domain,
+        "mode": args.mode,
+        "load": f"rate {args.rate}/s ({args.arrival})" if args.rate else f"concurrency {args.concurrency}",
+        "sent": recorder.sent,
+        "completed": recorder.completed,
+        "dropped": recorder.dropped,
+        "duration_s": window,
+        "throughput_rps": recorder.completed / window if window else 0.0,
+        "goodput_rps": len(ordered) / window if window else 0.0,
+        "error_rate": errors / recorder.completed if recorder.completed else 0.0,
+        "errors": dict(recorder.errors),
+        "latency_s": {
+            "mean": statistics.mean(ordered) if ordered else 0.0,
+            "p50": percentile(ordered, 0.50),
+            "p95": percentile(ordered, 0.95),
+            "p99": percentile(ordered, 0.99),
+            "max": ordered[-1] if ordered else 0.0,
+        },
+    }
+
+
+def print_summary(result: Dict):
+    latency = result["latency_s"]
+    print("\n" + "="*70)
+    print(f"📊 {result['domain']} via {result['mode']}, {result['load']}")
+    print("="*70)
+    print(f"📤 Sent {result['sent']}, completed {result['completed']}, dropped {result['dropped']} "
+          f"over {result['duration_s']:.1f}s")
+    print(f"🚀 Throughput {result['throughput_rps']:.1f} req/s (goodput {result['goodput_rps']:.1f} req/s)")
+    print(f"⏱️  Latency p50 {latency['p50']*1000:.0f}ms  p95 {latency['p95']*1000:.0f}ms  "
+          f"p99 {latency['p99']*1000:.0f}ms  max {latency['max']*1000:.0f}ms")
+    print(f"❌ Error rate {result['error_rate']:.1%}")
+    for kind, count in sorted(result["errors"].items(), key=lambda item: -item[1]):
+        print(f"   - {kind}: {count}")
+    print("="*70)
+
+
+async def main(args) -> Dict:
+    rng = random.Random(args.seed)
+    bodies = DOMAINS[args.domain]["bodies"]
+    if args.bodies:
+        with open(args.bodies, "r") as f:
+            bodies = [json.loads(line) for line in f if line.strip()]
+    sample = body_sampler(args.domain, bodies, user_sampler(args.users, args.user_dist, args.zipf_s, rng),
+                          [parse_mix(spec) for spec in args.mix], rng)
+
+    if args.mode == "rest":
+        target = RestTarget(args.domain, args.url, args.concurrency or args.max_in_flight)
+    else:
+        target = ProtocolTarget(args.domain, args.agent_endpoint)
+
+    started = time.perf_counter()
+    recorder = Recorder(warmup_until=started + args.warmup)
+    deadline = started + args.warmup + args.duration
+    max_requests = args.requests or None
+    progress = asyncio.ensure_future(report_progress(recorder, args.progress))
+    try:
+        if args.rate:
+            await run_open_loop(target, sample, recorder, args.rate, args.arrival, deadline,
+                                max_requests, args.max_in_flight, rng)
+        else:
+            await run_closed_loop(target, sample, recorder, args.concurrency, deadline, max_requests)
+    finally:
+        progress.cancel()
+        await target.close()
+    return summarize(recorder, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive a domain's REST endpoint or agent protocol with load")
+    parser.add_argument("--domain", required=True, choices=list(DOMAINS))
+    parser.add_argument("--mode", choices=["rest", "protocol"], default="rest",
+                        help="rest: API server endpoint; protocol: the Bureau's agent via the gateway")
+    parser.add_argument("--url", default=os.getenv("LOADGEN_URL", "http://localhost:8080"), help="API server URL")
+    parser.add_argument("--agent-endpoint", help="Bureau submit URL for protocol mode (default: the gateway's)")
+    load = parser.add_mutually_exclusive_group(required=True)
+    load.add_argument("--rate", type=float, help="Open loop: requests per second")
+    load.add_argument("--concurrency", type=int, help="Closed loop: outstanding requests")
+    parser.add_argument("--arrival", choices=["poisson", "uniform"], default="poisson", help="Open-loop arrivals")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests (warmup included)")
+    parser.add_argument("--warmup", type=float, default=0.0, help="Seconds excluded from the statistics")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Open-loop cap on outstanding requests")
+    parser.add_argument("--users", type=int, default=1000, help="Size of the user id population")
+    parser.add_argument("--user-dist", choices=["uniform", "zipf"], default="uniform")
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="Zipf exponent (higher = more skew)")
+    parser.add_argument("--mix", action="append", default=[],
+                        help="Weighted field values, e.g. urgency_level=normal:7,high:2,emergency:1 (repeatable)")
+    parser.add_argument("--bodies", help="JSONL file of request bodies to draw from")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible traffic")
+    parser.add_argument("--progress", type=float, default=5.0, help="Seconds between progress lines")
+    parser.add_argument("--json", dest="json_path", help="Write the summary to this JSON file")
+    args = parser.parse_args()
+
+    if args.rate is not None and args.rate <= 0 or args.concurrency is not None and args.concurrency <= 0:
+        sys.exit("--rate and --concurrency must be positive")
+
+    print(f"🔥 Loading {args.domain} via {args.mode} "
+          f"({'rate ' + str(args.rate) + '/s' if args.rate else 'concurrency ' + str(args.concurrency)}) "
+          f"for {args.duration:.0f}s")
+    result = asyncio.run(main(args))
+    print_summary(result)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n💾 Results written to {args.json_path}")
@@ -0,0 +1,354 @@
+"""
+Memory Scaling Benchmark - memory backends from 10^3 to 10^7 records
+Generates synthetic memory exports in the browser extension schema (id,
+entity, category, context, timestamp, status, metadata, plus the user_id that
+multi-user stores key on) and measures every memory backend at each size:
+
+    json     load_memory_file + list scans: the storage interfaces and the
+             API server's direct mode; inserts rewrite the export like the
+             memory agents' add_memory
+    agent    answer_batch over the whole store: a memory agent answering
+             MemoryLookup messages; inserts append to its in-memory list
+    sharded  answer_batch on the owning shard of a HashRing (--shards);
+             inserts append to the owning shard
+    index    the memory-mapped MemoryIndex read by API workers; inserts
+             rewrite the export and rebuild the index
+
+Metrics: load time (plus index build time), RSS added by the loaded store,
+per-user lookup, per-user category filter, top-k (the k most confident
+memories of a user) and insert throughput. Each (backend, size) runs in a
+fresh interpreter so RSS is not polluted by earlier runs. A size whose
+projected RSS (extrapolated from the previous size) exceeds the available
+memory is skipped and reported as such.
+
+Usage:
+    python benchmarks/memory_scaling.py [--sizes 1e3,1e4,1e5,1e6,1e7] [--backends json,agent,sharded,index]
+        [--per-user 20] [--shards 4] [--top-k 5] [--ops 500] [--budget 2] [--json results.json]
+
+Corpora are written to a temporary directory (--workdir keeps them for reuse).
+"""
+
+import argparse
+import heapq
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+BACKENDS = ["json", "agent", "sharded", "index"]
+CATEGORIES = ["name", "allergy", "medication", "condition", "legal_matter", "jurisdiction",
+              "case_history", "subject_strength", "learning_style", "investment_goal",
+              "risk_profile", "support_ticket"]
+SOURCES = ["registration", "intake", "case_history", "chat", "profile"]
+DOMAIN = "bench"
+
+METRICS = [
+    ("load_s", "Load time", "s"),
+    ("build_s", "Index build time", "s"),
+    ("rss_mb", "RSS of the loaded store", "MB"),
+    ("lookup_us", "Per-user lookup", "us"),
+    ("category_us", "Per-user category filter", "us"),
+    ("topk_us", "Top-k most confident memories", "us"),
+    ("inserts_per_s", "Insert throughput", "ops/s"),
+]
+
+
+# ============ CORPUS ============
+def memory_record(i: int, users: int, rng: random.Random) -> Dict:
+    category = CATEGORIES[i % len(CATEGORIES)]
+    return {
+        "id": f"mem_{i:08d}",
+        "user_id": f"user_{i % users:07d}",
+        "entity": f"{category.replace('_', ' ')} {i}",
+        "category": category,
+        "context": f"Recorded {category.replace('_', ' ')} during session {i // users}",
+        "timestamp": 1729598400000 + i * 1000,
+        "status": "local",
+        "metadata": {"source": SOURCES[i % len(SOURCES)], "confidence": round(rng.uniform(0.5, 1.0), 3)},
+    }
+
+
+def generate_corpus(path: str, count: int, per_user: int, seed: int = 7) -> float:
+    """Stream a memory export of `count` records to `path`; returns its size in MB"""
+    rng = random.Random(seed)
+    users = max(1, count // per_user)
+    with open(path, "w") as f:
+        f.write('{"user_id": "bench", "memories": [')
+        chunk = []
+        for i in range(count):
+            chunk.append(json.dumps(memory_record(i, users, rng), separators=(",", ":")))
+            if len(chunk) == 10000:
+                f.write(("," if i >= 10000 else "") + ",".join(chunk))
+                chunk = []
+        if chunk:
+            f.write(("," if count > len(chunk) else "") + ",".join(chunk))
+        f.write("]}")
+    return os.path.getsize(path) / 1e6
+
+
+# ============ WORKER (one backend, one size, fresh interpreter) ============
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def time_ops(fn: Callable, args: List, budget: float) -> float:
+    """Mean microseconds per call over `args`, stopping once `budget` seconds are spent"""
+    done, started = 0, time.perf_counter()
+    for arg in args:
+        fn(arg)
+        done += 1
+        if time.perf_counter() - started > budget:
+            break
+    return (time.perf_counter() - started) / done * 1e6
+
+
+def add_memory(path: str, memory: Dict):
+    """Append one memory to an export the way the memory agents' add_memory does"""
+    with open(path, "r") as f:
+        data = json.load(f)
+    data["memories"].append(memory)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def confidence(memory: Dict) -> float:
+    return memory.get("metadata", {}).get("confidence", 0.0)
+
+
+def run_worker(backend: str, corpus: str, count: int, per_user: int, shards: int, top_k: int,
+               ops: int, budget: float) -> Dict:
+    from common.memory_protocol import MemoryLookup, answer_batch
+    from common.memory_store import load_memory_file
+
+    result: Dict = {"base_rss_mb": rss_mb()}
+    rng = random.Random(11)
+    users = max(1, count // per_user)
+    sample_users = [f"user_{rng.randrange(users):07d}" for _ in range(ops)]
+    sample_pairs = [(user, rng.choice(CATEGORIES)) for user in sample_users]
+    scratch = f"{corpus}.{backend}.scratch"
+    new_records = [memory_record(count + i, users, rng) for i in range(ops)]
+
+    def lookup_message(user: str, categories: Optional[List[str]] = None) -> MemoryLookup:
+        return MemoryLookup(correlation_id=user, user_id=user, categories=categories or [], limit=0)
+
+    if backend == "index":
+        from common.memory_index import MemoryIndex
+
+        # Built by a separate process, like api_server's builder, so the
+        # reader's RSS only holds the mapping
+        started = time.perf_counter()
+        subprocess.run([sys.executable, __file__, "--build-index", corpus, f"{corpus}.idx"], check=True)
+        result["build_s"] = time.perf_counter() - started
+        base = rss_mb()
+        started = time.perf_counter()
+        index = MemoryIndex(f"{corpus}.idx")
+        result["load_s"] = time.perf_counter() - started
+        lookup = lambda user: index.lookup(DOMAIN, user)
+        category = lambda pair: [m for m in index.lookup(DOMAIN, pair[0]) if m.get("category") == pair[1]]
+
+        def insert(memory):
+            from common.memory_index import build_index
+            add_memory(scratch, memory)
+            build_index({DOMAIN: scratch}, f"{scratch}.idx")
+    else:
+        from common.sharding import HashRing, partition_memories
+        base = rss_mb()
+        started = time.perf_counter()
+        memories = load_memory_file(corpus)
+        if backend == "sharded":
+            ring = HashRing.with_shards(shards)
+            partitions = partition_memories(memories, ring)
+        result["load_s"] = time.perf_counter() - started
+
+        if backend == "json":
+            lookup = lambda user: [m for m in memories if m.get("user_id") == user or m.get("patient_id") == user]
+            category = lambda pair: [m for m in memories
+                                     if m.get("user_id") == pair[0] and m.get("category") == pair[1]]
+
+            def insert(memory):
+                add_memory(scratch, memory)
+        elif backend == "agent":
+            lookup = lambda user: answer_batch(memories, [lookup_message(user)])[0].memories
+            category = lambda pair: answer_batch(memories, [lookup_message(pair[0], [pair[1]])])[0].memories
+            insert = memories.append
+        else:
+            def lookup(user):
+                return answer_batch(partitions[ring.node_for(user)], [lookup_message(user)])[0].memories
+
+            def category(pair):
+                shard = partitions[ring.node_for(pair[0])]
+                return answer_batch(shard, [lookup_message(pair[0], [pair[1]])])[0].memories
+
+            def insert(memory):
+                partitions[ring.node_for(memory["user_id"])].append(memory)
+
+    if backend in ("json", "index"):
+        shutil.copyfile(corpus, scratch)
+    result["lookup_us"] = time_ops(lookup, sample_users, budget)
+    result["category_us"] = time_ops(category, sample_pairs, budget)
+    result["topk_us"] = time_ops(lambda user: heapq.nlargest(top_k, lookup(user), key=confidence),
+                                 sample_users, budget)
+    # Resident after the queries, so the index's touched pages count too
+    result["rss_mb"] = rss_mb() - base
+    result["inserts_per_s"] = 1e6 / time_ops(insert, new_records, budget)
+    result["peak_rss_mb"] = peak_rss_mb()
+    for path in (scratch, f"{scratch}.idx"):
+        if os.path.exists(path):
+            os.remove(path)
+    return result
+
+
+# ============ REPORT ============
+def format_value(value: Optional[float], unit: str) -> str:
+    if value is None:
+        return "-"
+    if unit == "us":
+        return f"{value / 1e3:.1f}ms" if value >= 1e3 else f"{value:.1f}µs"
+    if unit == "s":
+        return f"{value:.2f}s" if value >= 0.1 else f"{value * 1e3:.1f}ms"
+    if unit == "MB":
+        return f"{value:.1f}MB"
+    return f"{value:,.0f}/s" if value >= 10 else f"{value:.2f}/s"
+
+
+def size_label(count: int) -> str:
+    for factor, suffix in ((10 ** 6, "M"), (10 ** 3, "K")):
+        if count >= factor:
+            return f"{count / factor:g}{suffix}"
+    return str(count)
+
+
+def print_tables(results: Dict[str, Dict[int, Dict]], sizes: List[int]):
+    """One table per metric: backends as rows, corpus sizes as columns"""
+    for key, title, unit in METRICS:
+        rows = {b: r for b, r in results.items() if any(key in cell for cell in r.values())}
+        if not rows:
+            continue
+        print(f"\n📊 {title}")
+        print(f"{'backend':<10}" + "".join(f"{size_label(s):>12}" for s in sizes))
+        for backend, cells in rows.items():
+            line = f"{backend:<10}"
+            for size in sizes:
+                cell = cells.get(size, {})
+                line += f"{'skipped' if cell.get('skipped') else format_value(cell.get(key), unit):>12}"
+            print(line)
+    skipped = [(b, s, c["skipped"]) for b, r in results.items() for s, c in r.items() if c.get("skipped")]
+    if skipped:
+        print("\n⚠️  Skipped:")
+        for backend, size, reason in skipped:
+            print(f"   - {backend} @ {size_label(size)}: {reason}")
+
+
+def available_mb() -> float:
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) / 1e3
+    return float("inf")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory backend scaling from 10^3 to 10^7 records")
+    parser.add_argument("--sizes", default="1e3,1e4,1e5,1e6,1e7", help="Comma separated corpus sizes")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="Comma separated backends")
+    parser.add_argument("--per-user", type=int, default=20, help="Memories per user")
+    parser.add_argument("--shards", type=int, default=4, help="Shards of the sharded backend")
+    parser.add_argument("--top-k", type=int, default=5, help="Memories returned by top-k retrieval")
+    parser.add_argument("--ops", type=int, default=500, help="Maximum operations per measurement")
+    parser.add_argument("--budget", type=float, default=2.0, help="Seconds per measurement (at least one op runs)")
+    parser.add_argument("--workdir", help="Keep generated corpora here (default: a temporary directory)")
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds allowed per backend and size")
+    parser.add_argument("--json", dest="json_path", help="Write the results to this JSON file")
+    parser.add_argument("--worker", nargs=3, metavar=("BACKEND", "CORPUS", "COUNT"), help=argparse.SUPPRESS)
+    parser.add_argument("--build-index", nargs=2, metavar=("CORPUS", "OUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.build_index:
+        from common.memory_index import build_index
+        build_index({DOMAIN: args.build_index[0]}, args.build_index[1])
+        sys.exit(0)
+    if args.worker:
+        backend, corpus, count = args.worker
+        print(json.dumps(run_worker(backend, corpus, int(count), args.per_user, args.shards,
+                                    args.top_k, args.ops, args.budget)))
+        sys.exit(0)
+
+    sizes = sorted(int(float(s)) for s in args.sizes.split(",") if s.strip())
+    backends = [b.strip() for b in args.backends.split(",") if b.strip() in BACKENDS]
+    workdir = args.workdir or tempfile.mkdtemp(prefix="memory-scaling-")
+    os.makedirs(workdir, exist_ok=True)
+    results: Dict[str, Dict[int, Dict]] = {backend: {} for backend in backends}
+
+    print("\n" + "=" * 70)
+    print(f"🧠 Memory scaling: {', '.join(backends)} at {', '.join(size_label(s) for s in sizes)} records")
+    print("=" * 70)
+    try:
+        for size in sizes:
+            # Project each backend's RSS from its previous size before generating anything
+            runnable = []
+            for backend in backends:
+                previous = [(s, c) for s, c in results[backend].items() if "peak_rss_mb" in c]
+                if previous:
+                    s, cell = previous[-1]
+                    base = cell.get("base_rss_mb", 0.0)
+                    projected = base + (cell["peak_rss_mb"] - base) * size / s
+                    if projected > available_mb() * 0.9:
+                        results[backend][size] = {"skipped": f"needs ~{projected / 1e3:.1f}GB RSS, "
+                                                              f"{available_mb() / 1e3:.1f}GB available"}
+                        continue
+                if any(c.get("skipped") for c in results[backend].values()):
+                    results[backend][size] = {"skipped": "a smaller size was skipped"}
+                    continue
+                runnable.append(backend)
+            if not runnable:
+                continue
+
+            corpus = os.path.join(workdir, f"memories_{size}.json")
+            if not os.path.exists(corpus):
+                started = time.perf_counter()
+                megabytes = generate_corpus(corpus, size, args.per_user)
+                print(f"📝 {size_label(size)} records: {megabytes:.1f}MB export in {time.perf_counter() - started:.1f}s")
+            for backend in runnable:
+                command = [sys.executable, __file__, "--worker", backend, corpus, str(size),
+                           "--per-user", str(args.per_user), "--shards", str(args.shards),
+                           "--top-k", str(args.top_k), "--ops", str(args.ops), "--budget", str(args.budget)]
+                try:
+                    run = subprocess.run(command, capture_output=True, text=True, timeout=args.timeout, cwd=ROOT)
+                except subprocess.TimeoutExpired:
+                    results[backend][size] = {"skipped": f"timed out after {args.timeout:.0f}s"}
+                    continue
+                if run.returncode != 0:
+                    reason = (run.stderr.strip().splitlines() or [f"exit {run.returncode}"])[-1]
+                    results[backend][size] = {"skipped": f"failed: {reason}"}
+                    continue
+                cell = json.loads(run.stdout.strip().splitlines()[-1])
+                results[backend][size] = cell
+                print(f"   ✅ {backend:<8} @ {size_label(size):>5}: load {format_value(cell['load_s'], 's')}, "
+                      f"lookup {format_value(cell['lookup_us'], 'us')}, peak RSS {cell['peak_rss_mb']:.0f}MB")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_tables(results, sizes)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({
+                "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "per_user": args.per_user,
+                         "shards": args.shards, "top_k": args.top_k, "ops": args.ops, "budget": args.budget},
+                "results": {b: {str(s): c for s, c in r.items()} for b, r in results.items()},
+            }, f, indent=2)
+        print(f"\n💾 Results saved to {args.json_path}")
@@ -0,0 +1,381 @@
+"""
+Microbenchmarks - CPU-side hot paths with regression thresholds
+Times the helpers every consultation runs outside the ASI call: response
+parsing and prompt assembly in api_server.py, token-budgeted memory packing,
+memory loading and category filtering, the urgency/priority/mastery
+heuristics and message model serialization. Each case runs at a realistic
+data size (x1) and at 100x.
+
+Results are written as JSON. Given a baseline (an earlier results file) the
+run fails when a case's time per call grows by more than the threshold, so
+the suite can gate CI. The compared metric is the fastest round by default,
+which is far less sensitive to scheduler noise than the median:
+
+    python benchmarks/microbench.py --save benchmarks/baseline.json          # record
+    python benchmarks/microbench.py --baseline benchmarks/baseline.json      # compare
+
+Usage:
+    python benchmarks/microbench.py [--scales 1,100] [--filter parse] [--repeat 7] [--min-time 0.05]
+        [--save results.json] [--baseline baseline.json] [--threshold 0.25] [--metric min_us] [--retries 2] [--list]
+
+MICROBENCH_THRESHOLD sets the default allowed slowdown (0.25 = 25%).
+Memory files are generated in a temporary directory; the tree is not touched.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+for domain_dir in ("medical", "customer-support", "education"):
+    sys.path.append(os.path.join(ROOT, domain_dir))
+
+# Realistic (x1) sizes; every case multiplies its size by the scale
+MEMORIES_PER_FILE = 200
+MEMORIES_PER_USER = 20
+RESPONSE_ITEMS = 6
+RECOMMENDATIONS = 4
+
+MEMORY_CATEGORIES = ["allergy", "medication", "condition", "name", "subject_strength",
+                     "learning_style", "completed_topics", "struggles"]
+TOPICS = ["algebra", "geometry", "fractions", "photosynthesis", "word problems", "calculus"]
+
+
+# ============ SAMPLE DATA ============
+def sample_memories(count: int, users: int, rng: random.Random) -> List[Dict]:
+    """Memory export entries in the browser extension format"""
+    memories = []
+    for i in range(count):
+        category = rng.choice(MEMORY_CATEGORIES)
+        entity = rng.choice(TOPICS) if category in ("completed_topics", "struggles") else f"{category} {i}"
+        memories.append({
+            "id": f"mem_{i:06d}",
+            "user_id": f"user_{i % users:04d}",
+            "entity": entity,
+            "category": category,
+            "context": f"Recorded {category}: {entity} during session {i}",
+            "timestamp": 1729598400000 + i * 1000,
+            "status": "local",
+            "metadata": {"source": "chat", "confidence": round(rng.uniform(0.8, 1.0), 2)},
+        })
+    return memories
+
+
+def sample_response(sections: List[str], items: int) -> str:
+    """A completion in the numbered-section layout the direct-mode prompts ask for"""
+    lines = ["Diagnosis: Likely a viral upper respiratory infection.",
+             "Analysis: The situation described is common and usually manageable."]
+    for section in sections:
+        lines.append(f"{section}:")
+        lines.extend(f"- {section} item {i}: keep hydrated and rest for a day" for i in range(items))
+        lines.append("")
+    lines += ["Follow-up required: Yes", "Urgency: normal",
+              "Risk: moderate, diversified across sectors", "Estimated resolution: 24 hours"]
+    return "\n".join(lines)
+
+
+# ============ CASES ============
+class Case:
+    def __init__(self, name: str, setup: Callable[[int], Tuple[Callable[[], object], int]]):
+        """
+        Args:
+            name: Case name, reported as "<name>@x<scale>"
+            setup: Builds the timed callable for a scale; returns (fn, items per call)
+        """
+        self.name = name
+        self.setup = setup
+
+
+def build_cases(workdir: str) -> List[Case]:
+    import api_server
+    from common import memory_store
+    from common.prompts import pack_memories
+    from medical_system import MemoryStorageInterface, assess_urgency, medical_memory_context
+    from support_agent import assess_priority
+    from tutor_agent import assess_mastery_level
+    from medical_messages import MedicalAdvice, MedicalQuery
+
+    rng = random.Random(42)
+    cases: List[Case] = []
+
+    def memory_file(scale: int) -> str:
+        path = os.path.join(workdir, f"memories_x{scale}.json")
+        if not os.path.exists(path):
+            users = max(1, MEMORIES_PER_FILE * scale // MEMORIES_PER_USER)
+            with open(path, "w") as f:
+                json.dump({"memories": sample_memories(MEMORIES_PER_FILE * scale, users, rng)}, f)
+        return path
+
+    # ---------- api_server response parsing ----------
+    parsers = {
+        "medical": (lambda r: api_server.parse_medical_response(r, "normal"), ["Recommendations"]),
+        "legal": (lambda r: api_server.parse_legal_response(r, "normal"), ["Recommendations", "Next steps"]),
+        "support": (api_server.parse_support_response, ["Recommendations"]),
+        "education": (api_server.parse_education_response, ["Examples", "Practice problems", "Resources"]),
+        "financial": (lambda r: api_server.parse_financial_response(r, "moderate"),
+                      ["Recommendations", "Suggested actions"]),
+    }
+    for domain, (parse, sections) in parsers.items():
+        def setup(scale, parse=parse, sections=sections):
+            response = sample_response(sections, RESPONSE_ITEMS * scale)
+            return (lambda: parse(response)), len(response.splitlines())
+        cases.append(Case(f"parse_{domain}_response", setup))
+
+    # ---------- prompt assembly ----------
+    def setup_medical_prompts(scale):
+        request = api_server.MedicalConsultationRequest(
+            patient_id="user_0001", symptoms="fever and cough for 3 days " * scale,
+            medical_history="Mild asthma since childhood", urgency_level="normal")
+        memories = sample_memories(MEMORIES_PER_USER * scale, 1, rng)
+        return (lambda: api_server.medical_prompts(request, memories)), len(memories)
+    cases.append(Case("medical_prompts", setup_medical_prompts))
+
+    def setup_financial_prompts(scale):
+        request = api_server.FinancialAdvisoryRequest(
+            investor_id="user_0001", query="Should I rebalance towards bonds?",
+            portfolio={f"TICKER{i}": {"shares": i, "cost": 10.5 * i} for i in range(10 * scale)})
+        memories = sample_memories(MEMORIES_PER_USER * scale, 1, rng)
+        return (lambda: api_server.financial_prompts(request, memories)), len(request.portfolio)
+    cases.append(Case("financial_prompts", setup_financial_prompts))
+
+    def setup_memory_context(scale):
+        memories = sample_memories(MEMORIES_PER_USER * scale, 1, rng)
+        return (lambda: medical_memory_context(memories)), len(memories)
+    cases.append(Case("medical_memory_context", setup_memory_context))
+
+    def setup_pack_memories(scale):
+        memories = sample_memories(MEMORIES_PER_USER * scale, 1, rng)
+        return (lambda: pack_memories(memories, "medical", query="fever and cough for 3 days")), len(memories)
+    cases.append(Case("pack_memories", setup_pack_memories))
+
+    # ---------- memory loading ----------
+    def setup_load_memories(scale, cold=False):
+        path = memory_file(scale)
+        api_server.MEMORY_FILES["bench"] = path
+
+        def run():
+            if cold:
+                memory_store.invalidate(path)
+            return api_server.load_memories("bench", "user_0001")
+        return run, MEMORIES_PER_FILE * scale
+    cases.append(Case("load_memories", setup_load_memories))
+    cases.append(Case("load_memories_cold", lambda scale: setup_load_memories(scale, cold=True)))
+
+    def setup_by_category(scale):
+        storage = MemoryStorageInterface(memory_file(scale))
+        return (lambda: storage.get_memories_by_category("allergy")), MEMORIES_PER_FILE * scale
+    cases.append(Case("get_memories_by_category", setup_by_category))
+
+    # ---------- heuristics ----------
+    def setup_urgency(scale):
+        symptoms = "mild headache and a runny nose since yesterday, " * scale
+        return (lambda: assess_urgency(symptoms, "normal")), len(symptoms)
+    cases.append(Case("assess_urgency", setup_urgency))
+
+    def setup_priority(scale):
+        description = "The export button on the reports page stays greyed out, " * scale
+        return (lambda: assess_priority(description, "normal")), len(description)
+    cases.append(Case("assess_priority", setup_priority))
+
+    def setup_mastery(scale):
+        memories = sample_memories(MEMORIES_PER_USER * scale, 1, rng)
+        return (lambda: assess_mastery_level(memories, "trigonometry")), len(memories)
+    cases.append(Case("assess_mastery_level", setup_mastery))
+
+    # ---------- message serialization ----------
+    def advice(scale):
+        return MedicalAdvice(patient_id="user_0001", diagnosis="Likely a viral infection. " * scale,
+                             recommendations=[f"Recommendation {i}" for i in range(RECOMMENDATIONS * scale)],
+                             follow_up_required=True, urgency_assessment="normal")
+
+    def setup_dump(scale):
+        message = advice(scale)
+        return message.model_dump_json, len(message.recommendations)
+    cases.append(Case("medical_advice_dump_json", setup_dump))
+
+    def setup_parse(scale):
+        raw = advice(scale).model_dump_json()
+        return (lambda: MedicalAdvice.model_validate_json(raw)), len(raw)
+    cases.append(Case("medical_advice_parse_json", setup_parse))
+
+    def setup_query_roundtrip(scale):
+        query = MedicalQuery(patient_id="user_0001", symptoms="fever and cough " * scale,
+                             medical_history="None", urgency_level="normal")
+        return (lambda: MedicalQuery.model_validate_json(query.model_dump_json())), len(query.symptoms)
+    cases.append(Case("medical_query_roundtrip", setup_query_roundtrip))
+
+    cases.append(Case("schema_digest", lambda scale: (lambda: MedicalAdvice.build_schema_digest(MedicalAdvice), 1)))
+    return cases
+
+
+# ============ TIMING ============
+def measure(fn: Callable[[], object], repeat: int, min_time: float) -> Dict[str, float]:
+    """Per-call time (µs) over `repeat` rounds, each looping until min_time has passed"""
+    fn()  # warm caches and imports
+    # Like timeit, keep collections out of the timed rounds
+    gc_was_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        return _measure_rounds(fn, repeat, min_time)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _measure_rounds(fn: Callable[[], object], repeat: int, min_time: float) -> Dict[str, float]:
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1_000_000:
+            break
+        # Grow towards min_time, at most 10x per step so a noisy sample cannot overshoot
+        loops = min(loops * 10, max(loops + 1, int(loops * min_time / max(elapsed, 1e-9))))
+
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops)
+    return {
+        "median_us": statistics.median(samples) * 1e6,
+        "min_us": min(samples) * 1e6,
+        "stdev_us": (statistics.stdev(samples) if len(samples) > 1 else 0.0) * 1e6,
+        "loops": loops,
+        "rounds": len(samples),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float,
+            metric: str = "min_us") -> List[str]:
+    """Cases whose per-call time (metric) grew by more than the threshold"""
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if not before or not before.get(metric):
+            continue
+        change = result[metric] / before[metric] - 1
+        result["change"] = change
+        if change > threshold:
+            regressions.append(key)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the CPU-side hot paths")
+    parser.add_argument("--scales", default="1,100", help="Comma separated data size multipliers")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=7, help="Timed rounds per case")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per round")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Results file to compare against")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("MICROBENCH_THRESHOLD", "0.25")),
+                        help="Allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--metric", choices=["min_us", "median_us"], default="min_us",
+                        help="Per-call time compared with the baseline")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="Re-measurements of a case over the threshold before it counts as a regression")
+    parser.add_argument("--list", action="store_true", help="List the cases and exit")
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    workdir = tempfile.mkdtemp(prefix="microbench-")
+    # Some memory agents keep their stores relative to the working directory
+    os.chdir(ROOT)
+    try:
+        cases = [c for c in build_cases(workdir) if not args.filter or args.filter in c.name]
+        if args.list:
+            for case in cases:
+                print(case.name)
+            sys.exit(0)
+
+        baseline = {}
+        if args.baseline:
+            with open(args.baseline, "r") as f:
+                baseline = json.load(f)["results"]
+
+        print("\n" + "=" * 78)
+        print(f"⏱️  Microbenchmarks ({len(cases)} cases, scales {', '.join(f'x{s}' for s in scales)})")
+        print("=" * 78)
+        print(f"{'case':<38}{'median':>12}{'min':>12}{'items':>9}{'vs base':>9}")
+        results: Dict[str, Dict] = {}
+        runs: Dict[str, Tuple[Case, int]] = {}
+        for case in cases:
+            for scale in scales:
+                fn, items = case.setup(scale)
+                key = f"{case.name}@x{scale}"
+                result = measure(fn, args.repeat, args.min_time)
+                result.update({"case": case.name, "scale": scale, "items": items})
+                results[key] = result
+                runs[key] = (case, scale)
+                before = baseline.get(key, {}).get(args.metric)
+                change = f"{result[args.metric] / before - 1:+.0%}" if before else ""
+                print(f"{key:<38}{result['median_us']:>10.2f}µs{result['min_us']:>10.2f}µs{items:>9}{change:>9}")
+
+        regressions = compare(results, baseline, args.threshold, args.metric) if baseline else []
+        # A slow round on a busy machine is not a regression: measure again and keep the best
+        for _ in range(args.retries):
+            if not regressions:
+                break
+            print(f"🔁 Re-measuring {len(regressions)} slower cases")
+            for key in regressions:
+                case, scale = runs[key]
+                fn, _ = case.setup(scale)
+                retry = measure(fn, args.repeat, args.min_time)
+                if retry[args.metric] < results[key][args.metric]:
+                    results[key].update(retry)
+            regressions = compare(results, baseline, args.threshold, args.metric)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("=" * 78)
+    if args.save:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+                "min_time": args.min_time,
+                "scales": scales,
+            },
+            "results": results,
+        }
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results saved to {args.save}")
+    if baseline:
+        missing = sorted(set(baseline) - set(results))
+        if missing and not args.filter:
+            print(f"⚠️  {len(missing)} baseline cases not run: {', '.join(missing[:5])}")
+        if regressions:
+            print(f"❌ {len(regressions)} regressions beyond {args.threshold:.0%}:")
+            for key in regressions:
+                print(f"   - {key}: {results[key]['change']:+.0%} "
+                      f"({baseline[key][args.metric]:.2f}µs -> {results[key][args.metric]:.2f}µs)")
+            sys.exit(1)
+        print(f"✅ No regressions beyond {args.threshold:.0%}")
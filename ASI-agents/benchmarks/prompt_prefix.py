@@ -0,0 +1,173 @@
+"""
+Prompt Prefix Benchmark - how much of each prompt a provider prefix cache can reuse
+Runs every prompt template (the agents' two-call and structured chains, the
+tutor steps and the API server's direct-mode prompts) for a set of synthetic
+users against the local fake ASI server, then reports per template the stable
+prefix hashes seen, the mean prefix and prompt size and the share of prompt
+bytes a prefix cache could serve (common.prompts.prefix_tracker).
+
+The direct-mode prompts are also sent in their former layout, with the
+user's memories inside the system prompt, as the "<domain>.api.legacy"
+templates for comparison. The fake server's own prefix cache
+(usage.prompt_tokens_details.cached_tokens) gives a server-side check.
+
+Usage:
+    python benchmarks/fake_asi_server.py --port 9999 --token-delay 0 &
+    python benchmarks/prompt_prefix.py [--users 20] [--url http://127.0.0.1:9999/v1/chat/completions] [--json results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+for domain_dir in ("medical", "law", "customer-support", "financial", "education"):
+    sys.path.append(os.path.join(ROOT, domain_dir))
+
+from common.llm import asi_client
+from common.prompts import prefix_tracker
+
+SYMPTOMS = ["fever and cough for 3 days", "sharp headache and blurred vision", "sore throat and mild fever",
+            "lower back pain after lifting", "persistent fatigue and dizziness"]
+CASES = [("employment", "Terminated without notice after 6 years"), ("property", "Landlord kept my deposit"),
+         ("contract", "Supplier missed three deliveries"), ("family", "Dispute over custody schedule")]
+ISSUES = [("billing", "I was charged twice for my subscription"), ("technical", "The app crashes on login"),
+          ("account", "I cannot reset my password"), ("shipping", "My order has not arrived after 2 weeks")]
+QUESTIONS = [("retirement", "How should I rebalance for retirement in 20 years?"),
+             ("investment", "Should I move savings into index funds?"), ("debt", "Pay off my loan or invest?")]
+TOPICS = [("math", "fractions", "How do I add fractions with different denominators?"),
+          ("science", "photosynthesis", "Why do plants need sunlight?"),
+          ("math", "algebra", "How do I solve 2x + 3 = 11?")]
+
+
+def user_memories(rng: random.Random, domain: str, user: int) -> list:
+    categories = {
+        "medical": [("allergy", "penicillin"), ("condition", "asthma"), ("medication", "albuterol")],
+        "legal": [("legal_matter", "employment contract"), ("jurisdiction", "California")],
+        "support": [("purchase_history", "premium plan"), ("issues", "login failures")],
+        "financial": [("portfolio", "index funds"), ("risk_profile", "moderate")],
+        "education": [("struggles", "word problems"), ("learning_style", "visual")],
+    }[domain]
+    return [{"entity": entity, "category": category, "context": f"User {user} mentioned {entity} ({category})",
+             "timestamp": 1729598400000 + user * 1000, "metadata": {"confidence": round(rng.uniform(0.7, 1.0), 2)}}
+            for category, entity in rng.sample(categories, k=rng.randint(1, len(categories)))]
+
+
+def legacy_layout(system_prompt: str, user_message: str) -> list:
+    """Direct-mode messages as api_server built them before: memories inside the system prompt"""
+    memory_block, fields = user_message.split("\n\n", 1)
+    persona, instructions = system_prompt.split("\n\n", 1)
+    return [{"role": "system", "content": f"{persona}\n\n{memory_block}\n\n{instructions}"},
+            {"role": "user", "content": fields}]
+
+
+async def run_user(user: int, rng: random.Random):
+    import api_server
+    from medical_system import analyze_and_recommend_asi as medical
+    from lawyer_agent import analyze_and_recommend_asi as legal
+    from support_agent import analyze_and_recommend_asi as support
+    from advisor_agent import analyze_and_recommend_asi as financial
+    from tutor_agent import generate_examples_asi, generate_explanation_asi, generate_practice_asi
+
+    symptoms = rng.choice(SYMPTOMS)
+    case_type, case = rng.choice(CASES)
+    category, issue = rng.choice(ISSUES)
+    query_type, question = rng.choice(QUESTIONS)
+    subject, topic, ask = rng.choice(TOPICS)
+    for structured in (False, True):
+        await medical(symptoms, f"Patient {user}", "normal", user_memories(rng, "medical", user), structured=structured)
+        await legal(case, f"Client {user}", case_type, user_memories(rng, "legal", user), structured=structured)
+        await support(issue, f"Customer {user}", category, user_memories(rng, "support", user), structured=structured)
+        await financial(question, f"Investor {user}", query_type, "moderate", "long",
+                        user_memories(rng, "financial", user), structured=structured)
+    await generate_explanation_asi(topic, ask, f"Student {user}", "beginner", "visual")
+    await generate_examples_asi(subject, topic, "beginner")
+    await generate_practice_asi(subject, topic, "beginner")
+
+    direct = {
+        "medical": api_server.medical_prompts(api_server.MedicalConsultationRequest(
+            patient_id=f"user_{user}", symptoms=symptoms, medical_history="", urgency_level="normal"),
+            user_memories(rng, "medical", user)),
+        "legal": api_server.legal_prompts(api_server.LegalConsultationRequest(
+            client_id=f"user_{user}", case_description=case, legal_history="", case_type=case_type),
+            user_memories(rng, "legal", user)),
+        "support": api_server.support_prompts(api_server.SupportTicketRequest(
+            customer_id=f"user_{user}", issue_description=issue, category=category),
+            user_memories(rng, "support", user)),
+        "education": api_server.education_prompts(api_server.EducationRequest(
+            student_id=f"user_{user}", question=ask, subject=subject),
+            user_memories(rng, "education", user)),
+        "financial": api_server.financial_prompts(api_server.FinancialAdvisoryRequest(
+            investor_id=f"user_{user}", query=question),
+            user_memories(rng, "financial", user)),
+    }
+    for domain, (system_prompt, user_message) in direct.items():
+        await api_server.call_asi_api(system_prompt, user_message, template=f"{domain}.api")
+        await asi_client.complete(legacy_layout(system_prompt, user_message), max_tokens=1000,
+                                  template=f"{domain}.api.legacy")
+
+
+async def main(users: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    try:
+        for user in range(users):
+            await run_user(user, rng)
+    finally:
+        await asi_client.close()
+    return prefix_tracker.snapshot()
+
+
+def server_stats(url: str) -> dict:
+    from urllib.request import urlopen
+    try:
+        with urlopen(url.split("/v1/")[0] + "/stats", timeout=5) as response:
+            return json.loads(response.read())
+    except OSError:
+        return {}
+
+
+def print_table(templates: dict, users: int):
+    print(f"\n🧩 Prompt prefixes over {users} users")
+    print(f"{'template':<28}{'calls':>7}{'variants':>10}{'prefix B':>10}{'prompt B':>10}{'cacheable':>11}")
+    print("-" * 76)
+    for name, t in sorted(templates.items()):
+        calls = t["calls"] or 1
+        print(f"{name:<28}{t['calls']:>7}{t['variants']:>10}{t['prefix_bytes'] / calls:>10.0f}"
+              f"{t['prompt_bytes'] / calls:>10.0f}{t['cacheable_share'] * 100:>10.1f}%")
+    for label, names in (("stable layout", [n for n in templates if not n.endswith(".legacy")]),
+                         ("legacy direct mode", [n for n in templates if n.endswith(".legacy")]),
+                         ("stable direct mode", [n for n in templates if n.endswith(".api")])):
+        prompt = sum(templates[n]["prompt_bytes"] for n in names)
+        cacheable = sum(templates[n]["cacheable_bytes"] for n in names)
+        if prompt:
+            print(f"📦 {label}: {cacheable / prompt * 100:.1f}% of {prompt:,} prompt bytes cacheable")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cacheable share of prompt bytes per template")
+    parser.add_argument("--users", type=int, default=20, help="Synthetic users, each running every template")
+    parser.add_argument("--url", default=os.getenv("ASI_API_URL", "http://127.0.0.1:9999/v1/chat/completions"),
+                        help="Chat completions endpoint (the fake ASI server)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", dest="json_path", help="Write the per-template results to this JSON file")
+    args = parser.parse_args()
+
+    os.environ["ASI_API_URL"] = args.url
+    os.environ.setdefault("ASI_ONE_API_KEY", "offline")
+    before = server_stats(args.url)
+    templates = asyncio.run(main(args.users, args.seed))
+    print_table(templates, args.users)
+    after = server_stats(args.url)
+    if after:
+        prompt = after.get("prompt_tokens", 0) - before.get("prompt_tokens", 0)
+        cached = after.get("cached_prompt_tokens", 0) - before.get("cached_prompt_tokens", 0)
+        print(f"🖥️  Fake server prefix cache: {cached:,} of {prompt:,} prompt tokens cached "
+              f"({cached / max(prompt, 1) * 100:.1f}%)")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(templates, f, indent=2)
+        print(f"\n💾 Results written to {args.json_path}")
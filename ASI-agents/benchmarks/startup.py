@@ -0,0 +1,124 @@
+"""
+Startup Benchmark
+Measures cold start of the API server and the agent systems: each target is
+imported in a fresh interpreter under `python -X importtime`, reporting the
+median wall time over several runs, the slowest modules by self time and the
+import time spent per top-level package.
+
+Usage:
+    python benchmarks/startup.py [--targets api,law,runtime] [--runs 5] [--top 15] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Target -> code run in a fresh interpreter (from the repository root)
+TARGETS = {
+    "api": "import api_server",
+    "api_gateway": "import os; os.environ['API_MODE'] = 'gateway'; import api_server; api_server.get_gateway()",
+    "medical": "import runtime; runtime.load_system('medical')",
+    "law": "import runtime; runtime.load_system('law')",
+    "support": "import runtime; runtime.load_system('support')",
+    "education": "import runtime; runtime.load_system('education')",
+    "financial": "import runtime; runtime.load_system('financial')",
+    "runtime": "import runtime; runtime.build_bureau(runtime.parse_systems('all'), 8000)",
+}
+
+
+def parse_importtime(stderr: str) -> list:
+    """Turn `-X importtime` output into (module, self us, cumulative us) rows"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, module = line[len("import time:"):].split("|", 2)
+            rows.append((module.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def run_target(code: str) -> tuple:
+    """Run one cold start; returns (wall seconds, importtime rows)"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        tail = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError("\n".join(tail[-5:]))
+    return wall, parse_importtime(result.stderr)
+
+
+def benchmark(name: str, runs: int, top: int) -> dict:
+    walls, last_rows = [], []
+    for _ in range(runs):
+        wall, last_rows = run_target(TARGETS[name])
+        walls.append(wall)
+
+    packages = defaultdict(int)
+    for module, self_us, _ in last_rows:
+        packages[module.split(".")[0]] += self_us
+    slowest = sorted(last_rows, key=lambda row: row[1], reverse=True)[:top]
+
+    return {
+        "target": name,
+        "runs": runs,
+        "wall_median_s": statistics.median(walls),
+        "wall_min_s": min(walls),
+        "import_total_ms": sum(row[1] for row in last_rows) / 1000,
+        "modules": len(last_rows),
+        "top_modules": [{"module": m, "self_ms": s / 1000, "cumulative_ms": c / 1000} for m, s, c in slowest],
+        "packages_ms": {p: us / 1000 for p, us in sorted(packages.items(), key=lambda i: i[1], reverse=True)[:top]},
+    }
+
+
+def print_result(result: dict):
+    print(f"\n🚀 {result['target']}: median {result['wall_median_s']:.2f}s "
+          f"(min {result['wall_min_s']:.2f}s over {result['runs']} runs), "
+          f"{result['modules']} modules, {result['import_total_ms']:.0f} ms importing")
+    print(f"   {'package':<28} {'self':>9}")
+    for package, ms in result["packages_ms"].items():
+        print(f"   {package:<28} {ms:>7.1f}ms")
+    print(f"   {'slowest modules':<44} {'self':>9} {'cumul.':>9}")
+    for row in result["top_modules"]:
+        print(f"   {row['module'][:44]:<44} {row['self_ms']:>7.1f}ms {row['cumulative_ms']:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start time of the API server and agent systems")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="Comma separated targets to measure")
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per target")
+    parser.add_argument("--top", type=int, default=10, help="Modules and packages listed per target")
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        sys.exit(f"Unknown targets: {', '.join(unknown)} (choose from {', '.join(TARGETS)})")
+
+    results = []
+    for target in targets:
+        try:
+            result = benchmark(target, args.runs, args.top)
+        except RuntimeError as e:
+            print(f"\n❌ {target} failed to start:\n{e}")
+            continue
+        print_result(result)
+        results.append(result)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.json_path}")
@@ -0,0 +1,143 @@
+"""
+Structured Generation Benchmark
+Compares the two-call analyze -> recommend chains of the doctor, lawyer,
+support and advisor agents with their single-call structured mode, reporting
+latency, ASI calls and prompt/completion tokens per consultation.
+
+Usage:
+    python benchmarks/structured_generation.py [--runs 3] [--domains medical,legal] [--json results.json]
+
+Requires ASI_ONE_API_KEY; calls hit the configured ASI endpoint.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+for domain_dir in ("medical", "law", "customer-support", "financial"):
+    sys.path.append(os.path.join(ROOT, domain_dir))
+
+from dotenv import load_dotenv
+from common.llm import asi_client
+
+load_dotenv()
+
+
+# ============ SAMPLE CONSULTATIONS ============
+def medical_case(structured: bool):
+    from medical_system import analyze_and_recommend_asi
+    memories = [
+        {"entity": "penicillin", "category": "allergy", "context": "Allergic to penicillin"},
+        {"entity": "asthma", "category": "condition", "context": "Mild asthma since childhood"},
+    ]
+    return analyze_and_recommend_asi(
+        "fever and cough for 3 days, feeling very tired",
+        "No significant medical history", "normal", memories, structured=structured
+    )
+
+
+def legal_case(structured: bool):
+    from lawyer_agent import analyze_and_recommend_asi
+    memories = [{"entity": "employment contract", "category": "legal_matter", "context": "Signed in 2019"}]
+    return analyze_and_recommend_asi(
+        "I received a contract termination notice from my employer without proper cause.",
+        "No previous legal disputes", "employment", memories, structured=structured
+    )
+
+
+def support_case(structured: bool):
+    from support_agent import analyze_and_recommend_asi
+    memories = [{"entity": "premium plan", "category": "account_info", "context": "Premium subscriber"}]
+    return analyze_and_recommend_asi(
+        "I was charged twice for my monthly subscription.",
+        "Customer since 2021", "billing", memories, structured=structured
+    )
+
+
+def financial_case(structured: bool):
+    from advisor_agent import analyze_and_recommend_asi
+    memories = [{"entity": "index funds", "category": "portfolio", "context": "60% in index funds"}]
+    return analyze_and_recommend_asi(
+        "How should I rebalance my portfolio for retirement in 20 years?",
+        "Stable income, no debt", "retirement", "moderate", "long", memories, structured=structured
+    )
+
+
+CASES = {
+    "medical": medical_case,
+    "legal": legal_case,
+    "support": support_case,
+    "financial": financial_case,
+}
+
+
+# ============ BENCHMARK ============
+async def run_mode(case, structured: bool, runs: int) -> dict:
+    latencies = []
+    before = dict(asi_client.stats)
+    for _ in range(runs):
+        started = time.perf_counter()
+        await case(structured)
+        latencies.append(time.perf_counter() - started)
+    delta = {key: asi_client.stats[key] - before[key] for key in before}
+    return {
+        "mode": "structured" if structured else "two-call",
+        "runs": runs,
+        "latency_mean": statistics.mean(latencies),
+        "latency_max": max(latencies),
+        "calls_per_run": delta["calls"] / runs,
+        "failures": delta["failures"],
+        "prompt_tokens_per_run": delta["prompt_tokens"] / runs,
+        "completion_tokens_per_run": delta["completion_tokens"] / runs,
+    }
+
+
+async def main(domains: list, runs: int) -> list:
+    results = []
+    try:
+        for domain in domains:
+            for structured in (False, True):
+                result = await run_mode(CASES[domain], structured, runs)
+                result["domain"] = domain
+                results.append(result)
+    finally:
+        await asi_client.close()
+    return results
+
+
+def print_table(results: list):
+    print(f"\n{'domain':<10} {'mode':<11} {'latency':>9} {'max':>8} {'calls':>6} {'prompt':>8} {'compl.':>8} {'fail':>5}")
+    print("-" * 70)
+    for r in results:
+        print(f"{r['domain']:<10} {r['mode']:<11} {r['latency_mean']:>8.2f}s {r['latency_max']:>7.2f}s "
+              f"{r['calls_per_run']:>6.1f} {r['prompt_tokens_per_run']:>8.0f} "
+              f"{r['completion_tokens_per_run']:>8.0f} {r['failures']:>5}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Two-call vs structured single-call generation")
+    parser.add_argument("--runs", type=int, default=3, help="Consultations per domain and mode")
+    parser.add_argument("--domains", default=",".join(CASES), help="Comma separated domains to run")
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if not asi_client.api_key:
+        sys.exit("ASI_ONE_API_KEY is not set; the benchmark needs a reachable ASI endpoint.")
+
+    domains = [d.strip() for d in args.domains.split(",") if d.strip()]
+    unknown = [d for d in domains if d not in CASES]
+    if unknown:
+        sys.exit(f"Unknown domains: {', '.join(unknown)} (choose from {', '.join(CASES)})")
+
+    results = asyncio.run(main(domains, args.runs))
+    print_table(results)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.json_path}")
@@ -0,0 +1,7 @@
+"""
+Common building blocks shared by all ASI agent systems
+(medical, law, customer-support, education and financial).
+
+Domain scripts are launched as `python <domain>/<system>.py`, so they add the
+ASI-agents directory to sys.path before importing from this package.
+"""
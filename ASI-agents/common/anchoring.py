@@ -0,0 +1,339 @@
+"""
+Merkle Anchoring - batched on-chain persistence of consultation records
+Submitting every consultation as its own transaction is slow and expensive.
+The AnchorBatcher instead collects record hashes and, once a batch is full
+(ANCHOR_BATCH_SIZE) or old enough (ANCHOR_MAX_WAIT seconds), builds a Merkle
+tree and submits only its root to the ledger. Each record's inclusion proof is
+kept locally, so any record can later be shown to be part of an anchored root.
+
+Hashing (SHA-256, domain separated so a leaf can never pass for a node):
+    leaf = H(0x00 || canonical JSON of the record)
+    node = H(0x01 || left || right); an odd node is carried up unchanged
+
+Ledgers implement `async submit_root(root, count, batch) -> receipt` and
+`async find_root(root) -> receipt or None`. LocalLedger is a file-backed
+stand-in for the ETHMem contract (ETHMem_CONTRACT_ADDRESS / ETHEREUM_RPC_URL)
+used for development and testing.
+
+Files kept in the anchor directory (ANCHOR_DIR, default data/anchors; agents use
+a subdirectory each, see common.consultation_log.open_agent_log):
+    pending.jsonl   leaves waiting for the next batch (survives restarts)
+    batches.jsonl   one line per anchored batch (root, receipt, record ids)
+    proofs.jsonl    one line per record (batch, root, leaf, proof)
+    ledger.jsonl    LocalLedger's chain of anchored roots
+
+add() only buffers a leaf. flush_if_due() writes the buffer to pending.jsonl
+off the event loop, like every other file write of a flush. Proofs follow the
+consultation log's retention: when the log drops a segment it calls
+forget_segments(), and the next flush_if_due() compacts proofs.jsonl and
+batches.jsonl.
+
+Verification tool:
+    python common/anchoring.py --dir data/anchors/medical_system [--record 3:1024
+        [--log-dir data/consultations/medical_system --log-name medical]]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ANCHOR_DIR = os.path.join(ROOT, "data", "anchors")
+
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+# ============ MERKLE TREE ============
+def canonical_json(record: Dict) -> bytes:
+    return json.dumps(record, sort_keys=True, separators=(",", ":"), default=str).encode()
+
+
+def leaf_hash(record: Dict) -> str:
+    return hashlib.sha256(LEAF_PREFIX + canonical_json(record)).hexdigest()
+
+
+def _node_hash(left: str, right: str) -> str:
+    return hashlib.sha256(NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def merkle_levels(leaves: List[str]) -> List[List[str]]:
+    """All tree levels, leaves first and the root level last"""
+    if not leaves:
+        raise ValueError("Cannot build a Merkle tree without leaves")
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [_node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def merkle_root(leaves: List[str]) -> str:
+    return merkle_levels(leaves)[-1][0]
+
+
+def merkle_proof(levels: List[List[str]], index: int) -> List[Dict]:
+    """Sibling path of one leaf: [{"hash": ..., "left": sibling is on the left}]"""
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({"hash": level[sibling], "left": sibling < index})
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf: str, proof: List[Dict], root: str) -> bool:
+    current = leaf
+    for step in proof:
+        current = _node_hash(step["hash"], current) if step["left"] else _node_hash(current, step["hash"])
+    return current == root
+
+
+# ============ LEDGERS ============
+class LocalLedger:
+    """File-backed stand-in for the anchoring contract: an append-only chain of roots"""
+
+    def __init__(self, path: str, latency: Optional[float] = None):
+        """
+        Args:
+            path: JSON lines file holding the anchored roots
+            latency: Simulated confirmation time in seconds (LOCAL_LEDGER_LATENCY, default 0)
+        """
+        self.path = path
+        self.latency = latency if latency is not None else float(os.getenv("LOCAL_LEDGER_LATENCY", "0"))
+        self._lock = threading.Lock()
+        self._roots: Dict[str, Dict] = {}
+        self._head = "0" * 64
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._roots[entry["root"]] = entry
+                    self._head = entry["tx_hash"]
+
+    async def submit_root(self, root: str, count: int, batch: int) -> Dict:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        with self._lock:
+            block = len(self._roots) + 1
+            # Chained like blocks, so rewriting an old entry breaks every later hash
+            tx_hash = hashlib.sha256(f"{self._head}|{block}|{root}|{count}".encode()).hexdigest()
+            receipt = {"root": root, "count": count, "batch": batch, "block": block,
+                       "tx_hash": tx_hash, "timestamp": time.time()}
+            with open(self.path, "a") as f:
+                f.write(json.dumps(receipt) + "\n")
+            self._roots[root] = receipt
+            self._head = tx_hash
+        return receipt
+
+    async def find_root(self, root: str) -> Optional[Dict]:
+        return self._roots.get(root)
+
+
+# ============ BATCHER ============
+class AnchorBatcher:
+    """Collects record hashes and anchors them in Merkle batches"""
+
+    def __init__(self, ledger=None, directory: Optional[str] = None,
+                 batch_size: Optional[int] = None, max_wait: Optional[float] = None):
+        """
+        Args:
+            ledger: Object with async submit_root/find_root (default LocalLedger in the directory)
+            directory: Where pending leaves, batches and proofs are kept (ANCHOR_DIR)
+            batch_size: Records per anchored root (ANCHOR_BATCH_SIZE, default 256)
+            max_wait: Seconds a record may wait for its batch (ANCHOR_MAX_WAIT, default 60)
+        """
+        self.directory = directory or os.getenv("ANCHOR_DIR", DEFAULT_ANCHOR_DIR)
+        os.makedirs(self.directory, exist_ok=True)
+        self.ledger = ledger or LocalLedger(os.path.join(self.directory, "ledger.jsonl"))
+        self.batch_size = batch_size or int(os.getenv("ANCHOR_BATCH_SIZE", "256"))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv("ANCHOR_MAX_WAIT", "60"))
+
+        self._lock = threading.Lock()
+        self._flushing = asyncio.Lock()
+        self._pending: List[Dict] = []
+        self._unsaved: List[Dict] = []  # added, not yet in pending.jsonl
+        self._oldest: Optional[float] = None
+        self._proofs: Dict[str, Dict] = {}
+        self._compact = False
+        self.batches = 0
+
+        for entry in self._read_lines("proofs.jsonl"):
+            self._proofs[entry["record_id"]] = entry
+        # Compaction drops old batch lines, so continue from the highest number
+        self.batches = max((b["batch"] for b in self._read_lines("batches.jsonl")), default=0)
+        self._pending = [e for e in self._read_lines("pending.jsonl") if e["record_id"] not in self._proofs]
+        if self._pending:
+            self._oldest = self._pending[0]["added_at"]
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_lines(self, name: str):
+        path = self._file(name)
+        if not os.path.exists(path):
+            return
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # torn last line
+
+    def add(self, record_id: str, record: Dict) -> str:
+        """Queue a record for anchoring; returns its leaf hash. Writes nothing."""
+        entry = {"record_id": record_id, "leaf": leaf_hash(record), "added_at": time.time()}
+        with self._lock:
+            self._pending.append(entry)
+            self._unsaved.append(entry)
+            if self._oldest is None:
+                self._oldest = entry["added_at"]
+        return entry["leaf"]
+
+    def _save_pending(self):
+        with self._lock:
+            entries, self._unsaved = self._unsaved, []
+            if entries:
+                with open(self._file("pending.jsonl"), "a") as f:
+                    f.writelines(json.dumps(e) + "\n" for e in entries)
+
+    async def save_pending(self):
+        """Write leaves added since the last save to pending.jsonl"""
+        if self._unsaved:
+            await asyncio.to_thread(self._save_pending)
+
+    def forget_segments(self, segments: Iterable[int]):
+        """Drop the proofs of records (ids "segment:offset") in consultation log segments that were deleted"""
+        prefixes = tuple(f"{segment}:" for segment in segments)
+        if not prefixes:
+            return
+        with self._lock:
+            forgotten = [record_id for record_id in self._proofs if record_id.startswith(prefixes)]
+            for record_id in forgotten:
+                del self._proofs[record_id]
+            self._compact = self._compact or bool(forgotten)
+
+    def _compact_files(self):
+        """Rewrite proofs.jsonl and batches.jsonl without forgotten records"""
+        with self._lock:
+            if not self._compact:
+                return
+            self._compact = False
+            proofs = list(self._proofs.values())
+            batches = [b for b in self._read_lines("batches.jsonl")
+                       if any(record_id in self._proofs for record_id in b["records"])]
+            for name, lines in (("proofs.jsonl", proofs), ("batches.jsonl", batches)):
+                tmp_path = self._file(f"{name}.tmp.{os.getpid()}")
+                with open(tmp_path, "w") as f:
+                    f.writelines(json.dumps(line) + "\n" for line in lines)
+                os.replace(tmp_path, self._file(name))
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def due(self) -> bool:
+        if not self._pending:
+            return False
+        return len(self._pending) >= self.batch_size or time.time() - self._oldest >= self.max_wait
+
+    async def flush_if_due(self) -> Optional[Dict]:
+        await self.save_pending()
+        if self._compact:
+            await asyncio.to_thread(self._compact_files)
+        return await self.flush() if self.due() else None
+
+    async def flush(self) -> Optional[Dict]:
+        """Anchor up to batch_size pending records under one root; returns the batch"""
+        async with self._flushing:
+            with self._lock:
+                entries = self._pending[:self.batch_size]
+            if not entries:
+                return None
+
+            levels = merkle_levels([e["leaf"] for e in entries])
+            root = levels[-1][0]
+            batch = self.batches + 1
+            receipt = await self.ledger.submit_root(root, len(entries), batch)
+
+            proofs = [{"record_id": e["record_id"], "batch": batch, "root": root, "leaf": e["leaf"],
+                       "proof": merkle_proof(levels, i)} for i, e in enumerate(entries)]
+            summary = {"batch": batch, "root": root, "count": len(entries), "receipt": receipt,
+                       "records": [e["record_id"] for e in entries]}
+            await asyncio.to_thread(self._record_batch, len(entries), proofs, summary)
+            return summary
+
+    def _record_batch(self, count: int, proofs: List[Dict], summary: Dict):
+        """Persist an anchored batch and drop its leaves from the pending ones"""
+        with self._lock:
+            with open(self._file("proofs.jsonl"), "a") as f:
+                f.writelines(json.dumps(p) + "\n" for p in proofs)
+            with open(self._file("batches.jsonl"), "a") as f:
+                f.write(json.dumps(summary) + "\n")
+            for p in proofs:
+                self._proofs[p["record_id"]] = p
+            self.batches = summary["batch"]
+
+            # Drop the anchored leaves, keeping anything added meanwhile
+            self._pending = self._pending[count:]
+            self._unsaved = []
+            self._oldest = self._pending[0]["added_at"] if self._pending else None
+            tmp_path = self._file(f"pending.jsonl.tmp.{os.getpid()}")
+            with open(tmp_path, "w") as f:
+                f.writelines(json.dumps(e) + "\n" for e in self._pending)
+            os.replace(tmp_path, self._file("pending.jsonl"))
+
+    def proof_for(self, record_id: str) -> Optional[Dict]:
+        return self._proofs.get(record_id)
+
+    async def verify(self, record_id: str, record: Optional[Dict] = None) -> Dict:
+        """
+        Check a record's inclusion: its proof must lead to its batch root and
+        the root must be on the ledger. With `record`, its content is checked too.
+        """
+        proof = self.proof_for(record_id)
+        if proof is None:
+            return {"record_id": record_id, "anchored": False, "valid": False, "reason": "not anchored yet"}
+        receipt = await self.ledger.find_root(proof["root"])
+        checks = {
+            "proof": verify_proof(proof["leaf"], proof["proof"], proof["root"]),
+            "ledger": receipt is not None,
+        }
+        if record is not None:
+            checks["content"] = leaf_hash(record) == proof["leaf"]
+        return {"record_id": record_id, "anchored": True, "valid": all(checks.values()),
+                "checks": checks, "root": proof["root"], "receipt": receipt}
+
+
+# ============ VERIFICATION TOOL ============
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect anchored batches and verify record inclusion proofs")
+    parser.add_argument("--dir", default=os.getenv("ANCHOR_DIR", DEFAULT_ANCHOR_DIR), help="Anchor directory")
+    parser.add_argument("--record", help="Record id (segment:offset) to verify")
+    parser.add_argument("--log-dir", help="Consultation log directory, to also check the record's content")
+    parser.add_argument("--log-name", default="medical", help="Consultation log name")
+    args = parser.parse_args()
+
+    batcher = AnchorBatcher(directory=args.dir)
+    print(f"⚓ {batcher.batches} anchored batches, {len(batcher._proofs)} records, "
+          f"{batcher.pending_count} pending")
+
+    if args.record:
+        record = None
+        if args.log_dir:
+            sys.path.append(ROOT)
+            from common.consultation_log import ConsultationLogReader
+            record = ConsultationLogReader(args.log_name, args.log_dir).read(args.record)
+        result = asyncio.run(batcher.verify(args.record, record))
+        print(json.dumps(result, indent=2))
+        sys.exit(0 if result["valid"] else 1)
@@ -0,0 +1,379 @@
+"""
+Consultation Log - append-only, segment-rotated record of consultations
+Replaces per-consultation keys in the agent's ctx.storage, a single JSON file
+rewritten on every set. Records are appended as JSON lines to the active
+segment; once it reaches its size limit the segment is closed, compressed
+(gzip or lzma) in a background thread, and the oldest segments are dropped
+by the retention policy.
+
+Each closed segment keeps a small sidecar index (patient -> line offsets),
+and the active segment's index is kept in memory, so a patient's recent
+consultations are read without scanning the log.
+
+Layout of a log directory:
+    <name>-000001.jsonl.gz   closed, compressed segment
+    <name>-000001.idx.json   its patient index
+    <name>-000002.jsonl      active segment
+    <name>.lock              held by the one process writing the log
+
+Agents open their log with open_agent_log() in their startup handler, so
+importing an agent module writes nothing and every agent process gets
+directories of its own. Handlers log with append_async(), which encodes and
+writes the record (and rotates the segment when it is full) in a worker
+thread, so the event loop never waits on the disk.
+
+Query tool (read-only, safe next to a running agent):
+    python common/consultation_log.py --dir data/consultations/medical_system --name medical \
+        --patient patient_001 [--limit 5]
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import lzma
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks (Windows): one writer per directory is up to the operator
+    fcntl = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LOG_DIR = os.path.join(ROOT, "data", "consultations")
+
+COMPRESSORS = {"gzip": (".gz", gzip.open), "lzma": (".xz", lzma.open), "none": ("", open)}
+
+
+class ConsultationLogReader:
+    """
+    Read-only view of a consultation log. Never opens a segment for writing,
+    so it can be used next to the agent that owns the log.
+    """
+
+    def __init__(self, name: str, directory: Optional[str] = None):
+        self.name = name
+        self.directory = directory or os.getenv("CONSULTATION_LOG_DIR", DEFAULT_LOG_DIR)
+        self._lock = threading.Lock()
+        self._segment_pattern = re.compile(rf"^{re.escape(name)}-(\d{{6}})\.jsonl(\.gz|\.xz)?$")
+        self._closed_index: Dict[int, Dict[str, List[int]]] = {}
+        self._active_index: Dict[str, List[int]] = defaultdict(list)
+        self._active = 1
+        self._load()
+
+    def _load(self):
+        """Index the closed segments and the newest one"""
+        if not os.path.isdir(self.directory):
+            return
+        self._load_closed()
+        self._active_index = self._scan(self._segment_path(self._active))
+
+    def _load_closed(self):
+        segments = self._segments()
+        self._active = max(segments) if segments else 1
+        for segment in segments:
+            if segment != self._active:
+                self._closed_index[segment] = self._load_sidecar(segment)
+
+    # ---------- files ----------
+    def _base(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{self.name}-{segment:06d}")
+
+    def _segments(self) -> List[int]:
+        segments = set()
+        for filename in os.listdir(self.directory):
+            match = self._segment_pattern.match(filename)
+            if match:
+                segments.add(int(match.group(1)))
+        return sorted(segments)
+
+    def _segment_path(self, segment: int) -> str:
+        """Path of a segment, compressed or not (whichever exists)"""
+        base = self._base(segment)
+        for suffix in (".jsonl", ".jsonl.gz", ".jsonl.xz"):
+            if os.path.exists(base + suffix):
+                return base + suffix
+        return base + ".jsonl"
+
+    def _active_path(self) -> str:
+        return self._segment_path(self._active)
+
+    def _open_segment(self, path: str):
+        if path.endswith(".gz"):
+            return gzip.open(path, "rb")
+        if path.endswith(".xz"):
+            return lzma.open(path, "rb")
+        return open(path, "rb")
+
+    def _load_sidecar(self, segment: int) -> Dict[str, List[int]]:
+        try:
+            with open(self._base(segment) + ".idx.json", "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return self._scan(self._segment_path(segment))
+
+    def _scan(self, path: str) -> Dict[str, List[int]]:
+        """Rebuild a patient index by reading a segment"""
+        index: Dict[str, List[int]] = defaultdict(list)
+        if not os.path.exists(path):
+            return index
+        offset = 0
+        with self._open_segment(path) as f:
+            for line in f:
+                try:
+                    index[json.loads(line)["patient_id"]].append(offset)
+                except (ValueError, KeyError):
+                    pass  # torn last line of a crashed writer
+                offset += len(line)
+        return index
+
+    # ---------- reading ----------
+    def _read(self, segment: int, offsets: List[int]) -> List[Dict]:
+        """Read the records at `offsets` (ascending) of one segment"""
+        records = []
+        with self._lock:
+            path = self._active_path() if segment == self._active else self._segment_path(segment)
+            handle = self._open_segment(path)
+        with handle as f:
+            for offset in offsets:
+                f.seek(offset)  # forward-only decompression for .gz/.xz
+                records.append(json.loads(f.readline()))
+        return records
+
+    def read(self, record_id: str) -> Dict:
+        """Read one record by the id returned from append()"""
+        segment, offset = (int(part) for part in record_id.split(":"))
+        return self._read(segment, [offset])[0]
+
+    def recent(self, patient_id: str, limit: int = 10) -> List[Dict]:
+        """A patient's most recent consultations, newest first"""
+        with self._lock:
+            plan = [(self._active, list(self._active_index.get(patient_id, [])))]
+            plan += [(segment, list(self._closed_index[segment].get(patient_id, [])))
+                     for segment in sorted(self._closed_index, reverse=True)]
+
+        records: List[Dict] = []
+        for segment, offsets in plan:
+            if len(records) >= limit:
+                break
+            wanted = offsets[-(limit - len(records)):] if offsets else []
+            if wanted:
+                records.extend(reversed(self._read(segment, wanted)))
+        return records
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "segments": len(self._closed_index) + 1,
+                "active_segment": self._active,
+                "patients": len(set(self._active_index).union(
+                    *(index.keys() for index in self._closed_index.values()))),
+            }
+
+
+class ConsultationLog(ConsultationLogReader):
+    """Append-only consultation records with rotation, compression and retention"""
+
+    def __init__(self, name: str, directory: Optional[str] = None,
+                 segment_bytes: Optional[int] = None, compression: Optional[str] = None,
+                 max_segments: Optional[int] = None, retention_days: Optional[float] = None,
+                 anchor=None):
+        """
+        Args:
+            name: Log name, used as the segment file prefix (e.g. "medical")
+            directory: Log directory (CONSULTATION_LOG_DIR, default data/consultations)
+            segment_bytes: Size at which the active segment is rotated
+                (CONSULTATION_LOG_SEGMENT_BYTES, default 4 MB)
+            compression: "gzip", "lzma" or "none" for closed segments
+                (CONSULTATION_LOG_COMPRESSION, default gzip)
+            max_segments: Segments kept, active included (CONSULTATION_LOG_MAX_SEGMENTS,
+                default 50, 0 = unlimited)
+            retention_days: Closed segments older than this are deleted
+                (CONSULTATION_LOG_RETENTION_DAYS, default 0 = keep)
+            anchor: Optional AnchorBatcher (common/anchoring.py) every
+                appended record is handed to for Merkle anchoring
+        """
+        self.segment_bytes = segment_bytes or int(os.getenv("CONSULTATION_LOG_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+        self.compression = (compression or os.getenv("CONSULTATION_LOG_COMPRESSION", "gzip")).lower()
+        if self.compression not in COMPRESSORS:
+            raise ValueError(f"Unknown compression '{self.compression}' (choose from {', '.join(COMPRESSORS)})")
+        self.max_segments = max_segments if max_segments is not None else int(
+            os.getenv("CONSULTATION_LOG_MAX_SEGMENTS", "50"))
+        self.retention_days = retention_days if retention_days is not None else float(
+            os.getenv("CONSULTATION_LOG_RETENTION_DAYS", "0"))
+
+        self.anchor = anchor
+        self._compressing: set = set()
+        super().__init__(name, directory)
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_file = None
+        if fcntl is not None:
+            self._lock_file = open(os.path.join(self.directory, f"{self.name}.lock"), "w")
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_file.close()
+                raise RuntimeError(f"Consultation log '{self.name}' in {self.directory} "
+                                   f"is already open in another process")
+        self._load_closed()
+        self._open_active()
+
+    # ---------- files ----------
+    def _active_path(self) -> str:
+        return self._base(self._active) + ".jsonl"
+
+    def _open_active(self):
+        path = self._active_path()
+        self._active_index = self._scan(path)
+        self._file = open(path, "ab")
+        self._size = self._file.tell()
+        if self._size and not self._ends_with_newline(path):
+            # Terminate a torn last line so the next record starts on its own line
+            self._file.write(b"\n")
+            self._file.flush()
+            self._size += 1
+
+    @staticmethod
+    def _ends_with_newline(path: str) -> bool:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    # ---------- writing ----------
+    def append(self, patient_id: str, record: Dict) -> str:
+        """
+        Append one consultation record for a patient; returns its record id.
+        Blocks on the file write; handlers on an event loop use append_async().
+        """
+        line = json.dumps({"patient_id": patient_id, "logged_at": time.time(), **record},
+                          separators=(",", ":"), default=str).encode() + b"\n"
+        with self._lock:
+            if self._size and self._size + len(line) > self.segment_bytes:
+                self._rotate()
+            record_id = f"{self._active}:{self._size}"
+            self._active_index[patient_id].append(self._size)
+            self._file.write(line)
+            self._file.flush()
+            self._size += len(line)
+        if self.anchor is not None:
+            # Anchor exactly what was written, as read back from the log
+            self.anchor.add(record_id, json.loads(line))
+        return record_id
+
+    async def append_async(self, patient_id: str, record: Dict) -> str:
+        """append() in a worker thread"""
+        return await asyncio.to_thread(self.append, patient_id, record)
+
+    def _rotate(self):
+        """Close the active segment and start the next one (lock held)"""
+        closed = self._active
+        self._file.close()
+        with open(self._base(closed) + ".idx.json", "w") as f:
+            json.dump(self._active_index, f, separators=(",", ":"))
+        self._closed_index[closed] = dict(self._active_index)
+        self._active += 1
+        self._open_active()
+        self._apply_retention()
+        if self.compression != "none":
+            self._compressing.add(closed)
+            threading.Thread(target=self._compress, args=(closed,),
+                             name=f"{self.name}-log-compress", daemon=True).start()
+
+    def _compress(self, segment: int):
+        suffix, opener = COMPRESSORS[self.compression]
+        source = self._base(segment) + ".jsonl"
+        target = source + suffix
+        try:
+            with open(source, "rb") as src, opener(target + ".tmp", "wb") as dst:
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+            os.replace(target + ".tmp", target)
+            with self._lock:
+                os.remove(source)
+        except OSError as e:
+            print(f"[ConsultationLog] Could not compress {source}: {e}")
+        finally:
+            self._compressing.discard(segment)
+
+    def _apply_retention(self):
+        """Drop closed segments beyond max_segments or older than retention_days (lock held)"""
+        closed = sorted(self._closed_index)
+        expired = []
+        if self.max_segments > 0:
+            expired = closed[:max(0, len(closed) + 1 - self.max_segments)]
+        if self.retention_days > 0:
+            cutoff = time.time() - self.retention_days * 86400
+            for segment in closed:
+                if segment in expired:
+                    continue
+                try:
+                    if os.path.getmtime(self._segment_path(segment)) < cutoff:
+                        expired.append(segment)
+                except FileNotFoundError:
+                    expired.append(segment)  # removed concurrently; forget its index
+        removed = []
+        for segment in expired:
+            if segment in self._compressing:
+                continue
+            for suffix in (".jsonl", ".jsonl.gz", ".jsonl.xz", ".idx.json"):
+                try:
+                    os.remove(self._base(segment) + suffix)
+                except FileNotFoundError:
+                    pass
+            self._closed_index.pop(segment, None)
+            removed.append(segment)
+        if removed and self.anchor is not None:
+            self.anchor.forget_segments(removed)
+
+    def stats(self) -> Dict[str, int]:
+        stats = super().stats()
+        with self._lock:
+            stats["active_bytes"] = self._size
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            if self._lock_file is not None:
+                self._lock_file.close()
+
+
+def open_agent_log(owner: str, name: str, anchored: bool = True) -> ConsultationLog:
+    """
+    The consultation log `name` of one agent process, with its AnchorBatcher,
+    in <CONSULTATION_LOG_DIR>/<owner> and <ANCHOR_DIR>/<owner>
+    """
+    log = ConsultationLog(name, os.path.join(os.getenv("CONSULTATION_LOG_DIR", DEFAULT_LOG_DIR), owner))
+    if anchored:
+        from common.anchoring import AnchorBatcher, DEFAULT_ANCHOR_DIR
+        log.anchor = AnchorBatcher(directory=os.path.join(os.getenv("ANCHOR_DIR", DEFAULT_ANCHOR_DIR), owner))
+    return log
+
+
+# ============ QUERY TOOL ============
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read a patient's recent consultations from a consultation log")
+    parser.add_argument("--dir", default=os.getenv("CONSULTATION_LOG_DIR", DEFAULT_LOG_DIR), help="Log directory")
+    parser.add_argument("--name", default="medical", help="Log name (segment prefix)")
+    parser.add_argument("--patient", help="Patient id to look up (omit for log statistics)")
+    parser.add_argument("--limit", type=int, default=5, help="Consultations to show")
+    args = parser.parse_args()
+
+    log = ConsultationLogReader(args.name, args.dir)
+    stats = log.stats()
+    print(f"📚 {args.name}: {stats['segments']} segments, {stats['patients']} patients")
+    if args.patient:
+        for record in log.recent(args.patient, args.limit):
+            when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record["logged_at"]))
+            print(f"\n🕒 {when}")
+            print(json.dumps({k: v for k, v in record.items() if k not in ("patient_id", "logged_at")}, indent=2))
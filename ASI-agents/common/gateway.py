@@ -0,0 +1,141 @@
+"""
+Agent Gateway - REST to agent protocol bridge for the API server
+Turns API requests into protocol messages (MedicalQuery, LegalQuery, ...)
+sent to the running Bureaus over one pooled HTTP session, and waits for the
+agents' replies. Every request uses a fresh sender identity whose address is
+its correlation id: the Bureau holds the HTTP exchange open until its agent
+replies to that address, and the gateway tracks the in-flight futures under
+the same id. Requests are bounded per domain and by a timeout.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from typing import Dict, Iterable, Optional, Tuple, Type
+
+import aiohttp
+from uagents import Model
+from uagents_core.envelope import Envelope
+from uagents_core.identity import Identity
+from uagents_core.models import ErrorMessage
+
+
+class GatewayError(Exception):
+    """The agent could not be reached or answered with an error"""
+
+
+class GatewayTimeout(GatewayError):
+    """No reply arrived before the gateway timeout"""
+
+
+class AgentGateway:
+    """Sends messages to Bureau-hosted agents and awaits their replies"""
+
+    def __init__(self, timeout: Optional[float] = None, max_concurrency: Optional[int] = None):
+        """
+        Args:
+            timeout: Seconds to wait for a reply, queueing included (GATEWAY_TIMEOUT, default 60)
+            max_concurrency: In-flight requests per domain (GATEWAY_MAX_CONCURRENCY, default 8)
+        """
+        self.timeout = timeout or float(os.getenv("GATEWAY_TIMEOUT", "60"))
+        self.max_concurrency = max_concurrency or int(os.getenv("GATEWAY_MAX_CONCURRENCY", "8"))
+        self.routes: Dict[str, Tuple[str, str]] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def register(self, domain: str, address: str, endpoint: str):
+        """Route a domain's requests to an agent address at a Bureau endpoint"""
+        self.routes[domain] = (address, endpoint)
+        self.stats[domain] = {"requests": 0, "timeouts": 0, "errors": 0}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency * max(1, len(self.routes)))
+            )
+        return self._session
+
+    async def request(self, domain: str, message: Model, replies: Iterable[Type[Model]]) -> Model:
+        """
+        Send a message to a domain's agent and return its reply, parsed as
+        whichever of `replies` matches. Raises GatewayTimeout or GatewayError.
+        """
+        if domain not in self.routes:
+            raise GatewayError(f"No agent registered for domain '{domain}'")
+        stats = self.stats[domain]
+        stats["requests"] += 1
+        limit = self._limits.setdefault(domain, asyncio.Semaphore(self.max_concurrency))
+        deadline = time.monotonic() + self.timeout
+
+        identity = Identity.generate()
+        correlation_id = identity.address
+        try:
+            await asyncio.wait_for(limit.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            raise GatewayTimeout(f"No free {domain} gateway slot within {self.timeout}s")
+
+        future = asyncio.ensure_future(self._exchange(domain, identity, message, replies, deadline))
+        self._pending[correlation_id] = future
+        try:
+            return await asyncio.wait_for(future, max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            raise GatewayTimeout(f"No reply from the {domain} agent within {self.timeout}s")
+        except GatewayError:
+            stats["errors"] += 1
+            raise
+        finally:
+            self._pending.pop(correlation_id, None)
+            limit.release()
+
+    async def _exchange(self, domain: str, identity: Identity, message: Model,
+                        replies: Iterable[Type[Model]], deadline: float) -> Model:
+        address, endpoint = self.routes[domain]
+        envelope = Envelope(
+            version=1,
+            sender=identity.address,
+            target=address,
+            session=uuid.uuid4(),
+            schema_digest=Model.build_schema_digest(message),
+            # The Bureau keeps the exchange open until the agent replies or this expires
+            expires=int(time.time() + max(1.0, deadline - time.monotonic())),
+        )
+        envelope.encode_payload(message.model_dump_json())
+        envelope.sign(identity)
+
+        headers = {"content-type": "application/json", "x-uagents-connection": "sync"}
+        try:
+            async with self._get_session().post(endpoint, data=envelope.model_dump_json(),
+                                                headers=headers) as response:
+                body = await response.text()
+                if response.status != 200:
+                    raise GatewayError(f"{domain} Bureau returned {response.status}: {body[:200]}")
+        except aiohttp.ClientError as e:
+            raise GatewayError(f"Could not reach the {domain} Bureau at {endpoint}: {e}")
+
+        reply = Envelope.model_validate_json(body)
+        if reply.signature and not reply.verify():
+            raise GatewayError(f"Reply from the {domain} agent failed verification")
+        payload = reply.decode_payload()
+
+        for model in replies:
+            if reply.schema_digest == Model.build_schema_digest(model):
+                return model.model_validate_json(payload)
+        if reply.schema_digest == Model.build_schema_digest(ErrorMessage):
+            raise GatewayError(ErrorMessage.model_validate_json(payload).error)
+        raise GatewayError(f"Unexpected reply type from the {domain} agent")
+
+    async def close(self):
+        for future in list(self._pending.values()):
+            future.cancel()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,180 @@
+"""
+Health Probes - in-process health, metrics and debug endpoints for a Bureau
+A small health agent added to a Bureau serves these endpoints on the
+Bureau's own HTTP server, so probes need no extra process:
+
+    /healthz  liveness: the event loop answers, with its current lag
+    /readyz   readiness and load: event-loop lag, scheduler queue depth and
+              running jobs, pending memory lookups, in-flight ASI calls and
+              the memory store version
+    /llm-metrics  token, latency and finish reason histograms of the
+              Bureau's ASI calls per prompt template (common/llm_metrics.py)
+              with their prompt-prefix reuse (common/prompts.py) and
+              adaptive max_tokens (common/llm.py)
+    /debug/loop  event-loop lag histogram and the call sites that blocked
+              the loop, captured by the watchdog (common/watchdog.py)
+    POST /debug/profile  on-demand sampling profile of the Bureau's event
+              loop (common/profiler.py, needs PROFILER_TOKEN)
+
+The GET endpoints only read counters and histograms the agents and the
+watchdog already keep, so they are cheap enough to poll every second and to
+use as an autoscaling signal. /readyz reports ready=false (with reasons)
+when the loop lags beyond HEALTH_MAX_LOOP_LAG_MS (default 250) or a work
+queue is full.
+
+POST /debug/profile is different. It starts a sampling thread (plus
+cProfile with cprofile=true) for the requested window, which costs CPU while
+it runs. It is refused unless PROFILER_TOKEN is set and the request carries
+that token, and one profile runs at a time for at most PROFILER_MAX_SECONDS.
+"""
+
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from uagents import Agent, Context, Model
+
+from common.llm import asi_client
+from common.llm_metrics import llm_metrics
+from common.memory_store import cache_stats
+from common.prompts import prefix_tracker
+from common.profiler import check_token, run_profile
+from common.watchdog import LoopWatchdog
+
+
+class HealthStatus(Model):
+    status: str
+    uptime: float  # seconds
+    loop_lag_ms: float
+
+
+class ReadinessStatus(Model):
+    ready: bool
+    reasons: List[str]
+    uptime: float  # seconds
+    loop_lag_ms: float
+    loop_lag_max_ms: float  # worst lag over the sampling window
+    queue_depth: int
+    queues: Dict[str, int]
+    running: int
+    memory_pending: int
+    llm_in_flight: int
+    llm_max_concurrency: int
+    memory_store_version: int
+    memories: int
+
+
+class LLMUsage(Model):
+    since: float  # unix time the counters started
+    templates: Dict[str, Dict[str, Any]]
+    prefixes: Dict[str, Dict[str, Any]] = {}  # stable-prefix reuse per template
+    limits: Dict[str, Dict[str, Any]] = {}  # adaptive max_tokens per template
+
+
+class LoopReport(Model):
+    threshold_ms: float
+    stalls: int
+    lag_ms: Dict[str, Any]
+    sites: List[Dict[str, Any]]  # worst call sites first, with their captured stack
+
+
+class ProfileRequest(Model):
+    token: str
+    seconds: float = 10.0
+    interval: float = 0.005  # seconds between stack samples
+    cprofile: bool = False
+
+
+class ProfileResult(Model):
+    error: str = ""
+    seconds: float = 0.0
+    samples: int = 0
+    interval: float = 0.0
+    collapsed: str = ""  # "frame;frame;frame count" lines
+    cprofile: str = ""
+    cprofile_scope: str = ""  # threads the cProfile summary covers
+
+
+def create_health_agent(name: str, schedulers: Optional[Dict] = None,
+                        batchers: Iterable = ()) -> Agent:
+    """
+    Health agent for one Bureau. Add exactly one per Bureau: REST paths are
+    shared by every agent of a Bureau.
+
+    Args:
+        name: System name, used for the agent name and seed
+        schedulers: Scheduler name -> PriorityScheduler of the hosted agents
+        batchers: MemoryBatchers of the hosted agents
+    """
+    agent = Agent(name=f"{name}_health", seed=f"{name}_health_seed_ETHMem_2024")
+    schedulers = dict(schedulers or {})
+    batchers = list(batchers)
+    monitor = LoopWatchdog()
+    max_loop_lag = float(os.getenv("HEALTH_MAX_LOOP_LAG_MS", "250"))
+    started_at = time.monotonic()
+
+    @agent.on_event("startup")
+    async def start_monitor(ctx: Context):
+        monitor.start()
+        ctx.logger.info(f"🩺 Serving /healthz, /readyz, /llm-metrics and /debug/loop for {len(schedulers)} schedulers")
+
+    # Startup handlers wait for agent registration, so the first probe also
+    # starts the monitor
+    @agent.on_rest_get("/healthz", HealthStatus)
+    async def healthz(ctx: Context) -> HealthStatus:
+        monitor.start()
+        return HealthStatus(status="ok", uptime=round(time.monotonic() - started_at, 3),
+                            loop_lag_ms=round(monitor.current * 1000, 2))
+
+    @agent.on_rest_get("/readyz", ReadinessStatus)
+    async def readyz(ctx: Context) -> ReadinessStatus:
+        monitor.start()
+        loop_lag_ms = monitor.current * 1000
+        queues = {scheduler_name: s.queue_depth for scheduler_name, s in schedulers.items()}
+        memory = cache_stats()
+
+        reasons = []
+        if loop_lag_ms > max_loop_lag:
+            reasons.append(f"event loop lag {loop_lag_ms:.0f}ms > {max_loop_lag:.0f}ms")
+        for scheduler_name, s in schedulers.items():
+            if queues[scheduler_name] >= s.max_queue:
+                reasons.append(f"{scheduler_name} queue full ({queues[scheduler_name]})")
+
+        return ReadinessStatus(
+            ready=not reasons,
+            reasons=reasons,
+            uptime=round(time.monotonic() - started_at, 3),
+            loop_lag_ms=round(loop_lag_ms, 2),
+            loop_lag_max_ms=round(monitor.worst * 1000, 2),
+            queue_depth=sum(queues.values()),
+            queues=queues,
+            running=sum(s.running for s in schedulers.values()),
+            memory_pending=sum(b.pending_count for b in batchers),
+            llm_in_flight=asi_client.in_flight,
+            llm_max_concurrency=asi_client.max_concurrency,
+            memory_store_version=memory["version"],
+            memories=memory["memories"],
+        )
+
+    @agent.on_rest_get("/llm-metrics", LLMUsage)
+    async def llm_usage(ctx: Context) -> LLMUsage:
+        return LLMUsage(**llm_metrics.snapshot(), prefixes=prefix_tracker.snapshot(),
+                        limits=asi_client.limits.snapshot())
+
+    @agent.on_rest_get("/debug/loop", LoopReport)
+    async def loop_report(ctx: Context) -> LoopReport:
+        monitor.start()
+        return LoopReport(**monitor.report())
+
+    @agent.on_rest_post("/debug/profile", ProfileRequest, ProfileResult)
+    async def profile(ctx: Context, req: ProfileRequest) -> ProfileResult:
+        refused = check_token(req.token)
+        if refused:
+            ctx.logger.warning(f"🔒 Profile request refused: {refused}")
+            return ProfileResult(error=refused)
+        ctx.logger.info(f"🔬 Profiling the event loop for {req.seconds}s")
+        try:
+            return ProfileResult(**await run_profile(req.seconds, req.interval, req.cprofile))
+        except RuntimeError as e:
+            return ProfileResult(error=str(e))
+
+    return agent
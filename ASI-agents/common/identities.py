@@ -0,0 +1,56 @@
+"""
+Agent Identities - cached seed -> address derivation
+Deriving an agent address from its seed costs a secp256k1 key derivation.
+Code that only needs to address an agent (the API gateway, clients, tools)
+looks the address up here instead of constructing the agent. Addresses are
+memoised per process and persisted in AGENT_IDENTITY_CACHE (default
+~/.cache/ethmem/agent_addresses.json), keyed by a hash of the seed so the
+cache never holds seeds or keys.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+_addresses: Optional[Dict[str, str]] = None
+
+
+def _cache_path() -> str:
+    return os.getenv("AGENT_IDENTITY_CACHE",
+                     os.path.join(os.path.expanduser("~"), ".cache", "ethmem", "agent_addresses.json"))
+
+
+def _load_cache() -> Dict[str, str]:
+    global _addresses
+    if _addresses is None:
+        try:
+            with open(_cache_path(), 'r') as f:
+                _addresses = json.load(f)
+        except (OSError, ValueError):
+            _addresses = {}
+    return _addresses
+
+
+def _save_cache(addresses: Dict[str, str]):
+    path = _cache_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(addresses, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[Identities] Could not write address cache {path}: {e}")
+
+
+def agent_address(seed: str) -> str:
+    """Address of the agent created with `seed` (derived once, then cached)"""
+    addresses = _load_cache()
+    key = hashlib.sha256(seed.encode()).hexdigest()
+    if key not in addresses:
+        # Deferred so cache hits never import the crypto stack
+        from uagents_core.identity import Identity
+        addresses[key] = Identity.from_seed(seed, 0).address
+        _save_cache(addresses)
+    return addresses[key]
@@ -0,0 +1,324 @@
+"""
+ASI LLM Client - non-blocking chat completions for agents and the API server
+All ASI calls go through one pooled aiohttp session with a bounded number of
+in-flight requests, so a slow completion never blocks the event loop that the
+agents of a Bureau (or the API server) share. Independent completions of one
+response can be fanned out concurrently under a shared deadline.
+
+max_tokens adapts per template: the client keeps the completion lengths of
+each template's last calls and, once it has seen enough, sends a high
+quantile of them plus headroom instead of the call site's fixed value. The
+limit is capped at ASI_MAX_TOKENS_CEILING times the call site's max_tokens;
+the default of 1 keeps the call site's value as the upper bound, and an
+operator can allow more (e.g. 2) so templates whose call site asks for too
+little can grow. Only complete replies count as samples: a reply without a
+usage block has no length, and one cut off ("length" finish reason) only
+shows a lower bound. Truncation is the guardrail: a reply cut off by a
+learned limit below the call site's value is retried once with that value,
+and a template truncating more often than ASI_MAX_TOKENS_TRUNCATION gets
+the ceiling until its rate recovers. ASI_ADAPTIVE_MAX_TOKENS=0 turns
+adaptation off.
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from common.llm_metrics import llm_metrics
+from common.prompts import prefix_tracker
+from common.tracing import tracer
+
+# ASI API Configuration (ASI_API_URL / ASI_MODEL override these, e.g. to point
+# benchmarks at the local stand-in in benchmarks/fake_asi_server.py)
+ASI_API_URL = "https://api.asi1.ai/v1/chat/completions"
+ASI_MODEL = "asi1-mini"
+
+
+class TemplateOutputs:
+    """Completion lengths and truncations of one template's recent calls"""
+
+    def __init__(self, window: int):
+        self.lengths: deque = deque(maxlen=window)
+        self.truncated: deque = deque(maxlen=window)
+        self.requested = 0
+        self.limit = 0
+        self.retries = 0
+        self.guardrail = False
+
+    @property
+    def truncation_rate(self) -> float:
+        return sum(self.truncated) / len(self.truncated) if self.truncated else 0.0
+
+    def quantile(self, q: float) -> int:
+        ordered = sorted(self.lengths)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0
+
+
+class OutputLimits:
+    """Per-template max_tokens learned from observed completion lengths"""
+
+    def __init__(self):
+        self.enabled = os.getenv("ASI_ADAPTIVE_MAX_TOKENS", "1").lower() not in ("0", "false", "no", "off")
+        self.quantile = float(os.getenv("ASI_MAX_TOKENS_QUANTILE", "0.99"))
+        self.headroom = float(os.getenv("ASI_MAX_TOKENS_HEADROOM", "1.25"))
+        self.min_samples = int(os.getenv("ASI_MAX_TOKENS_MIN_SAMPLES", "30"))
+        self.max_truncation = float(os.getenv("ASI_MAX_TOKENS_TRUNCATION", "0.02"))
+        self.window = int(os.getenv("ASI_MAX_TOKENS_WINDOW", "500"))
+        self.ceiling = max(1.0, float(os.getenv("ASI_MAX_TOKENS_CEILING", "1.0")))
+        self.floor = 32
+        self.templates: Dict[str, TemplateOutputs] = {}
+
+    def limit(self, template: str, requested: int) -> int:
+        """max_tokens for the next call of a template whose call site asks for `requested`"""
+        if not self.enabled or not template:
+            return requested
+        outputs = self.templates.get(template)
+        if outputs is None:
+            outputs = self.templates[template] = TemplateOutputs(self.window)
+        outputs.requested = requested
+        ceiling = max(requested, int(requested * self.ceiling))
+        if len(outputs.lengths) < self.min_samples:
+            outputs.limit = requested
+        elif outputs.truncation_rate > self.max_truncation:
+            if not outputs.guardrail:
+                print(f"⚠️ {template} truncates {outputs.truncation_rate:.1%} of replies; "
+                      f"max_tokens {'raised' if ceiling > requested else 'back'} to {ceiling}")
+            outputs.guardrail = True
+            outputs.limit = ceiling
+        else:
+            outputs.guardrail = False
+            learned = math.ceil(outputs.quantile(self.quantile) * self.headroom)
+            outputs.limit = min(ceiling, max(self.floor, learned))
+        return outputs.limit
+
+    def observe(self, template: str, completion_tokens: Optional[int], finish_reason: str):
+        """
+        Record a reply. Its length is a sample only if the reply reported
+        usage and was not cut off; truncations count towards the guardrail.
+        """
+        outputs = self.templates.get(template)
+        if outputs is None:
+            return
+        truncated = finish_reason == "length"
+        outputs.truncated.append(truncated)
+        if completion_tokens is not None and not truncated:
+            outputs.lengths.append(completion_tokens)
+
+    def snapshot(self) -> Dict:
+        """Current limit, output quantiles and truncation rate per template"""
+        return {
+            name: {
+                "requested": o.requested,
+                "limit": o.limit,
+                "samples": len(o.lengths),
+                "p50": o.quantile(0.5),
+                "p99": o.quantile(0.99),
+                "truncation_rate": round(o.truncation_rate, 4),
+                "retries": o.retries,
+                "guardrail": o.guardrail,
+            }
+            for name, o in sorted(self.templates.items())
+        }
+
+
+class ASIClient:
+    """Async client for the ASI chat completions API"""
+
+    def __init__(self, url: Optional[str] = None, model: Optional[str] = None,
+                 max_concurrency: Optional[int] = None, timeout: float = 30.0):
+        """
+        Args:
+            url: Chat completions endpoint (default ASI_API_URL from the environment)
+            model: Model used when a call does not name one (default ASI_MODEL)
+            max_concurrency: Maximum in-flight requests (ASI_MAX_CONCURRENCY, default 16)
+            timeout: Total seconds allowed per request
+        """
+        self._url = url
+        self._model = model
+        self.max_concurrency = max_concurrency or int(os.getenv("ASI_MAX_CONCURRENCY", "16"))
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.in_flight = 0
+        self.stats = {"calls": 0, "failures": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self.limits = OutputLimits()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def api_key(self) -> Optional[str]:
+        # Read on use so load_dotenv() in the importing script still applies
+        return os.getenv("ASI_ONE_API_KEY")
+
+    @property
+    def url(self) -> str:
+        return self._url or os.getenv("ASI_API_URL", ASI_API_URL)
+
+    @property
+    def model(self) -> str:
+        return self._model or os.getenv("ASI_MODEL", ASI_MODEL)
+
+    def _bind_loop(self) -> aiohttp.ClientSession:
+        # Sessions and semaphores belong to one event loop; rebuild them if
+        # the client is used from a new loop (e.g. separate asyncio.run calls)
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._loop = loop
+            self._session = aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: int, template: str = "",
+                       **params) -> Dict[str, Any]:
+        """
+        Run a chat completion and return the raw response body.
+        Raises on a missing API key or HTTP errors so callers can fall back
+        to their rule-based answers. `template` ("<domain>.<template>") tags
+        the call's tokens, latency and finish reason in common.llm_metrics and
+        its stable-prefix hash in common.prompts.prefix_tracker, and keys the
+        adaptive max_tokens; `max_tokens` is the call site's limit.
+        """
+        if not self.api_key:
+            raise ValueError("ASI_ONE_API_KEY not configured")
+
+        limit = self.limits.limit(template, max_tokens)
+        result = await self._complete(messages, limit, template, **params)
+        if limit < max_tokens and finish_reason_of(result) == "length":
+            # Guardrail: the learned limit cut this reply off, answer with the call site's
+            self.limits.templates[template].retries += 1
+            result = await self._complete(messages, max_tokens, template, **params)
+        return result
+
+    async def _complete(self, messages: List[Dict[str, str]], max_tokens: int, template: str,
+                        **params) -> Dict[str, Any]:
+        session = self._bind_loop()
+        payload = {"model": self.model, "messages": messages, "max_tokens": max_tokens, **params}
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        prefix = prefix_tracker.observe(template, messages)
+
+        # Child of the span current in the calling task, if any
+        with tracer.span("asi.chat", None, model=payload["model"], max_tokens=max_tokens,
+                         template=template, prefix=prefix) as span:
+            queued_at = time.monotonic()
+            async with self._semaphore:
+                span.set(queue_ms=round((time.monotonic() - queued_at) * 1000, 2))
+                self.in_flight += 1
+                self.stats["calls"] += 1
+                started = time.monotonic()
+                try:
+                    async with session.post(self.url, json=payload, headers=headers) as response:
+                        response.raise_for_status()
+                        result = await response.json()
+                except Exception:
+                    self.stats["failures"] += 1
+                    llm_metrics.record(template, payload["model"], (time.monotonic() - started) * 1000,
+                                       max_tokens=max_tokens)
+                    raise
+                finally:
+                    self.in_flight -= 1
+
+            usage = result.get("usage") or {}
+            prompt_tokens, completion_tokens = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+            finish_reason = finish_reason_of(result)
+            llm_metrics.record(template, payload["model"], (time.monotonic() - started) * 1000,
+                               prompt_tokens, completion_tokens, finish_reason, max_tokens)
+            self.limits.observe(template, usage.get("completion_tokens"), finish_reason)
+            span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, finish_reason=finish_reason)
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["completion_tokens"] += completion_tokens
+        return result
+
+    async def chat(self, messages: List[Dict[str, str]], max_tokens: int, **params) -> str:
+        """Run a chat completion and return the stripped message content"""
+        result = await self.complete(messages, max_tokens, **params)
+        return result['choices'][0]['message']['content'].strip()
+
+    async def chat_json(self, messages: List[Dict[str, str]], max_tokens: int,
+                        required: Optional[Dict[str, type]] = None, **params) -> Dict[str, Any]:
+        """
+        Run a chat completion that must answer with a JSON object.
+        Raises ValueError unless the reply is an object whose `required` keys
+        hold values of the given types.
+        """
+        content = await self.chat(messages, max_tokens, **params)
+        data = parse_json_object(content)
+        for key, expected in (required or {}).items():
+            if not isinstance(data.get(key), expected):
+                raise ValueError(f"Structured reply field '{key}' is missing or not a {expected.__name__}")
+        return data
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+# Shared client used by every agent and the API server in a process
+asi_client = ASIClient()
+
+
+def finish_reason_of(result: Dict[str, Any]) -> str:
+    return (result.get("choices") or [{}])[0].get("finish_reason") or "unknown"
+
+
+def parse_json_object(text: str) -> Dict[str, Any]:
+    """Extract the JSON object of a completion, tolerating code fences and chatter"""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("No JSON object in completion")
+    data = json.loads(text[start:end + 1])
+    if not isinstance(data, dict):
+        raise ValueError("Completion JSON is not an object")
+    return data
+
+
+def structured_mode_enabled(domain: str) -> bool:
+    """
+    Whether a domain answers analysis and recommendations in one structured
+    completion. ASI_STRUCTURED_MODE is a comma separated list of domains
+    (medical, legal, support, financial) or "all".
+    """
+    enabled = {d.strip().lower() for d in os.getenv("ASI_STRUCTURED_MODE", "").split(",") if d.strip()}
+    return "all" in enabled or domain in enabled
+
+
+async def fan_out(steps: Dict[str, Tuple[Awaitable[Any], Callable[[], Any]]],
+                  deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Run independent LLM steps concurrently under one shared deadline.
+
+    Each step is a (coroutine, fallback) pair. A step that raises or is still
+    running when the deadline (ASI_FANOUT_DEADLINE, default 20s) expires is
+    cancelled and gets its fallback value; the other steps keep their results.
+    """
+    if deadline is None:
+        deadline = float(os.getenv("ASI_FANOUT_DEADLINE", "20"))
+    tasks = {name: asyncio.ensure_future(coro) for name, (coro, _) in steps.items()}
+    done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results = {}
+    for name, task in tasks.items():
+        if task in done and task.exception() is None:
+            results[name] = task.result()
+            continue
+        if task in done:
+            print(f"ASI step '{name}' failed: {task.exception()}. Using fallback.")
+        else:
+            print(f"ASI step '{name}' missed the {deadline}s deadline. Using fallback.")
+        results[name] = steps[name][1]()
+    return results
@@ -0,0 +1,249 @@
+"""
+LLM Usage Metrics - token, latency and finish reason accounting per template
+Every ASI call is tagged with the prompt template that produced it, named
+"<domain>.<template>" (e.g. "legal.analysis"). For each template the process
+keeps fixed-bucket histograms of latency, prompt tokens and completion tokens,
+finish reason counts (a high "length" share means max_tokens is too small) and
+an estimated cost from ASI_PRICE_PROMPT_PER_1K / ASI_PRICE_COMPLETION_PER_1K.
+
+The histograms are served by the API server (GET /metrics/llm) and by each
+Bureau's health agent (GET /llm-metrics). With LLM_USAGE_FILE set, every call
+is also appended as one JSON line, so calls of all processes (Bureaus and API
+workers) can be aggregated offline:
+
+    python common/llm_metrics.py [--file data/llm/usage.jsonl | --url http://localhost:8080/metrics/llm] [--sort latency]
+
+Live endpoints also report prompt-prefix reuse (common/prompts.py) and the
+adaptive max_tokens (common/llm.py) per template.
+"""
+
+import argparse
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Upper bounds of the histogram buckets (the last bucket is unbounded)
+LATENCY_BUCKETS_MS = [50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 20000, 30000]
+TOKEN_BUCKETS = [16, 32, 64, 96, 128, 192, 256, 384, 512, 768, 1024, 1536, 2048, 4096]
+
+UNTAGGED = "untagged"
+
+
+class Histogram:
+    """Per-bucket (not cumulative) counts with sum, count and max"""
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """q-quantile estimated by linear interpolation inside its bucket"""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i else 0.0
+                upper = min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+                return round(lower + (upper - lower) * (rank - seen) / n, 3)
+            seen += n
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "mean": round(self.sum / self.count, 3) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": round(self.max, 3),
+            "buckets": {("+Inf" if i == len(self.bounds) else str(self.bounds[i])): n
+                        for i, n in enumerate(self.counts)},
+        }
+
+
+class TemplateStats:
+    """Accumulated usage of one prompt template"""
+
+    def __init__(self):
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.completion_tokens = Histogram(TOKEN_BUCKETS)
+        self.finish_reasons: Dict[str, int] = {}
+        self.max_tokens = 0
+
+    def record(self, latency_ms: float, prompt_tokens: int, completion_tokens: int,
+               finish_reason: str, max_tokens: int):
+        self.latency_ms.observe(latency_ms)
+        self.finish_reasons[finish_reason] = self.finish_reasons.get(finish_reason, 0) + 1
+        self.max_tokens = max(self.max_tokens, max_tokens)
+        if finish_reason != "error":
+            self.prompt_tokens.observe(prompt_tokens)
+            self.completion_tokens.observe(completion_tokens)
+
+
+def call_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated spend of one call from the configured per-1K token prices"""
+    return (prompt_tokens * float(os.getenv("ASI_PRICE_PROMPT_PER_1K", "0")) +
+            completion_tokens * float(os.getenv("ASI_PRICE_COMPLETION_PER_1K", "0"))) / 1000
+
+
+class LLMMetrics:
+    """Per-template usage histograms of one process, plus the optional usage log"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: JSON lines file receiving every call (LLM_USAGE_FILE, default off)
+        """
+        self.path = path if path is not None else os.getenv("LLM_USAGE_FILE", "")
+        self.templates: Dict[str, TemplateStats] = {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._file = None
+
+    def record(self, template: str, model: str, latency_ms: float, prompt_tokens: int = 0,
+               completion_tokens: int = 0, finish_reason: str = "error", max_tokens: int = 0):
+        template = template or UNTAGGED
+        with self._lock:
+            stats = self.templates.get(template)
+            if stats is None:
+                stats = self.templates[template] = TemplateStats()
+            stats.record(latency_ms, prompt_tokens, completion_tokens, finish_reason, max_tokens)
+            if self.path:
+                self._write({
+                    "ts": round(time.time(), 3), "template": template, "model": model,
+                    "latency_ms": round(latency_ms, 2), "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens, "finish_reason": finish_reason,
+                    "max_tokens": max_tokens,
+                })
+
+    def _write(self, call: Dict):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps(call, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def snapshot(self) -> Dict:
+        """Histograms of every template, keyed by template name"""
+        with self._lock:
+            templates = {}
+            for name, stats in sorted(self.templates.items()):
+                prompt, completion = stats.prompt_tokens.sum, stats.completion_tokens.sum
+                templates[name] = {
+                    "domain": name.split(".", 1)[0],
+                    "calls": stats.latency_ms.count,
+                    "max_tokens": stats.max_tokens,
+                    "finish_reasons": dict(stats.finish_reasons),
+                    "latency_ms": stats.latency_ms.to_dict(),
+                    "prompt_tokens": stats.prompt_tokens.to_dict(),
+                    "completion_tokens": stats.completion_tokens.to_dict(),
+                    "cost": round(call_cost(int(prompt), int(completion)), 6),
+                }
+        return {"since": self.started_at, "templates": templates}
+
+
+# Shared metrics of every ASI call in a process (recorded by common.llm.ASIClient)
+llm_metrics = LLMMetrics()
+
+
+# ============ REPORT TOOL ============
+def load_usage(path: str) -> Dict:
+    """Rebuild a snapshot from a usage log written by one or more processes"""
+    metrics = LLMMetrics(path="")
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                call = json.loads(line)
+            except ValueError:
+                continue  # torn last line
+            metrics.record(call["template"], call.get("model", ""), call["latency_ms"],
+                           call.get("prompt_tokens", 0), call.get("completion_tokens", 0),
+                           call.get("finish_reason", "error"), call.get("max_tokens", 0))
+    return metrics.snapshot()
+
+
+def print_report(snapshot: Dict, sort: str = "latency"):
+    """Templates ranked by their share of total latency, tokens or cost"""
+    templates = snapshot["templates"]
+    if not templates:
+        print("No LLM calls recorded")
+        return
+    keys = {
+        "latency": lambda t: t["latency_ms"]["sum"],
+        "tokens": lambda t: t["prompt_tokens"]["sum"] + t["completion_tokens"]["sum"],
+        "cost": lambda t: t["cost"],
+        "calls": lambda t: t["calls"],
+    }
+    total_latency = sum(t["latency_ms"]["sum"] for t in templates.values()) or 1
+    total_tokens = sum(keys["tokens"](t) for t in templates.values()) or 1
+
+    print(f"\n💸 LLM usage by template ({sum(t['calls'] for t in templates.values())} calls, sorted by {sort})")
+    print(f"{'template':<32}{'calls':>7}{'p50 ms':>9}{'p95 ms':>9}{'time%':>7}"
+          f"{'prompt':>9}{'compl':>8}{'p95 out':>9}{'max_tok':>9}{'tok%':>6}{'length':>8}{'errors':>8}{'cost':>10}")
+    for name, t in sorted(templates.items(), key=lambda item: -keys[sort](item[1])):
+        calls = t["calls"] or 1
+        reasons = t["finish_reasons"]
+        print(f"{name[:32]:<32}{t['calls']:>7}{t['latency_ms']['p50']:>9.0f}{t['latency_ms']['p95']:>9.0f}"
+              f"{t['latency_ms']['sum'] / total_latency * 100:>6.1f}%"
+              f"{t['prompt_tokens']['mean']:>9.0f}{t['completion_tokens']['mean']:>8.0f}"
+              f"{t['completion_tokens']['p95']:>9.0f}{t['max_tokens']:>9}"
+              f"{keys['tokens'](t) / total_tokens * 100:>5.1f}%"
+              f"{reasons.get('length', 0) / calls * 100:>7.1f}%{reasons.get('error', 0) / calls * 100:>7.1f}%"
+              f"{t['cost']:>10.4f}")
+    print("\nprompt/compl are mean tokens per call; length is the share of replies cut off at max_tokens")
+
+    limits = snapshot.get("limits") or {}
+    if limits:
+        print("\n📏 Adaptive max_tokens (learned from recent completion lengths)")
+        print(f"{'template':<32}{'samples':>8}{'p50':>7}{'p99':>7}{'site':>7}{'limit':>7}{'trunc':>8}{'retries':>9}")
+        for name, l in sorted(limits.items()):
+            print(f"{name[:32]:<32}{l['samples']:>8}{l['p50']:>7}{l['p99']:>7}{l['requested']:>7}{l['limit']:>7}"
+                  f"{l['truncation_rate'] * 100:>7.1f}%{l['retries']:>9}" + ("  guardrail" if l["guardrail"] else ""))
+
+    prefixes = snapshot.get("prefixes") or {}
+    if prefixes:
+        print("\n🧩 Prompt prefixes (stable system prompt reused across calls)")
+        print(f"{'template':<32}{'calls':>7}{'variants':>10}{'prefix B':>10}{'prompt B':>10}{'cacheable':>11}")
+        for name, p in sorted(prefixes.items(), key=lambda item: item[1]["cacheable_share"]):
+            calls = p["calls"] or 1
+            print(f"{name[:32]:<32}{p['calls']:>7}{p['variants']:>10}{p['prefix_bytes'] / calls:>10.0f}"
+                  f"{p['prompt_bytes'] / calls:>10.0f}{p['cacheable_share'] * 100:>10.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report LLM token, latency and finish reason usage per template")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--file", default=os.getenv("LLM_USAGE_FILE", os.path.join("data", "llm", "usage.jsonl")),
+                        help="Usage log written with LLM_USAGE_FILE")
+    source.add_argument("--url", help="Live metrics endpoint, e.g. http://localhost:8080/metrics/llm")
+    parser.add_argument("--sort", choices=["latency", "tokens", "cost", "calls"], default="latency")
+    parser.add_argument("--json", action="store_true", help="Print the raw snapshot")
+    args = parser.parse_args()
+
+    if args.url:
+        from urllib.request import urlopen
+        with urlopen(args.url, timeout=10) as response:
+            snapshot = json.loads(response.read())
+    elif os.path.exists(args.file):
+        snapshot = load_usage(args.file)
+    else:
+        print(f"No usage log at {args.file} (run the agents with LLM_USAGE_FILE set)")
+        raise SystemExit(1)
+    if args.json:
+        print(json.dumps(snapshot, indent=2))
+    else:
+        print_report(snapshot, args.sort)
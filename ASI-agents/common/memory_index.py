@@ -0,0 +1,178 @@
+"""
+Memory Index - compact memory-mapped lookup file shared by API workers
+One builder process packs every domain's memory export into a single file of
+per-user record blobs plus a sorted key table. Workers map the file read-only,
+so all of them share the same page cache instead of each parsing its own copy
+of every memory file; a lookup is a binary search over the mapped table and
+decodes only the requested user's records.
+
+Layout (little endian):
+    header  magic "EMX1" | version u32 | entries u32 | keys offset u64 | table offset u64
+    blobs   compact JSON array of records per (domain, user)
+    keys    "<domain>\\x1f<user id>" bytes, one per entry
+    table   entries x (key offset u64 | key length u32 | blob offset u64 | blob length u32),
+            sorted by key
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+MAGIC = b"EMX1"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIIQQ")
+ENTRY = struct.Struct("<QIQI")
+KEY_SEPARATOR = b"\x1f"
+
+
+def _index_key(domain: str, user_id: str) -> bytes:
+    return domain.encode() + KEY_SEPARATOR + str(user_id).encode()
+
+
+def _source_signature(sources: Dict[str, str]) -> Tuple:
+    signature = []
+    for domain, path in sorted(sources.items()):
+        try:
+            stat = os.stat(path)
+            signature.append((domain, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((domain, None, None))
+    return tuple(signature)
+
+
+def build_index(sources: Dict[str, str], out_path: str) -> Dict[str, int]:
+    """
+    Pack the memory exports of `sources` (domain -> JSON file) into an index
+    file. Records are keyed by their user_id and patient_id fields, matching
+    the API server's per-user filter. The file is replaced atomically so
+    mapped readers never see a partial index.
+    """
+    grouped: Dict[bytes, List[Dict]] = defaultdict(list)
+    for domain, path in sources.items():
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, 'r') as f:
+                memories = json.load(f).get("memories", [])
+        except Exception as e:
+            print(f"[MemoryIndex] Skipping {path}: {e}")
+            continue
+        for memory in memories:
+            owners = {memory.get("user_id"), memory.get("patient_id")} - {None}
+            for owner in owners:
+                grouped[_index_key(domain, owner)].append(memory)
+
+    keys = sorted(grouped)
+    blobs = [json.dumps(grouped[key], separators=(",", ":")).encode() for key in keys]
+
+    offset = HEADER.size
+    blob_offsets = []
+    for blob in blobs:
+        blob_offsets.append(offset)
+        offset += len(blob)
+    keys_offset = offset
+    key_offsets = []
+    for key in keys:
+        key_offsets.append(offset)
+        offset += len(key)
+    table_offset = offset
+
+    tmp_path = f"{out_path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(keys), keys_offset, table_offset))
+        for blob in blobs:
+            f.write(blob)
+        for key in keys:
+            f.write(key)
+        for key, key_offset, blob, blob_offset in zip(keys, key_offsets, blobs, blob_offsets):
+            f.write(ENTRY.pack(key_offset, len(key), blob_offset, len(blob)))
+    os.replace(tmp_path, out_path)
+
+    return {"entries": len(keys), "bytes": table_offset + len(keys) * ENTRY.size}
+
+
+def watch_sources(sources: Dict[str, str], out_path: str, interval: float = 5.0) -> threading.Thread:
+    """Rebuild the index in a daemon thread whenever a memory export changes"""
+    # Taken before the thread starts, so a change made right after this call
+    # is not mistaken for the baseline
+    signature = _source_signature(sources)
+
+    def run():
+        nonlocal signature
+        while True:
+            time.sleep(interval)
+            current = _source_signature(sources)
+            if current != signature:
+                signature = current
+                try:
+                    stats = build_index(sources, out_path)
+                    print(f"[MemoryIndex] Rebuilt {out_path}: {stats['entries']} users, {stats['bytes']} bytes")
+                except Exception as e:
+                    print(f"[MemoryIndex] Rebuild failed: {e}")
+
+    thread = threading.Thread(target=run, name="memory-index-builder", daemon=True)
+    thread.start()
+    return thread
+
+
+class MemoryIndex:
+    """Read-only view of an index file; remaps when the builder replaces it"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map: Optional[mmap.mmap] = None
+        self._version = None
+        self.entries = 0
+        self._table_offset = 0
+        self._open()
+
+    def _open(self):
+        stat = os.stat(self.path)
+        with open(self.path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, entries, _, table_offset = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            mapped.close()
+            raise ValueError(f"{self.path} is not a version {FORMAT_VERSION} memory index")
+        if self._map is not None:
+            self._map.close()
+        self._map = mapped
+        self._version = (stat.st_ino, stat.st_mtime_ns)
+        self.entries = entries
+        self._table_offset = table_offset
+
+    def refresh(self):
+        """Map the current file if the builder has replaced it"""
+        stat = os.stat(self.path)
+        if (stat.st_ino, stat.st_mtime_ns) != self._version:
+            self._open()
+
+    def _entry(self, position: int) -> Tuple[int, int, int, int]:
+        return ENTRY.unpack_from(self._map, self._table_offset + position * ENTRY.size)
+
+    def lookup(self, domain: str, user_id: str) -> List[Dict]:
+        """Return the records of one user in one domain (empty if unknown)"""
+        self.refresh()
+        key = _index_key(domain, user_id)
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            key_offset, key_length, blob_offset, blob_length = self._entry(middle)
+            current = self._map[key_offset:key_offset + key_length]
+            if current == key:
+                return json.loads(self._map[blob_offset:blob_offset + blob_length])
+            if current < key:
+                low = middle + 1
+            else:
+                high = middle
+        return []
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
@@ -0,0 +1,223 @@
+"""
+Batched Memory Protocol - multi-user memory lookups in a single message
+Professional agents coalesce pending lookups into one BatchedMemoryRequest
+(flushed after a short window or once N lookups are queued) and memory agents
+answer every entry of the batch in one pass over their memory store.
+
+Every memory protocol serving BatchedMemoryRequest declares
+MEMORY_PROTOCOL_VERSION. uAgents matches messages by schema digest, so a
+change to these models is a breaking protocol change and bumps the major
+version: peers on different versions no longer exchange batches, and the
+version tells why.
+"""
+
+import asyncio
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from uagents import Context, Model
+
+from common.tracing import Span, tracer
+
+
+# 2.0.0: MemoryLookup.traceparent
+MEMORY_PROTOCOL_VERSION = "2.0.0"
+
+
+# ============ MESSAGE MODELS ============
+class MemoryLookup(Model):
+    """A single (correlation_id, user_id, filter) entry of a batched request"""
+    correlation_id: str
+    user_id: str
+    categories: list[str] = []  # empty means every category
+    limit: int = 10  # 0 means no limit
+    traceparent: str = ""  # trace context of the waiting consultation (common/tracing.py)
+
+
+class BatchedMemoryRequest(Model):
+    """Model for requesting memories of many users at once"""
+    lookups: list[MemoryLookup]
+
+
+class MemoryLookupResult(Model):
+    """Memories matching one lookup of a batched request"""
+    correlation_id: str
+    user_id: str
+    memories: list[dict]
+    count: int
+
+
+class BatchedMemoryResponse(Model):
+    """Model for batched memory responses"""
+    results: list[MemoryLookupResult]
+
+
+# ============ MEMORY AGENT SIDE ============
+def memory_owner(memory: Dict) -> Optional[str]:
+    """Return the user a memory belongs to, or None for single-user stores"""
+    return memory.get("user_id") or memory.get("patient_id")
+
+
+def answer_batch(memories: List[Dict], lookups: List[MemoryLookup]) -> List[MemoryLookupResult]:
+    """
+    Answer every lookup of a batch with a single pass over the memory list.
+    Lookups are indexed by category so each memory is only matched against
+    the lookups that can actually use it.
+    """
+    matches: Dict[str, List[Dict]] = {lookup.correlation_id: [] for lookup in lookups}
+    by_category: Dict[str, List[MemoryLookup]] = {}
+    any_category: List[MemoryLookup] = []
+    for lookup in lookups:
+        if lookup.categories:
+            for category in set(lookup.categories):
+                by_category.setdefault(category, []).append(lookup)
+        else:
+            any_category.append(lookup)
+
+    unfilled = sum(1 for lookup in lookups if lookup.limit)
+    unlimited = len(lookups) - unfilled
+
+    for memory in memories:
+        if not unfilled and not unlimited:
+            break
+        owner = memory_owner(memory)
+        candidates = by_category.get(memory.get("category"), [])
+        for lookup in (candidates + any_category) if any_category else candidates:
+            if owner and owner != lookup.user_id:
+                continue
+            found = matches[lookup.correlation_id]
+            if lookup.limit and len(found) >= lookup.limit:
+                continue
+            found.append(memory)
+            if lookup.limit and len(found) == lookup.limit:
+                unfilled -= 1
+
+    return [
+        MemoryLookupResult(
+            correlation_id=lookup.correlation_id,
+            user_id=lookup.user_id,
+            memories=matches[lookup.correlation_id],
+            count=len(matches[lookup.correlation_id])
+        )
+        for lookup in lookups
+    ]
+
+
+def batch_spans(lookups: List[MemoryLookup], service: str) -> List[Span]:
+    """One span per traced consultation served by a batch (end them once it is answered)"""
+    traces = dict.fromkeys(lookup.traceparent for lookup in lookups if lookup.traceparent)
+    return [tracer.start_span("memory.answer_batch", service, parent, batch_size=len(lookups))
+            for parent in traces]
+
+
+# ============ PROFESSIONAL AGENT SIDE ============
+class MemoryBatcher:
+    """
+    Coalesces memory lookups of a professional agent into batched requests.
+    Each submitted lookup carries an opaque context (typically the original
+    sender and query) that is handed back when its result arrives.
+    With a shard ring configured (see use_shards) a flush sends one batch per
+    memory shard, each holding the lookups of the users that shard owns.
+    """
+
+    def __init__(self, destination: str = "", window: float = 0.005,
+                 max_batch: int = 32, pending_ttl: float = 120.0):
+        """
+        Args:
+            destination: Address of the memory agent serving the lookups
+            window: Seconds to wait for more lookups before flushing a batch
+            max_batch: Flush immediately once this many lookups are queued
+            pending_ttl: Seconds after which an unanswered lookup is dropped
+        """
+        self.destination = destination
+        self.window = window
+        self.max_batch = max_batch
+        self.pending_ttl = pending_ttl
+        self._queued: List[MemoryLookup] = []
+        self._pending: Dict[str, tuple[float, Any, Optional[Span]]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._ctx: Optional[Context] = None
+        self.ring = None  # common.sharding.HashRing
+        self.shard_addresses: Dict[str, str] = {}
+
+    def use_shards(self, ring, shard_addresses: Dict[str, str]):
+        """Route lookups by user_id over a hash ring of memory shard agents"""
+        missing = set(ring.nodes) - set(shard_addresses)
+        if missing:
+            raise ValueError(f"No address for memory shards: {', '.join(sorted(missing))}")
+        self.ring = ring
+        self.shard_addresses = dict(shard_addresses)
+
+    @property
+    def pending_count(self) -> int:
+        """Number of lookups waiting for a memory response"""
+        return len(self._pending)
+
+    async def submit(self, ctx: Context, user_id: str, categories: Optional[List[str]] = None,
+                     limit: int = 10, context: Any = None, traceparent: str = "",
+                     span: Optional[Span] = None) -> str:
+        """
+        Queue a lookup and return its correlation id. `span` (the caller's
+        span for the round trip) is ended with an error if the lookup expires;
+        otherwise the caller ends it once the result arrives.
+        """
+        correlation_id = uuid.uuid4().hex
+        self._pending[correlation_id] = (time.monotonic(), context, span)
+        self._queued.append(MemoryLookup(
+            correlation_id=correlation_id,
+            user_id=user_id,
+            categories=list(categories or []),
+            limit=limit,
+            traceparent=traceparent
+        ))
+        self._ctx = ctx
+
+        if len(self._queued) >= self.max_batch:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_after_window())
+        return correlation_id
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        """Send every queued lookup to the memory agent as one batch"""
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+            self._flush_task = None
+        if not self._queued or self._ctx is None:
+            return
+
+        batch, self._queued = self._queued, []
+        self._expire_pending()
+        routed = self._route(batch)
+        for destination, lookups in routed.items():
+            await self._ctx.send(destination, BatchedMemoryRequest(lookups=lookups))
+        if len(routed) > 1:
+            self._ctx.logger.info(f"🧠 Sent {len(batch)} memory lookups to {len(routed)} shards")
+        else:
+            self._ctx.logger.info(f"🧠 Sent batched memory request with {len(batch)} lookups")
+
+    def _route(self, batch: List[MemoryLookup]) -> Dict[str, List[MemoryLookup]]:
+        if self.ring is None:
+            return {self.destination: batch}
+        routed: Dict[str, List[MemoryLookup]] = {}
+        for lookup in batch:
+            address = self.shard_addresses[self.ring.node_for(lookup.user_id)]
+            routed.setdefault(address, []).append(lookup)
+        return routed
+
+    def complete(self, correlation_id: str) -> Any:
+        """Pop the context stored for a lookup, or None if it is unknown/expired"""
+        entry = self._pending.pop(correlation_id, None)
+        return entry[1] if entry else None
+
+    def _expire_pending(self):
+        cutoff = time.monotonic() - self.pending_ttl
+        for correlation_id in [cid for cid, (queued_at, _, _) in self._pending.items() if queued_at < cutoff]:
+            _, _, span = self._pending.pop(correlation_id)
+            if span is not None:
+                span.end(TimeoutError(f"no memory response within {self.pending_ttl:g}s"))
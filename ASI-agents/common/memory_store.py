@@ -0,0 +1,64 @@
+"""
+Memory Store Cache - process-wide parsed memory exports
+Memory files (browser extension JSON exports) are parsed once per process and
+shared by every storage interface, agent and API handler that reads them. A
+file is only parsed again when its size or modification time changes, so
+several domains hosted in one process do not each keep their own copy.
+The store version counts (re)loads and invalidations, so health probes can
+tell when a process picked up new memories.
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+_cache: Dict[str, Tuple[Tuple[int, int], List[Dict]]] = {}
+_lock = threading.Lock()
+_version = 0
+
+
+def load_memory_file(path: str) -> List[Dict]:
+    """
+    Return the "memories" list of a JSON export.
+    Raises if the file cannot be read or parsed; the returned list is shared
+    and must not be modified by callers.
+    """
+    global _version
+    key = os.path.abspath(path)
+    stat = os.stat(key)
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _cache.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    with _lock:
+        cached = _cache.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+        with open(key, 'r') as f:
+            memories = json.load(f).get("memories", [])
+        _cache[key] = (version, memories)
+        _version += 1
+        return memories
+
+
+def invalidate(path: Optional[str] = None):
+    """Drop one cached file (or all of them) so the next read parses again"""
+    global _version
+    with _lock:
+        _version += 1
+        if path is None:
+            _cache.clear()
+        else:
+            _cache.pop(os.path.abspath(path), None)
+
+
+def cache_stats() -> Dict[str, int]:
+    """Number of cached files and memories held by this process, and the store version"""
+    return {
+        "version": _version,
+        "files": len(_cache),
+        "memories": sum(len(memories) for _, memories in _cache.values()),
+    }
@@ -0,0 +1,205 @@
+"""
+Sampling Profiler - on-demand CPU profiles of a running api_server or Bureau
+POST /debug/profile (api_server, and each Bureau's health agent) samples the
+stack of the event-loop thread for N seconds from a short-lived background
+thread and answers with collapsed stacks ("frame;frame;frame count" lines, the
+input of flamegraph.pl and speedscope). With cprofile=true the same window is
+also traced by cProfile, summarised for the repo's own functions (the agent
+handlers and what they call) by cumulative time. Before Python 3.12 cProfile
+traces only the event-loop thread. From 3.12 (the Docker image runs 3.13) it
+is built on the interpreter-wide sys.monitoring, so the summary also counts
+calls made in other threads (executor jobs, the watchdog, log compression).
+The reply's cprofile_scope says which applies. The sampler's own frames are
+left out of the summary.
+
+Nothing runs until a profile is requested: no thread, no profiling hook. The
+endpoint is refused unless PROFILER_TOKEN is set, and the request must carry
+that token. Windows are capped at PROFILER_MAX_SECONDS (default 60) and one
+profile runs at a time per process.
+
+Client (writes the .folded file, an SVG flamegraph and the cProfile summary):
+    python common/profiler.py --url http://localhost:9000/debug/profile --seconds 10 [--svg law.svg] [--cprofile]
+"""
+
+import argparse
+import asyncio
+import cProfile
+import hmac
+import html
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# cProfile is built on sys.monitoring, which sees every thread, from 3.12 on
+CPROFILE_SCOPE = "all threads" if sys.version_info >= (3, 12) else "event-loop thread"
+
+_running = threading.Lock()
+
+
+def check_token(token: str) -> Optional[str]:
+    """Why a profile request is refused, or None if it may run"""
+    expected = os.getenv("PROFILER_TOKEN", "")
+    if not expected:
+        return "profiling disabled (PROFILER_TOKEN not set)"
+    if not hmac.compare_digest(token.encode(), expected.encode()):
+        return "invalid profiler token"
+    return None
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float, stop: threading.Event) -> Counter:
+    """Collapsed stacks of one thread, sampled every `interval` seconds"""
+    stacks: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while not stop.is_set() and time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            stacks[";".join(reversed(labels))] += 1
+        stop.wait(interval)
+    return stacks
+
+
+def cprofile_summary(profile: cProfile.Profile, top: int) -> str:
+    """Repo functions of a cProfile run by cumulative time, the profiler's own excluded"""
+    out = io.StringIO()
+    stats = pstats.Stats(profile, stream=out)
+    own = re.escape(os.path.join("common", "profiler.py"))
+    stats.sort_stats("cumulative").print_stats(f"{re.escape(ROOT)}(?!.*{own})", top)
+    return out.getvalue()
+
+
+async def run_profile(seconds: float, interval: float = 0.005, cprofile: bool = False,
+                      top: int = 40) -> Dict:
+    """
+    Profile the calling event loop's thread for `seconds`.
+    Raises RuntimeError if a profile is already running in this process.
+    """
+    seconds = max(0.1, min(seconds, float(os.getenv("PROFILER_MAX_SECONDS", "60"))))
+    interval = max(0.001, interval)
+    if not _running.acquire(blocking=False):
+        raise RuntimeError("a profile is already running")
+    try:
+        loop_thread = threading.get_ident()
+        stop = threading.Event()
+        profile = cProfile.Profile() if cprofile else None
+        started = time.monotonic()
+        if profile is not None:
+            profile.enable()  # CPROFILE_SCOPE: this thread only, or every thread on 3.12+
+        try:
+            stacks = await asyncio.get_running_loop().run_in_executor(
+                None, sample_stacks, loop_thread, seconds, interval, stop)
+        finally:
+            stop.set()
+            if profile is not None:
+                profile.disable()
+        return {
+            "seconds": round(time.monotonic() - started, 3),
+            "samples": sum(stacks.values()),
+            "interval": interval,
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()),
+            "cprofile": cprofile_summary(profile, top) if profile is not None else "",
+            "cprofile_scope": CPROFILE_SCOPE if profile is not None else "",
+        }
+    finally:
+        _running.release()
+
+
+def render_flamegraph(collapsed: str, title: str = "CPU profile", width: int = 1200) -> str:
+    """Minimal SVG flamegraph of collapsed stacks (hover a frame for its share)"""
+    root: Dict = {"count": 0, "children": {}}
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if not stack:
+            continue
+        root["count"] += int(count)
+        node = root
+        for frame in stack.split(";"):
+            node = node["children"].setdefault(frame, {"count": 0, "children": {}})
+            node["count"] += int(count)
+
+    row, rects = 16, []
+    total = max(root["count"], 1)
+
+    def depth_of(node) -> int:
+        return 1 + max((depth_of(child) for child in node["children"].values()), default=0)
+
+    height = (depth_of(root) + 2) * row
+
+    def draw(node, x: float, depth: int):
+        for name, child in sorted(node["children"].items()):
+            w = child["count"] / total * width
+            if w >= 0.5:
+                y = height - (depth + 2) * row
+                hue = 20 + zlib.crc32(name.encode()) % 40
+                label = html.escape(name)
+                text = html.escape(name[:int(w / 7)]) if w > 21 else ""
+                rects.append(
+                    f'<g><title>{label} ({child["count"]} samples, {child["count"] / total * 100:.1f}%)</title>'
+                    f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" fill="hsl({hue},90%,60%)"/>'
+                    f'<text x="{x + 3:.1f}" y="{y + row - 4}">{text}</text></g>')
+                draw(child, x, depth + 1)
+            x += w
+
+    draw(root, 0.0, 0)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'font-family="monospace" font-size="11">'
+            f'<text x="4" y="{row - 3}">{html.escape(title)} - {root["count"]} samples</text>'
+            + "".join(rects) + "</svg>")
+
+
+if __name__ == "__main__":
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+
+    parser = argparse.ArgumentParser(description="Profile a running api_server or Bureau")
+    parser.add_argument("--url", required=True,
+                        help="Profile endpoint, e.g. http://localhost:8080/debug/profile or http://localhost:9000/debug/profile")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=0.005, help="Seconds between stack samples")
+    parser.add_argument("--cprofile", action="store_true", help="Also return a cProfile summary of repo functions")
+    parser.add_argument("--token", default=os.getenv("PROFILER_TOKEN", ""), help="Profiler token (PROFILER_TOKEN)")
+    parser.add_argument("--out", default="profile.folded", help="Collapsed stacks output file")
+    parser.add_argument("--svg", help="Also write an SVG flamegraph")
+    args = parser.parse_args()
+
+    body = json.dumps({"token": args.token, "seconds": args.seconds, "interval": args.interval,
+                       "cprofile": args.cprofile}).encode()
+    request = Request(args.url, data=body, headers={"Content-Type": "application/json"})
+    print(f"🔬 Profiling {args.url} for {args.seconds}s...")
+    try:
+        with urlopen(request, timeout=args.seconds + 30) as response:
+            result = json.loads(response.read())
+    except HTTPError as e:
+        result = {"error": f"HTTP {e.code}: {e.read().decode(errors='replace')}"}
+    if result.get("error"):
+        print(f"❌ {result['error']}")
+        raise SystemExit(1)
+
+    with open(args.out, "w") as f:
+        f.write(result["collapsed"] + "\n")
+    print(f"✅ {result['samples']} samples over {result['seconds']}s -> {args.out}")
+    if args.svg:
+        with open(args.svg, "w") as f:
+            f.write(render_flamegraph(result["collapsed"], title=args.url))
+        print(f"🔥 Flamegraph -> {args.svg}")
+    if result.get("cprofile"):
+        print(f"📊 cProfile summary ({result.get('cprofile_scope') or 'event-loop thread'})")
+        print(result["cprofile"])
@@ -0,0 +1,267 @@
+"""
+Prompt Construction - token-budgeted memory context for ASI prompts
+Memory context used to be pasted into prompts whole (or cut at the first few
+records), so prompt size and ASI latency grew with every memory a user
+accumulated. pack_memories() instead fits a domain's memories into a token
+budget:
+
+    1. redundant records collapse: copies repeating an entity together with
+       its category and context text keep only the most valuable one (for
+       records without an entity, repeating category and context)
+    2. every remaining record is scored: its category's weight in the domain
+       (allergies outrank names for medical), its confidence, word overlap
+       with the current query and recency
+    3. each further record of a category is worth less (CATEGORY_DECAY per
+       rank), so one busy category cannot crowd out a single allergy
+    4. records are taken by value while their lines fit the budget, measured
+       by a fast local token estimate, and listed most valuable first
+
+Budgets default per domain (MEMORY_BUDGETS) and can be overridden with
+PROMPT_MEMORY_BUDGET_<DOMAIN> (e.g. PROMPT_MEMORY_BUDGET_MEDICAL=400).
+
+Prompts are laid out for provider-side prefix caching: layout() puts a
+template's static instructions in the system message, byte-identical on
+every call, and all per-request content (memories, history, the question) in
+the user message after it. ASIClient reports every call to prefix_tracker,
+which hashes the stable prefix per template, counts the bytes a provider
+could serve from its prefix cache and warns when a template's prefix varies.
+"""
+
+import hashlib
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Memory context tokens per prompt when no budget is given
+MEMORY_BUDGETS = {"medical": 300, "legal": 300, "support": 250, "education": 250, "financial": 250}
+DEFAULT_BUDGET = 250
+
+# Category weights per domain; unknown categories weigh 1.0
+CATEGORY_WEIGHTS = {
+    "medical": {"allergy": 3.0, "medication": 2.5, "condition": 2.5, "symptom": 1.5, "name": 0.5},
+    "legal": {"legal_matter": 2.5, "case_history": 2.0, "jurisdiction": 2.0, "documents": 1.5, "name": 0.5},
+    "support": {"issues": 2.5, "purchase_history": 2.0, "preferences": 1.5, "name": 0.5},
+    "education": {"struggles": 2.5, "learning_style": 2.0, "completed_topics": 1.5, "subject_strength": 1.5,
+                  "name": 0.5},
+    "financial": {"risk_profile": 2.5, "goals": 2.5, "portfolio": 2.0, "investments": 2.0, "name": 0.5},
+}
+
+RECENCY_HALF_LIFE_DAYS = 180.0
+CATEGORY_DECAY = 0.6
+MIN_LINE_TOKENS = 6
+MAX_CANDIDATES = int(os.getenv("PROMPT_MEMORY_CANDIDATES", "64"))
+MAX_MISSES = 8
+_WORD = re.compile(r"[A-Za-z0-9]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast local token estimate: the larger of 4/3 tokens per word and one token
+    per 4 characters, within ~15% of BPE tokenizers on English prompt text.
+    """
+    return max(math.ceil(len(text.split()) * 4 / 3), math.ceil(len(text) / 4))
+
+
+def memory_budget(domain: str) -> int:
+    return int(os.getenv(f"PROMPT_MEMORY_BUDGET_{domain.upper()}", MEMORY_BUDGETS.get(domain, DEFAULT_BUDGET)))
+
+
+def memory_line(memory: Dict) -> str:
+    """Default prompt line of a memory: '- entity (category): context'"""
+    return f"- {memory.get('entity')} ({memory.get('category')}): {memory.get('context', '')}"
+
+
+def _words(text: str) -> set:
+    return {w for w in _WORD.findall(text.lower()) if len(w) > 2}
+
+
+def memory_prior(memory: Dict, weights: Dict[str, float], now_ms: float) -> float:
+    """Query-independent value of a memory: category weight, confidence and recency"""
+    confidence = (memory.get("metadata") or {}).get("confidence", 0.8)
+    recency = 0.5
+    timestamp = memory.get("timestamp")
+    if isinstance(timestamp, (int, float)) and timestamp > 0:
+        recency = 0.5 ** (max(0.0, now_ms - timestamp) / 86_400_000 / RECENCY_HALF_LIFE_DAYS)
+    return weights.get(memory.get("category"), 1.0) * (0.5 + 0.5 * confidence) * (0.75 + 0.25 * recency)
+
+
+def query_relevance(memory: Dict, query_words: set) -> float:
+    """Share (0-1) of up to three query words the memory mentions"""
+    if not query_words:
+        return 0.0
+    overlap = query_words & _words(f"{memory.get('entity', '')} {memory.get('context', '')}")
+    return min(1.0, len(overlap) / 3)
+
+
+def _normalized(text) -> str:
+    return " ".join(str(text or "").lower().split()).rstrip(".")
+
+
+def collapse_redundant(memories: Iterable[Dict], value: Callable[[Dict], float]) -> List[Dict]:
+    """
+    Keep the most valuable copy of memories repeating the same entity,
+    category and context. Different facts about one entity are all kept;
+    memories without an entity only merge with copies of the same category
+    and context.
+    """
+    best: Dict[tuple, Dict] = {}
+    for memory in memories:
+        key = (memory.get("category"), _normalized(memory.get("entity")), _normalized(memory.get("context")))
+        current = best.get(key)
+        if current is None or value(memory) > value(current):
+            best[key] = memory
+    return list(best.values())
+
+
+class PackedMemories(NamedTuple):
+    text: str
+    memories: List[Dict]  # selected, most valuable first
+    tokens: int
+    total: int  # memories offered
+    collapsed: int  # redundant memories merged away
+
+    def summary(self) -> str:
+        return (f"{len(self.memories)}/{self.total} memories in ~{self.tokens} tokens"
+                + (f", {self.collapsed} redundant collapsed" if self.collapsed else ""))
+
+
+def pack_memories(memories: Optional[List[Dict]], domain: str, query: str = "",
+                  budget: Optional[int] = None, line: Callable[[Dict], str] = memory_line,
+                  separator: str = "\n") -> PackedMemories:
+    """
+    Select and order the most valuable memories whose lines fit the token
+    budget (default: the domain's memory budget).
+    """
+    memories = memories or []
+    budget = memory_budget(domain) if budget is None else budget
+    weights = CATEGORY_WEIGHTS.get(domain, {})
+    now_ms = time.time() * 1000
+    priors = {id(m): memory_prior(m, weights, now_ms) for m in memories}
+    unique = collapse_redundant(memories, lambda m: priors[id(m)])
+
+    # Query relevance (the costly part) only for the best candidates, so packing
+    # stays cheap for users with thousands of memories
+    candidates = heapq.nlargest(MAX_CANDIDATES, unique, key=lambda m: priors[id(m)])
+    query_words = _words(query)
+    value = {id(m): priors[id(m)] * (1.0 + query_relevance(m, query_words)) for m in candidates}
+    ranked: Dict[int, float] = {}
+    per_category: Dict[str, int] = {}
+    for memory in sorted(candidates, key=lambda m: value[id(m)], reverse=True):
+        rank = per_category.get(memory.get("category"), 0)
+        per_category[memory.get("category")] = rank + 1
+        ranked[id(memory)] = value[id(memory)] * CATEGORY_DECAY ** rank
+
+    selected, lines, used, misses = [], [], 0, 0
+    separator_tokens = estimate_tokens(separator) if separator.strip() else 0
+    for memory in sorted(candidates, key=lambda m: ranked[id(m)], reverse=True):
+        if budget - used < MIN_LINE_TOKENS or misses >= MAX_MISSES:
+            break
+        text = line(memory)
+        cost = estimate_tokens(text) + (separator_tokens if lines else 0)
+        if used + cost > budget:
+            misses += 1
+            continue  # a shorter, less valuable memory may still fit
+        selected.append(memory)
+        lines.append(text)
+        used += cost
+    return PackedMemories(separator.join(lines), selected, used, len(memories), len(memories) - len(unique))
+
+
+# ============ STABLE-PREFIX LAYOUT ============
+MAX_PREFIX_VARIANTS = 64  # distinct prefixes remembered per template
+PREFIX_WARN_AT = (2, 10, 100)
+
+
+def layout(instructions: str, *content: str) -> List[Dict[str, str]]:
+    """
+    Chat messages with the static `instructions` as the system prefix and the
+    non-empty dynamic `content` blocks, in order, as the user message. Keep
+    anything that varies per request out of `instructions`.
+    """
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": "\n\n".join(block for block in content if block)},
+    ]
+
+
+def split_prefix(messages: List[Dict[str, str]]) -> Tuple[str, int, int]:
+    """(hash, bytes) of the stable prefix - every message before the last - and the prompt's total bytes"""
+    sizes = [len(m.get("content", "").encode()) for m in messages]
+    digest = hashlib.sha256()
+    for message in messages[:-1]:
+        digest.update(f"{message.get('role')}\x00{message.get('content', '')}\x00".encode())
+    return digest.hexdigest()[:16], sum(sizes[:-1]), sum(sizes)
+
+
+class PrefixStats:
+    """Prefix reuse of one prompt template"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_bytes = 0
+        self.prefix_bytes = 0
+        self.cacheable_bytes = 0  # prefix bytes of calls repeating an earlier prefix
+        self.variants: Dict[str, int] = {}
+        self.overflow = 0  # calls whose prefix was not remembered
+
+    def observe(self, prefix: str, prefix_bytes: int, prompt_bytes: int) -> int:
+        """Record a call; returns the template's number of distinct prefixes"""
+        self.calls += 1
+        self.prompt_bytes += prompt_bytes
+        self.prefix_bytes += prefix_bytes
+        if prefix in self.variants:
+            self.variants[prefix] += 1
+            self.cacheable_bytes += prefix_bytes
+        elif len(self.variants) < MAX_PREFIX_VARIANTS:
+            self.variants[prefix] = 1
+        else:
+            self.overflow += 1
+        return len(self.variants) + self.overflow
+
+
+class PrefixTracker:
+    """Stable-prefix hashes and cacheable prompt bytes per template in one process"""
+
+    def __init__(self):
+        self.templates: Dict[str, PrefixStats] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, template: str, messages: List[Dict[str, str]]) -> str:
+        """Record one call's prompt; returns its prefix hash"""
+        prefix, prefix_bytes, prompt_bytes = split_prefix(messages)
+        template = template or "untagged"
+        with self._lock:
+            stats = self.templates.get(template)
+            if stats is None:
+                stats = self.templates[template] = PrefixStats()
+            new = prefix not in stats.variants
+            variants = stats.observe(prefix, prefix_bytes, prompt_bytes)
+        if new and variants in PREFIX_WARN_AT:
+            print(f"⚠️ Prompt prefix of {template} changed ({variants} variants): "
+                  f"per-request content in the system prompt defeats prefix caching")
+        return prefix
+
+    def snapshot(self) -> Dict:
+        """Per template: calls, prefix variants and the cacheable share of prompt bytes"""
+        with self._lock:
+            templates = {}
+            for name, stats in sorted(self.templates.items()):
+                top = sorted(stats.variants.items(), key=lambda item: -item[1])[:5]
+                templates[name] = {
+                    "calls": stats.calls,
+                    "variants": len(stats.variants) + stats.overflow,
+                    "prefixes": dict(top),
+                    "prompt_bytes": stats.prompt_bytes,
+                    "prefix_bytes": stats.prefix_bytes,
+                    "cacheable_bytes": stats.cacheable_bytes,
+                    "cacheable_share": round(stats.cacheable_bytes / stats.prompt_bytes, 4) if stats.prompt_bytes else 0.0,
+                }
+        return templates
+
+
+# Shared prefix statistics of every ASI call in a process (fed by common.llm.ASIClient)
+prefix_tracker = PrefixTracker()
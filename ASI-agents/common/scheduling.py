@@ -0,0 +1,238 @@
+"""
+Priority Scheduler - urgency-aware execution of expensive agent work
+Queries are classified cheaply on arrival (keyword based urgency/priority
+assessment) and their LLM work is run through a priority queue with aging,
+so low priority work cannot starve behind high priority work, and with
+concurrency reserved for emergency/urgent traffic. Work queues are bounded:
+when an agent is overloaded new queries get an immediate ServiceBusy reply
+instead of a late answer.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from uagents import Context, Model
+
+# Priority levels, most urgent first. Medical "emergency" and legal/support
+# "urgent" share the top level.
+PRIORITY_LABELS = ["urgent", "high", "normal", "low"]
+PRIORITY_ALIASES = {"emergency": "urgent", "critical": "urgent"}
+URGENT_LEVEL = 0
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class ServiceBusy(Model):
+    """Fast rejection sent when an agent's work queue is full"""
+    user_id: str
+    reason: str
+    retry_after: float  # seconds
+    queue_depth: int
+
+
+def priority_level(priority: str) -> int:
+    """Map an urgency/priority string to a queue level (unknown -> normal)"""
+    label = PRIORITY_ALIASES.get(priority, priority)
+    if label in PRIORITY_LABELS:
+        return PRIORITY_LABELS.index(label)
+    return PRIORITY_LABELS.index("normal")
+
+
+class PriorityStats:
+    """Queue-depth and wait-time metrics for one priority level"""
+
+    def __init__(self, window: int = 500):
+        self.queued = 0
+        self.rejected = 0
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_wait = 0.0
+        self.total_wait = 0.0
+        self.recent_waits: Deque[float] = deque(maxlen=window)
+
+    def record_start(self, wait: float):
+        self.started += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent_waits.append(wait)
+
+    def percentile(self, q: float) -> float:
+        if not self.recent_waits:
+            return 0.0
+        ordered = sorted(self.recent_waits)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self, depth: int) -> Dict[str, float]:
+        return {
+            "queue_depth": depth,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait": self.total_wait / self.started if self.started else 0.0,
+            "p95_wait": self.percentile(0.95),
+            "max_wait": self.max_wait,
+        }
+
+
+class PriorityScheduler:
+    """
+    Runs submitted jobs by priority with aging and reserved urgent capacity.
+
+    A job waiting `aging_interval` seconds is treated as one level more urgent
+    when picking the next job, so low priority work eventually catches up
+    with high priority traffic. Aging stops just below the urgent level:
+    urgent/emergency jobs always go first. `reserved_urgent` of the
+    `max_concurrency` slots can only be taken by urgent/emergency jobs.
+
+    New work should pass `admit` first: at most `max_queue` jobs may wait
+    (urgent work gets an extra quarter of headroom), anything beyond that is
+    rejected so callers can answer with ServiceBusy right away.
+    """
+
+    def __init__(self, name: str, max_concurrency: Optional[int] = None,
+                 reserved_urgent: Optional[int] = None, aging_interval: Optional[float] = None,
+                 max_queue: Optional[int] = None):
+        self.name = name
+        self.max_concurrency = max_concurrency or int(os.getenv("AGENT_MAX_CONCURRENCY", "4"))
+        self.reserved_urgent = min(
+            reserved_urgent if reserved_urgent is not None else int(os.getenv("AGENT_RESERVED_URGENT", "1")),
+            self.max_concurrency - 1
+        )
+        self.aging_interval = aging_interval or float(os.getenv("AGENT_PRIORITY_AGING_SECONDS", "10"))
+        self.max_queue = max_queue or int(os.getenv("AGENT_MAX_QUEUE", "32"))
+        self.logger = logging.getLogger(f"scheduler.{name}")
+        self._queues: List[Deque[Tuple[float, Job]]] = [deque() for _ in PRIORITY_LABELS]
+        self._stats = [PriorityStats() for _ in PRIORITY_LABELS]
+        self._running = 0
+        self._running_urgent = 0
+        self._avg_service = 5.0  # seconds, moving average of job run time
+        self._tasks: set = set()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues)
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def admit(self, priority: str, backlog: int = 0) -> bool:
+        """
+        Check whether new work of this priority fits in the queue.
+        `backlog` counts admitted work not submitted yet (e.g. queries still
+        waiting for their memories).
+        """
+        level = priority_level(priority)
+        limit = self.max_queue + (self.max_queue // 4 if level == URGENT_LEVEL else 0)
+        if self.queue_depth + backlog < limit:
+            return True
+        self._stats[level].rejected += 1
+        return False
+
+    def retry_after(self, backlog: int = 0) -> float:
+        """Estimate in seconds until the current queue has drained"""
+        waiting = self.queue_depth + backlog
+        return max(1.0, round(waiting * self._avg_service / self.max_concurrency, 1))
+
+    async def admit_or_reject(self, ctx: Context, sender: str, user_id: str,
+                              priority: str, backlog: int = 0) -> bool:
+        """Admit new work, or reply ServiceBusy to the sender and return False"""
+        if self.admit(priority, backlog):
+            return True
+        busy = ServiceBusy(
+            user_id=user_id,
+            reason=f"{self.name} is at capacity, please retry later",
+            retry_after=self.retry_after(backlog),
+            queue_depth=self.queue_depth + backlog
+        )
+        await ctx.send(sender, busy)
+        ctx.logger.warning(f"🚫 Busy: rejected {priority} work from {user_id} "
+                           f"(queue {busy.queue_depth}/{self.max_queue}, retry after {busy.retry_after}s)")
+        return False
+
+    def submit(self, priority: str, job: Job):
+        """Queue a job (a coroutine function without arguments) at a priority"""
+        level = priority_level(priority)
+        self._queues[level].append((time.monotonic(), job))
+        self._stats[level].queued += 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._running < self.max_concurrency:
+            picked = self._pick_next()
+            if picked is None:
+                return
+            level, enqueued_at, job = picked
+            self._stats[level].record_start(time.monotonic() - enqueued_at)
+            self._running += 1
+            if level == URGENT_LEVEL:
+                self._running_urgent += 1
+            task = asyncio.create_task(self._run(level, job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _pick_next(self) -> Optional[Tuple[int, float, Job]]:
+        now = time.monotonic()
+        general_capacity = self.max_concurrency - self.reserved_urgent
+        general_full = self._running - self._running_urgent >= general_capacity
+
+        best = None
+        for level, queue in enumerate(self._queues):
+            if not queue or (level != URGENT_LEVEL and general_full):
+                continue
+            # Queues are FIFO, so the head is the most aged job of its level.
+            # Aging never lifts routine work to the urgent level; among equally
+            # ranked heads the one waiting longest goes first.
+            enqueued_at = queue[0][0]
+            effective = level - (now - enqueued_at) / self.aging_interval
+            if level != URGENT_LEVEL:
+                effective = max(effective, URGENT_LEVEL + 1)
+            if best is None or (effective, enqueued_at) < best[:2]:
+                best = (effective, enqueued_at, level)
+
+        if best is None:
+            return None
+        level = best[2]
+        enqueued_at, job = self._queues[level].popleft()
+        return level, enqueued_at, job
+
+    async def _run(self, level: int, job: Job):
+        started_at = time.monotonic()
+        try:
+            await job()
+            self._stats[level].completed += 1
+        except Exception as e:
+            self._stats[level].failed += 1
+            self.logger.exception(f"[{self.name}] {PRIORITY_LABELS[level]} job failed: {e}")
+        finally:
+            self._avg_service += 0.2 * (time.monotonic() - started_at - self._avg_service)
+            self._running -= 1
+            if level == URGENT_LEVEL:
+                self._running_urgent -= 1
+            self._dispatch()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Per-priority queue-depth and wait-time metrics"""
+        return {
+            label: self._stats[level].snapshot(len(self._queues[level]))
+            for level, label in enumerate(PRIORITY_LABELS)
+        }
+
+    def log_metrics(self, logger):
+        """Write a one-line summary per priority level to an agent logger"""
+        logger.info(f"📊 Scheduler '{self.name}': {self._running}/{self.max_concurrency} running, "
+                    f"{self.queue_depth}/{self.max_queue} queued")
+        for label, stats in self.snapshot().items():
+            if stats["queued"] or stats["rejected"]:
+                logger.info(
+                    f"   - {label}: depth={stats['queue_depth']} started={stats['started']} "
+                    f"rejected={stats['rejected']} "
+                    f"avg_wait={stats['avg_wait']:.2f}s p95_wait={stats['p95_wait']:.2f}s "
+                    f"max_wait={stats['max_wait']:.2f}s"
+                )
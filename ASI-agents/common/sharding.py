@@ -0,0 +1,231 @@
+"""
+Memory Sharding - consistent-hash placement of users on memory agent shards
+Memory agents can be split into N shards that each hold only the memories of
+the users hashed onto them. Professional agents keep the same HashRing in
+their MemoryBatcher and send every lookup to the shard owning its user_id.
+Each shard owns many virtual points on the ring, so adding or removing one
+shard moves only about 1/N of the users.
+
+Shards read the domain's memory file through the process-wide memory store
+and repartition it whenever the file changes, so new memories show up
+without a restart, as with an unsharded memory agent. Alternatively each
+shard reads its own file, written by the rebalancing tool's --out-dir
+(runtime.py --memory-shard-dir).
+
+Rebalancing tool:
+    python common/sharding.py --memories law/case_memories.json --shards 4 [--from-shards 3] [--out-dir shards/]
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from uagents import Agent, Context, Protocol
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.memory_protocol import (
+    MEMORY_PROTOCOL_VERSION, BatchedMemoryRequest, BatchedMemoryResponse, answer_batch, batch_spans, memory_owner
+)
+from common.memory_store import load_memory_file
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def shard_name(index: int) -> str:
+    return f"shard-{index}"
+
+
+class HashRing:
+    """Consistent-hash ring mapping user ids to shard names"""
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 128):
+        """
+        Args:
+            nodes: Shard names to place on the ring
+            replicas: Virtual points per shard (more points, more even spread)
+        """
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        self._nodes: set = set()
+        for node in nodes:
+            self.add(node)
+
+    @classmethod
+    def with_shards(cls, count: int, replicas: int = 128) -> "HashRing":
+        return cls([shard_name(i) for i in range(count)], replicas)
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(self._nodes)
+
+    def add(self, node: str):
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            # Keep the first owner of a (practically impossible) collision
+            if point not in self._owners:
+                self._owners[point] = node
+                bisect.insort(self._points, point)
+
+    def remove(self, node: str):
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        self._points = [p for p in self._points if self._owners[p] != node]
+        self._owners = {p: self._owners[p] for p in self._points}
+
+    def node_for(self, key: str) -> str:
+        """Shard owning a user id"""
+        if not self._points:
+            raise ValueError("Hash ring has no shards")
+        position = bisect.bisect(self._points, _hash(str(key))) % len(self._points)
+        return self._owners[self._points[position]]
+
+
+def partition_memories(memories: List[Dict], ring: HashRing) -> Dict[str, List[Dict]]:
+    """
+    Split memory records across the shards of a ring by owner. Records
+    without an owner (single-user exports) are kept on every shard so
+    lookups behave exactly as with one memory agent.
+    """
+    shards: Dict[str, List[Dict]] = {node: [] for node in ring.nodes}
+    for memory in memories:
+        owner = memory_owner(memory)
+        if owner:
+            shards[ring.node_for(owner)].append(memory)
+        else:
+            for records in shards.values():
+                records.append(memory)
+    return shards
+
+
+def plan_moves(user_ids: Iterable[str], old: HashRing, new: HashRing) -> Dict[str, Tuple[str, str]]:
+    """Users whose shard changes between two rings: user -> (old shard, new shard)"""
+    moves = {}
+    for user_id in set(user_ids):
+        before, after = old.node_for(user_id), new.node_for(user_id)
+        if before != after:
+            moves[user_id] = (before, after)
+    return moves
+
+
+def shard_file(memories_path: str, node: str, directory: str) -> str:
+    """Path of a shard's export as written by the rebalancing tool's --out-dir"""
+    stem = os.path.splitext(os.path.basename(memories_path))[0]
+    return os.path.join(directory, f"{stem}.{node}.json")
+
+
+class ShardedMemories:
+    """
+    The records of every shard of one memory file. The file is read through
+    load_memory_file, which returns the same list until the file changes, so
+    a new list means new contents and is partitioned again (once for all
+    shards). With a shard directory each shard reads its own file instead.
+    """
+
+    def __init__(self, path: str, ring: HashRing, shard_dir: Optional[str] = None):
+        self.path = path
+        self.ring = ring
+        self.shard_dir = shard_dir
+        self._source: Optional[List[Dict]] = None
+        self._partitions: Dict[str, List[Dict]] = {node: [] for node in ring.nodes}
+
+    def records(self, node: str) -> List[Dict]:
+        """Current records of one shard (the last good ones if the file cannot be read)"""
+        try:
+            if self.shard_dir:
+                return load_memory_file(shard_file(self.path, node, self.shard_dir))
+            memories = load_memory_file(self.path)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ [{node}] Error reading memories: {e}")
+            return self._partitions[node]
+        if memories is not self._source:
+            self._partitions = partition_memories(memories, self.ring)
+            self._source = memories
+        return self._partitions[node]
+
+
+def create_shard_agent(domain: str, node: str, memories: ShardedMemories) -> Agent:
+    """Memory agent answering batched lookups from one shard's records"""
+    agent = Agent(name=f"{domain}_memory_{node}", seed=f"{domain}_memory_{node}_seed_ETHMem_2024")
+    protocol = Protocol(name="ShardedMemoryProtocol", version=MEMORY_PROTOCOL_VERSION)
+
+    @protocol.on_message(model=BatchedMemoryRequest, replies=BatchedMemoryResponse)
+    async def handle_batched_memory_request(ctx: Context, sender: str, msg: BatchedMemoryRequest):
+        """Answer the lookups of this shard's users"""
+        ctx.logger.info(f"📨 [{node}] Batched memory request from {sender} with {len(msg.lookups)} lookups")
+        spans = batch_spans(msg.lookups, agent.name)
+        results = answer_batch(memories.records(node), msg.lookups)
+        await ctx.send(sender, BatchedMemoryResponse(results=results))
+        for span in spans:
+            span.end()
+
+    agent.include(protocol)
+    return agent
+
+
+def create_memory_shards(domain: str, path: str, count: int, ring: Optional[HashRing] = None,
+                         shard_dir: Optional[str] = None) -> Tuple[HashRing, Dict[str, Agent]]:
+    """
+    Create `count` memory agents for a domain, each answering from its own
+    partition of the memory file at `path` (or from its file in `shard_dir`).
+    Returns the ring and a shard name -> agent map; add the agents to a
+    Bureau and hand both to the professional agent's MemoryBatcher (see
+    MemoryBatcher.use_shards).
+    """
+    ring = ring or HashRing.with_shards(count)
+    if shard_dir:
+        missing = [shard_file(path, node, shard_dir) for node in ring.nodes
+                   if not os.path.exists(shard_file(path, node, shard_dir))]
+        if missing:
+            raise ValueError(f"Missing shard files (write them with common/sharding.py --out-dir): "
+                             f"{', '.join(missing)}")
+    memories = ShardedMemories(path, ring, shard_dir)
+    shards = {node: create_shard_agent(domain, node, memories) for node in ring.nodes}
+    return ring, shards
+
+
+# ============ REBALANCING TOOL ============
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan and write memory shard files for a ring size")
+    parser.add_argument("--memories", required=True, help="Memory export (JSON with a 'memories' list)")
+    parser.add_argument("--shards", type=int, required=True, help="Target number of shards")
+    parser.add_argument("--from-shards", type=int, help="Current number of shards, to report moved users")
+    parser.add_argument("--out-dir", help="Write one <name>.shard-<i>.json export per target shard "
+                        "(served by runtime.py --memory-shard-dir)")
+    args = parser.parse_args()
+
+    with open(args.memories, 'r') as f:
+        export = json.load(f)
+    memories = export.get("memories", [])
+    users = {memory_owner(m) for m in memories} - {None}
+    target = HashRing.with_shards(args.shards)
+
+    print(f"👥 {len(users)} users, {len(memories)} memories -> {args.shards} shards")
+    placement = Counter(target.node_for(user) for user in users)
+    for node in target.nodes:
+        print(f"   - {node}: {placement[node]} users")
+
+    if args.from_shards:
+        moves = plan_moves(users, HashRing.with_shards(args.from_shards), target)
+        share = len(moves) / len(users) if users else 0.0
+        print(f"🔀 {args.from_shards} -> {args.shards} shards moves {len(moves)} users ({share:.1%})")
+        for (before, after), moved in sorted(Counter(moves.values()).items()):
+            print(f"   - {before} -> {after}: {moved} users")
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+        for node, records in partition_memories(memories, target).items():
+            path = shard_file(args.memories, node, args.out_dir)
+            with open(path, 'w') as f:
+                json.dump({**export, "memories": records}, f, indent=2)
+            print(f"💾 Wrote {len(records)} memories to {path}")
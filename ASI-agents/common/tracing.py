@@ -0,0 +1,307 @@
+"""
+Distributed Tracing - spans across agents, memory lookups and ASI calls
+A consultation crosses several agents (client -> lawyer -> memory agent ->
+lawyer -> ASI -> client). Each hop records spans sharing one trace id. The
+trace context travels in the protocol messages as a W3C `traceparent` string
+("00-<trace id>-<span id>-01"), and within an agent in a context variable, so
+ASI calls made while a span is current become its children.
+
+Finished spans are appended to TRACE_FILE (default data/traces/spans.jsonl)
+as OpenTelemetry OTLP/JSON lines, one ExportTraceServiceRequest per span, the
+format the OpenTelemetry Collector's file exporter and otlpjsonfile receiver
+use. Ending a span only buffers it: a background writer thread serializes and
+appends the buffered spans every TRACE_FLUSH_INTERVAL seconds (default 1.0)
+or once TRACE_FLUSH_SPANS (default 256) are waiting, so tracing adds no disk
+I/O to the event loop it measures. Buffered spans are written at exit. Tracing is off unless TRACING=1; then TRACE_SAMPLE_RATE (default 1.0) of
+new traces is recorded. Spans of an incoming trace follow its sampling flag.
+
+Waterfall tool:
+    python common/tracing.py [--file data/traces/spans.jsonl] [--last 5 | --trace <id> | --slowest 5] [--summary]
+"""
+
+import argparse
+import atexit
+import contextvars
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Union
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TRACE_FILE = os.path.join(ROOT, "data", "traces", "spans.jsonl")
+
+# Span currently active in this task (parent of spans started without one)
+_current: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+def parse_traceparent(value: str) -> Optional[tuple]:
+    """(trace_id, span_id, sampled) of a traceparent string, or None if it is not one"""
+    parts = (value or "").split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2], parts[3] == "01"
+
+
+class Span:
+    """One timed operation of a trace; use as a context manager or call end()"""
+
+    def __init__(self, tracer: "Tracer", name: str, service: str, trace_id: str,
+                 parent_id: str = "", sampled: bool = True, attributes: Optional[Dict] = None):
+        self.tracer = tracer
+        self.name = name
+        self.service = service
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if self.sampled:
+            self.tracer.export(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.end(exc)
+        return False
+
+
+class Tracer:
+    """Creates spans and appends finished ones to the trace file from a writer thread"""
+
+    def __init__(self, path: Optional[str] = None, enabled: Optional[bool] = None,
+                 sample_rate: Optional[float] = None, flush_interval: Optional[float] = None,
+                 flush_spans: Optional[int] = None):
+        """
+        Args:
+            path: OTLP/JSON lines file (TRACE_FILE, default data/traces/spans.jsonl)
+            enabled: Record spans at all (TRACING=1)
+            sample_rate: Share of new traces recorded (TRACE_SAMPLE_RATE, default 1.0)
+            flush_interval: Seconds between writes of buffered spans (TRACE_FLUSH_INTERVAL, default 1.0)
+            flush_spans: Write early once this many spans are buffered (TRACE_FLUSH_SPANS, default 256)
+        """
+        self.path = path or os.getenv("TRACE_FILE", DEFAULT_TRACE_FILE)
+        self.enabled = enabled if enabled is not None else os.getenv("TRACING", "0").lower() in ("1", "true", "yes")
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+        self.flush_interval = flush_interval or float(os.getenv("TRACE_FLUSH_INTERVAL", "1.0"))
+        self.flush_spans = flush_spans or int(os.getenv("TRACE_FLUSH_SPANS", "256"))
+        self._lock = threading.Lock()  # guards the buffer
+        self._write_lock = threading.Lock()  # keeps batches in order in the file
+        self._buffer: List[Span] = []
+        self._wake = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._file = None
+
+    def start_span(self, name: str, service: Optional[str], parent: Union["Span", str, None] = None,
+                   **attributes) -> Span:
+        """
+        Start a span under `parent`: a Span, a traceparent string from a
+        message, or None for the span current in this task (or a new trace).
+        Without a service name the span belongs to its parent's service.
+        """
+        if parent is None or parent == "":
+            parent = _current.get()
+        if service is None:
+            service = parent.service if isinstance(parent, Span) else "asi-agents"
+        if isinstance(parent, Span):
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        else:
+            parsed = parse_traceparent(parent) if parent else None
+            if parsed:
+                trace_id, parent_id, sampled = parsed
+            else:
+                trace_id, parent_id = f"{random.getrandbits(128):032x}", ""
+                sampled = random.random() < self.sample_rate
+        return Span(self, name, service, trace_id, parent_id, sampled and self.enabled, attributes)
+
+    @contextmanager
+    def span(self, name: str, service: Optional[str], parent: Union["Span", str, None] = None, **attributes):
+        """Run a block as the current span"""
+        with self.start_span(name, service, parent, **attributes) as span:
+            yield span
+
+    def export(self, span: Span):
+        """Buffer a finished span for the writer thread"""
+        with self._lock:
+            self._buffer.append(span)
+            full = len(self._buffer) >= self.flush_spans
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+        if full:
+            self._wake.set()
+
+    def _write_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"⚠️ Could not write spans to {self.path}: {e}")
+
+    def flush(self):
+        """Append every buffered span to the trace file"""
+        with self._write_lock:
+            with self._lock:
+                spans, self._buffer = self._buffer, []
+            if not spans:
+                return
+            lines = "".join(json.dumps(to_otlp(span), separators=(",", ":")) + "\n" for span in spans)
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a")
+            self._file.write(lines)
+            self._file.flush()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(span: Span) -> Dict:
+    """One span as an OTLP/JSON ExportTraceServiceRequest"""
+    record = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        record["parentSpanId"] = span.parent_id
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": span.service}}]},
+        "scopeSpans": [{"scope": {"name": "asi-agents"}, "spans": [record]}],
+    }]}
+
+
+# Shared tracer used by every agent and the API server in a process
+tracer = Tracer()
+
+
+# ============ WATERFALL TOOL ============
+def read_spans(path: str) -> Dict[str, List[Dict]]:
+    """Spans of an OTLP/JSON lines file grouped by trace id"""
+    traces: Dict[str, List[Dict]] = {}
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                export = json.loads(line)
+            except ValueError:
+                continue  # torn last line
+            for resource_spans in export.get("resourceSpans", []):
+                service = next((a["value"].get("stringValue") for a in resource_spans["resource"]["attributes"]
+                                if a["key"] == "service.name"), "?")
+                for scope_spans in resource_spans.get("scopeSpans", []):
+                    for span in scope_spans.get("spans", []):
+                        span["service"] = service
+                        span["start"] = int(span["startTimeUnixNano"])
+                        span["end"] = int(span["endTimeUnixNano"])
+                        traces.setdefault(span["traceId"], []).append(span)
+    return traces
+
+
+def print_waterfall(trace_id: str, spans: List[Dict], width: int = 40):
+    start = min(s["start"] for s in spans)
+    total = max(max(s["end"] for s in spans) - start, 1)
+    ids = {s["spanId"] for s in spans}
+    children: Dict[str, List[Dict]] = {}
+    for span in spans:
+        parent = span.get("parentSpanId", "")
+        children.setdefault(parent if parent in ids else "", []).append(span)
+
+    print(f"\n🧵 Trace {trace_id}  {total / 1e6:.1f}ms, {len(spans)} spans")
+    print(f"{'offset':>9} {'duration':>10}  {'span':<44} timeline")
+
+    def walk(parent: str, depth: int):
+        for span in sorted(children.get(parent, []), key=lambda s: s["start"]):
+            offset, duration = span["start"] - start, span["end"] - span["start"]
+            left = int(offset / total * width)
+            bar = " " * left + "█" * max(1, int(duration / total * width))
+            marker = " ❌" if span.get("status", {}).get("code") == 2 else ""
+            label = f"{'  ' * depth}{span['service']}: {span['name']}"
+            print(f"{offset / 1e6:>7.1f}ms {duration / 1e6:>8.1f}ms  {label[:44]:<44} |{bar[:width]:<{width}}|{marker}")
+            walk(span["spanId"], depth + 1)
+
+    walk("", 0)
+
+
+def print_summary(traces: Dict[str, List[Dict]]):
+    """Latency of every hop (service + span name) over all traces"""
+    hops: Dict[str, List[float]] = {}
+    for spans in traces.values():
+        for span in spans:
+            hops.setdefault(f"{span['service']}: {span['name']}", []).append((span["end"] - span["start"]) / 1e6)
+    print(f"\n📊 Per-hop latency over {len(traces)} traces")
+    print(f"{'hop':<48}{'count':>7}{'p50':>10}{'p95':>10}{'max':>10}")
+    for hop, durations in sorted(hops.items(), key=lambda item: -statistics.median(item[1])):
+        durations.sort()
+        p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        print(f"{hop[:48]:<48}{len(durations):>7}{statistics.median(durations):>8.1f}ms"
+              f"{p95:>8.1f}ms{durations[-1]:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print per-hop latency waterfalls of recorded traces")
+    parser.add_argument("--file", default=os.getenv("TRACE_FILE", DEFAULT_TRACE_FILE), help="OTLP/JSON lines file")
+    parser.add_argument("--trace", help="Trace id to show")
+    parser.add_argument("--last", type=int, default=3, help="Show the most recent traces")
+    parser.add_argument("--slowest", type=int, help="Show the slowest traces instead")
+    parser.add_argument("--summary", action="store_true", help="Per-hop latency percentiles over all traces")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"No trace file at {args.file} (run the agents with TRACING=1)")
+        raise SystemExit(1)
+    traces = read_spans(args.file)
+    if args.trace:
+        selected = [args.trace] if args.trace in traces else []
+        if not selected:
+            print(f"Trace {args.trace} not found")
+    elif args.slowest:
+        selected = sorted(traces, key=lambda t: -(max(s["end"] for s in traces[t]) -
+                                                  min(s["start"] for s in traces[t])))[:args.slowest]
+    else:
+        selected = sorted(traces, key=lambda t: min(s["start"] for s in traces[t]))[-args.last:]
+    for trace_id in selected:
+        print_waterfall(trace_id, traces[trace_id])
+    if args.summary:
+        print_summary(traces)
@@ -0,0 +1,165 @@
+"""
+Loop Watchdog - event-loop lag histograms that name the blocking call
+A heartbeat task sleeps for a short interval and records how late the loop
+wakes it (the scheduling lag every other task of the loop also sees). A
+watchdog thread checks that heartbeat; when the loop has not run it for
+LOOP_STALL_MS (default 100) the thread captures the loop thread's stack while
+it is still blocked, so the report names the synchronous call (a json.dump,
+a blocking HTTP request, a CPU-heavy parse) and the repo line that made it.
+
+Each Bureau (through its health agent) and the API server run one and serve
+GET /debug/loop: the lag histogram, stall count and the top offending call
+sites by total blocked time. Every stall is also printed as it ends (at most
+once per LOOP_STALL_LOG_INTERVAL seconds per call site).
+
+    python common/watchdog.py --url http://localhost:9000/debug/loop
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from common.llm_metrics import Histogram
+
+LAG_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+def _capture(frame) -> List[tuple]:
+    """(label, in repo) of every frame of a stack, outermost first"""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        in_repo = code.co_filename.startswith(ROOT)
+        path = os.path.relpath(code.co_filename, ROOT) if in_repo else os.path.basename(code.co_filename)
+        stack.append((f"{path}:{frame.f_lineno} in {code.co_qualname}", in_repo))
+        frame = frame.f_back
+    return stack[::-1]
+
+
+class LoopWatchdog:
+    """Event-loop lag monitor whose watchdog thread captures the blocking stack"""
+
+    def __init__(self, interval: float = 0.05, window: int = 1200,
+                 threshold_ms: Optional[float] = None):
+        """
+        Args:
+            interval: Seconds between heartbeats
+            window: Heartbeats kept for the max lag (1200 x 0.05s = 1 minute)
+            threshold_ms: Lag counted as a stall (LOOP_STALL_MS, default 100)
+        """
+        self.interval = interval
+        self.threshold_ms = threshold_ms or float(os.getenv("LOOP_STALL_MS", "100"))
+        self.log_interval = float(os.getenv("LOOP_STALL_LOG_INTERVAL", "10"))
+        self.current = 0.0
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.lag_ms = Histogram(LAG_BUCKETS_MS)
+        self.stalls = 0
+        self.sites: Dict[str, Dict] = {}
+        self._beat = time.monotonic()
+        self._captured: Optional[tuple] = None  # (heartbeat, stack) of the current stall
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the heartbeat (in the running loop) and the watchdog thread"""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.ensure_future(self._run())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            beat = self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.current = max(0.0, loop.time() - started - self.interval)
+            self.samples.append(self.current)
+            self.lag_ms.observe(self.current * 1000)
+            with self._lock:
+                captured, self._captured = self._captured, None
+            if captured is not None and captured[0] == beat:
+                self._record_stall(captured[1], self.current * 1000)
+
+    def _watch(self):
+        # Runs in its own thread: sees the loop thread while it is blocked
+        threshold = self.threshold_ms / 1000
+        while True:
+            time.sleep(self.interval / 2)
+            beat = self._beat
+            if time.monotonic() - beat - self.interval < threshold or self._captured is not None:
+                continue
+            stack = _capture(sys._current_frames().get(self._loop_thread))
+            with self._lock:
+                self._captured = (beat, stack)
+
+    def _record_stall(self, stack: List[tuple], lag_ms: float):
+        self.stalls += 1
+        # Innermost repo frame is the call site to fix; the leaf is what it blocked in
+        repo_frames = [label for label, in_repo in stack if in_repo]
+        labels = [label for label, _ in stack]
+        site = repo_frames[-1] if repo_frames else labels[-1] if labels else "unknown"
+        blocked_in = labels[-1] if labels else "unknown"
+        entry = self.sites.setdefault(site, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "last_log": 0.0})
+        entry["count"] += 1
+        entry["total_ms"] += lag_ms
+        entry["max_ms"] = max(entry["max_ms"], lag_ms)
+        entry["blocked_in"] = blocked_in
+        entry["stack"] = labels[-12:]
+        now = time.monotonic()
+        if now - entry["last_log"] >= self.log_interval:
+            entry["last_log"] = now
+            print(f"🐢 Event loop blocked {lag_ms:.0f}ms at {site} (in {blocked_in})")
+
+    @property
+    def worst(self) -> float:
+        return max(self.samples, default=0.0)
+
+    def report(self, top: int = 10) -> Dict:
+        """Lag histogram and the call sites that blocked the loop longest"""
+        sites = sorted(self.sites.items(), key=lambda item: -item[1]["total_ms"])[:top]
+        return {
+            "threshold_ms": self.threshold_ms,
+            "stalls": self.stalls,
+            "lag_ms": self.lag_ms.to_dict(),
+            "sites": [{"site": site, "count": s["count"], "total_ms": round(s["total_ms"], 1),
+                       "max_ms": round(s["max_ms"], 1), "blocked_in": s["blocked_in"], "stack": s["stack"]}
+                      for site, s in sites],
+        }
+
+
+def print_report(report: Dict, stacks: bool = False):
+    lag = report["lag_ms"]
+    print(f"\n⏱️  Event-loop lag over {lag['count']} heartbeats: p50 {lag['p50']:.1f}ms, "
+          f"p95 {lag['p95']:.1f}ms, max {lag['max']:.1f}ms")
+    print(f"🐢 {report['stalls']} stalls over {report['threshold_ms']:.0f}ms")
+    for site in report["sites"]:
+        print(f"  {site['total_ms']:>9.0f}ms total {site['count']:>5}x  max {site['max_ms']:>7.0f}ms  "
+              f"{site['site']}\n{'':>36}in {site['blocked_in']}")
+        if stacks:
+            for frame in site["stack"]:
+                print(f"{'':>40}{frame}")
+
+
+if __name__ == "__main__":
+    from urllib.request import urlopen
+
+    parser = argparse.ArgumentParser(description="Show event-loop lag and the calls that blocked the loop")
+    parser.add_argument("--url", required=True,
+                        help="Loop report endpoint, e.g. http://localhost:8080/debug/loop or http://localhost:9000/debug/loop")
+    parser.add_argument("--stacks", action="store_true", help="Print the captured stack of each call site")
+    args = parser.parse_args()
+
+    with urlopen(args.url, timeout=10) as response:
+        print_report(json.loads(response.read()), args.stacks)
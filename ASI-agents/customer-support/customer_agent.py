@@ -3,7 +3,8 @@ Customer Agent - Simulates a customer seeking support
 """
 
 from uagents import Agent, Context, Protocol
-from support_agent import SupportTicket, SupportResponse
+from support_messages import SupportTicket, SupportResponse
+from common.scheduling import ServiceBusy
 
 customer_agent = Agent(
     name="customer_agent",
@@ -45,6 +46,12 @@ async def receive_support_response(ctx: Context, sender: str, msg: SupportRespon
     ctx.logger.info(f"⏱️ Estimated Resolution: {msg.estimated_resolution_time}")
     ctx.logger.info("="*60 + "\n")
 
+@customer_protocol.on_message(model=ServiceBusy)
+async def handle_service_busy(ctx: Context, sender: str, msg: ServiceBusy):
+    """Handle busy replies from an overloaded support agent"""
+    ctx.logger.warning(f"⏳ Support busy: {msg.reason} "
+                       f"(retry after {msg.retry_after}s, queue depth {msg.queue_depth})")
+
 customer_agent.include(customer_protocol)
 
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+"""
+Support Messages - message models of the customer support protocol
+Kept apart from the agents so clients, memory agents and the API gateway can
+import them without constructing an agent.
+"""
+
+import os
+import sys
+from uagents import Model
+
+# Agents importing these messages use common/ from the project root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Seed of the agent answering these messages (see common.identities.agent_address)
+SUPPORT_AGENT_SEED = "support_agent_seed_phrase_ETHMem_2024"
+
+
+class SupportTicket(Model):
+    """Model for customer support tickets"""
+    customer_id: str
+    ticket_id: str = ""
+    issue_description: str
+    customer_history: str = ""
+    category: str = "general"  # technical, billing, account, product, general
+    priority: str = "normal"  # low, normal, high, urgent
+
+
+class SupportResponse(Model):
+    """Model for support response"""
+    customer_id: str
+    ticket_id: str
+    solution: str
+    suggestions: list[str]
+    escalation_required: bool
+    priority_assessment: str
+    estimated_resolution_time: str
+
+
+class EscalationRequest(Model):
+    """Model for ticket escalation"""
+    customer_id: str
+    ticket_id: str
+    reason: str
+    assigned_to: str
+
+
+class EscalationConfirmation(Model):
+    """Model for escalation confirmation"""
+    ticket_id: str
+    status: str
+    assigned_agent: str
+    estimated_response_time: str
+
+
+class MemoryRequest(Model):
+    """Model for requesting customer memories"""
+    user_id: str
+    category: str = "all"
+    limit: int = 10
+
+
+class MemoryResponse(Model):
+    """Model for memory response"""
+    user_id: str
+    memories: list[dict]
+    count: int
@@ -5,17 +5,24 @@ This file provides the same architecture adapted for customer support.
 """
 
 from uagents import Bureau
-from support_agent import support_agent
+from support_agent import support_agent, memory_batcher, scheduler
 from customer_agent import customer_agent
 from ticket_memory_agent import ticket_memory_agent, memory_storage
+from common.health import create_health_agent
 
-# Create Bureau with all agents
-bureau = Bureau(endpoint=["http://127.0.0.1:10000/submit"])
-bureau.add(support_agent)
-bureau.add(customer_agent)
-bureau.add(ticket_memory_agent)
+# Route batched memory lookups of the support agent to the local memory agent
+memory_batcher.destination = ticket_memory_agent.address
+
+# Agents hosted by this system's Bureau (or by runtime.py next to other domains)
+agents = [support_agent, customer_agent, ticket_memory_agent]
 
 if __name__ == "__main__":
+    bureau = Bureau(port=10000, endpoint=["http://127.0.0.1:10000/submit"])
+    for agent in agents:
+        bureau.add(agent)
+    # /healthz and /readyz on the Bureau port
+    bureau.add(create_health_agent("support", {scheduler.name: scheduler}, [memory_batcher]))
+
     print("\n" + "="*70)
     print("🎧 CUSTOMER SUPPORT SYSTEM WITH MEMORY INTEGRATION")
     print("="*70)
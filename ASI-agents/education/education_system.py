@@ -4,16 +4,24 @@ See medical/medical_system.py for full implementation details.
 """
 
 from uagents import Bureau
-from tutor_agent import tutor_agent
+from tutor_agent import tutor_agent, memory_batcher, scheduler
 from student_agent import student_agent
 from learning_memory_agent import learning_memory_agent, memory_storage
+from common.health import create_health_agent
 
-bureau = Bureau(endpoint=["http://127.0.0.1:11000/submit"])
-bureau.add(tutor_agent)
-bureau.add(student_agent)
-bureau.add(learning_memory_agent)
+# Route batched memory lookups of the tutor agent to the local memory agent
+memory_batcher.destination = learning_memory_agent.address
+
+# Agents hosted by this system's Bureau (or by runtime.py next to other domains)
+agents = [tutor_agent, student_agent, learning_memory_agent]
 
 if __name__ == "__main__":
+    bureau = Bureau(port=11000, endpoint=["http://127.0.0.1:11000/submit"])
+    for agent in agents:
+        bureau.add(agent)
+    # /healthz and /readyz on the Bureau port
+    bureau.add(create_health_agent("education", {scheduler.name: scheduler}, [memory_batcher]))
+
     print("\n" + "="*70)
     print("📚 EDUCATIONAL TUTORING SYSTEM WITH LEARNING MEMORY")
     print("="*70)
@@ -3,7 +3,8 @@ Student Agent - Simulates a student seeking tutoring
 """
 
 from uagents import Agent, Context, Protocol
-from tutor_agent import LearningQuery, TutoringResponse
+from tutoring_messages import LearningQuery, TutoringResponse
+from common.scheduling import ServiceBusy
 
 student_agent = Agent(
     name="student_agent",
@@ -50,6 +51,12 @@ async def receive_tutoring(ctx: Context, sender: str, msg: TutoringResponse):
     ctx.logger.info(f"📊 Mastery: {msg.mastery_assessment}")
     ctx.logger.info("="*60 + "\n")
 
+@student_protocol.on_message(model=ServiceBusy)
+async def handle_service_busy(ctx: Context, sender: str, msg: ServiceBusy):
+    """Handle busy replies from an overloaded tutor"""
+    ctx.logger.warning(f"⏳ Tutor busy: {msg.reason} "
+                       f"(retry after {msg.retry_after}s, queue depth {msg.queue_depth})")
+
 student_agent.include(student_protocol)
 
 if __name__ == "__main__":
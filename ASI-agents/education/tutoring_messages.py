@@ -0,0 +1,69 @@
+"""
+Tutoring Messages - message models of the tutoring protocol
+Kept apart from the agents so clients, memory agents and the API gateway can
+import them without constructing an agent.
+"""
+
+import os
+import sys
+from uagents import Model
+
+# Agents importing these messages use common/ from the project root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Seed of the agent answering these messages (see common.identities.agent_address)
+TUTOR_AGENT_SEED = "tutor_agent_seed_phrase_ETHMem_2024"
+
+
+class LearningQuery(Model):
+    """Model for student learning queries"""
+    student_id: str
+    subject: str
+    topic: str
+    question: str
+    learning_history: str = ""
+    difficulty_level: str = "intermediate"  # beginner, intermediate, advanced
+    learning_style: str = "visual"  # visual, auditory, kinesthetic, reading
+
+
+class TutoringResponse(Model):
+    """Model for tutoring response"""
+    student_id: str
+    subject: str
+    explanation: str
+    examples: list[str]
+    practice_problems: list[str]
+    additional_resources: list[str]
+    mastery_assessment: str
+
+
+class AssessmentRequest(Model):
+    """Model for learning assessment"""
+    student_id: str
+    subject: str
+    topic: str
+    difficulty_level: str
+
+
+class AssessmentResults(Model):
+    """Model for assessment results"""
+    student_id: str
+    subject: str
+    score: float
+    strengths: list[str]
+    areas_for_improvement: list[str]
+    recommended_topics: list[str]
+
+
+class MemoryRequest(Model):
+    """Model for requesting student memories"""
+    user_id: str
+    category: str = "all"
+    limit: int = 10
+
+
+class MemoryResponse(Model):
+    """Model for memory response"""
+    user_id: str
+    memories: list[dict]
+    count: int
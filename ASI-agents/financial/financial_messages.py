@@ -0,0 +1,55 @@
+"""
+Financial Messages - message models of the financial advisory protocol
+Kept apart from the agents so clients, memory agents and the API gateway can
+import them without constructing an agent.
+"""
+
+import os
+import sys
+from uagents import Model
+
+# Agents importing these messages use common/ from the project root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Seed of the agent answering these messages (see common.identities.agent_address)
+ADVISOR_AGENT_SEED = "advisor_agent_seed_phrase_ETHMem_2024"
+
+
+class FinancialQuery(Model):
+    """Model for financial advice queries"""
+    client_id: str
+    query_type: str  # investment, retirement, budgeting, tax, general
+    question: str
+    financial_history: str = ""
+    risk_tolerance: str = "moderate"  # conservative, moderate, aggressive
+    time_horizon: str = "medium"  # short (< 5y), medium (5-15y), long (> 15y)
+
+
+class FinancialAdvice(Model):
+    """Model for financial advice response"""
+    client_id: str
+    analysis: str
+    recommendations: list[str]
+    action_items: list[str]
+    risk_assessment: str
+    projected_outcomes: str
+
+
+class PortfolioReview(Model):
+    """Model for portfolio review request"""
+    client_id: str
+    current_allocation: dict
+    goals: str
+    timeline: str
+
+
+class MemoryRequest(Model):
+    user_id: str
+    category: str = "all"
+    limit: int = 10
+
+
+class MemoryResponse(Model):
+    user_id: str
+    memories: list[dict]
+    count: int
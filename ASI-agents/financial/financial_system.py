@@ -3,16 +3,24 @@ Financial System - Bureau-managed financial advisory system with portfolio memor
 """
 
 from uagents import Bureau
-from advisor_agent import advisor_agent
+from advisor_agent import advisor_agent, memory_batcher, scheduler
 from investor_agent import investor_agent
 from portfolio_memory_agent import portfolio_memory_agent, memory_storage
+from common.health import create_health_agent
 
-bureau = Bureau(endpoint=["http://127.0.0.1:12000/submit"])
-bureau.add(advisor_agent)
-bureau.add(investor_agent)
-bureau.add(portfolio_memory_agent)
+# Route batched memory lookups of the advisor agent to the local memory agent
+memory_batcher.destination = portfolio_memory_agent.address
+
+# Agents hosted by this system's Bureau (or by runtime.py next to other domains)
+agents = [advisor_agent, investor_agent, portfolio_memory_agent]
 
 if __name__ == "__main__":
+    bureau = Bureau(port=12000, endpoint=["http://127.0.0.1:12000/submit"])
+    for agent in agents:
+        bureau.add(agent)
+    # /healthz and /readyz on the Bureau port
+    bureau.add(create_health_agent("financial", {scheduler.name: scheduler}, [memory_batcher]))
+
     print("\n" + "="*70)
     print("💰 FINANCIAL ADVISORY SYSTEM WITH PORTFOLIO MEMORY")
     print("="*70)
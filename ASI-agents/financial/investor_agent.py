@@ -3,7 +3,8 @@ Investor Agent - Simulates an investor seeking financial advice
 """
 
 from uagents import Agent, Context, Protocol
-from advisor_agent import FinancialQuery, FinancialAdvice
+from financial_messages import FinancialQuery, FinancialAdvice
+from common.scheduling import ServiceBusy
 
 investor_agent = Agent(
     name="investor_agent",
@@ -43,6 +44,11 @@ async def receive_advice(ctx: Context, sender: str, msg: FinancialAdvice):
     ctx.logger.info(f"📈 Outlook: {msg.projected_outcomes}")
     ctx.logger.info("="*60 + "\n")
 
+@investor_protocol.on_message(model=ServiceBusy)
+async def handle_service_busy(ctx: Context, sender: str, msg: ServiceBusy):
+    ctx.logger.warning(f"⏳ Advisor busy: {msg.reason} "
+                       f"(retry after {msg.retry_after}s, queue depth {msg.queue_depth})")
+
 investor_agent.include(investor_protocol)
 
 if __name__ == "__main__":
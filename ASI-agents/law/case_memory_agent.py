@@ -3,104 +3,15 @@ Case Memory Agent - Manages client legal memories and case history
 Integrates with browser extension storage to provide personalized legal context.
 """
 
-import json
-import os
-from datetime import datetime
-from uagents import Agent, Context, Model, Protocol
+from uagents import Agent, Context, Protocol
 
 
 # Import message models
-from lawyer_agent import MemoryRequest, MemoryResponse
-
-
-class MemoryStorageInterface:
-    """
-    Interface to case memory storage (browser extension JSON export)
-    """
-    
-    def __init__(self, storage_file="case_memories.json"):
-        self.storage_file = storage_file
-        self.memories = []
-        self.load_memories()
-    
-    def load_memories(self):
-        """Load case memories from JSON file"""
-        if os.path.exists(self.storage_file):
-            try:
-                with open(self.storage_file, 'r') as f:
-                    data = json.load(f)
-                    self.memories = data.get('memories', [])
-                print(f"💾 Loaded {len(self.memories)} case memories from storage")
-            except Exception as e:
-                print(f"Error loading memories: {e}")
-                self.memories = []
-        else:
-            # Create default file with sample data
-            self.create_sample_memories()
-    
-    def create_sample_memories(self):
-        """Create sample case memories"""
-        sample_data = {
-            "user_id": "user_001",
-            "memories": [
-                {
-                    "id": "mem_001",
-                    "entity": "John Smith",
-                    "category": "name",
-                    "context": "Client's full name is John Smith",
-                    "timestamp": int(datetime.now().timestamp() * 1000),
-                    "status": "local",
-                    "metadata": {"source": "registration", "confidence": 1.0}
-                },
-                {
-                    "id": "mem_002",
-                    "entity": "employment law",
-                    "category": "legal_matter",
-                    "context": "Previous employment dispute in 2022",
-                    "timestamp": int(datetime.now().timestamp() * 1000),
-                    "status": "local",
-                    "metadata": {"source": "case_history", "confidence": 0.95}
-                },
-                {
-                    "id": "mem_003",
-                    "entity": "California",
-                    "category": "jurisdiction",
-                    "context": "Client resides in California",
-                    "timestamp": int(datetime.now().timestamp() * 1000),
-                    "status": "local",
-                    "metadata": {"source": "profile", "confidence": 1.0}
-                },
-                {
-                    "id": "mem_004",
-                    "entity": "5 years employment",
-                    "category": "case_history",
-                    "context": "Current employer tenure is 5 years",
-                    "timestamp": int(datetime.now().timestamp() * 1000),
-                    "status": "local",
-                    "metadata": {"source": "intake", "confidence": 1.0}
-                }
-            ]
-        }
-        
-        with open(self.storage_file, 'w') as f:
-            json.dump(sample_data, f, indent=2)
-        
-        self.memories = sample_data["memories"]
-        print(f"✅ Created sample case memories: {self.storage_file}")
-    
-    def get_all_memories(self):
-        """Get all case memories"""
-        return self.memories
-    
-    def get_memories_by_category(self, category: str):
-        """Get memories filtered by category"""
-        if category == "all":
-            return self.memories
-        return [m for m in self.memories if m.get('category') == category]
-    
-    def get_memories_limited(self, limit: int):
-        """Get limited number of memories"""
-        return self.memories[:limit]
+from legal_messages import MemoryRequest, MemoryResponse
+from common.memory_protocol import (
+    MEMORY_PROTOCOL_VERSION, BatchedMemoryRequest, BatchedMemoryResponse, answer_batch, batch_spans
+)
+from case_memory_store import MemoryStorageInterface
 
 
 # Initialize Case Memory Agent
@@ -114,7 +25,7 @@ memory_agent = Agent(
 storage = MemoryStorageInterface()
 
 # Define Memory Management Protocol
-memory_protocol = Protocol(name="CaseMemoryManagementProtocol", version="1.0.0")
+memory_protocol = Protocol(name="CaseMemoryManagementProtocol", version=MEMORY_PROTOCOL_VERSION)
 
 
 @memory_protocol.on_message(model=MemoryRequest, replies=MemoryResponse)
@@ -145,6 +56,22 @@ async def handle_memory_request(ctx: Context, sender: str, msg: MemoryRequest):
     ctx.logger.info(f"✅ Sent {len(memories)} memories to {sender}")
 
 
+@memory_protocol.on_message(model=BatchedMemoryRequest, replies=BatchedMemoryResponse)
+async def handle_batched_memory_request(ctx: Context, sender: str, msg: BatchedMemoryRequest):
+    """
+    Answer a batch of memory lookups in one pass over the case memories
+    """
+    ctx.logger.info(f"📨 Batched memory request from {sender} with {len(msg.lookups)} lookups")
+    
+    spans = batch_spans(msg.lookups, "case_memory_agent")
+    results = answer_batch(storage.get_all_memories(), msg.lookups)
+    
+    await ctx.send(sender, BatchedMemoryResponse(results=results))
+    for span in spans:
+        span.end()
+    ctx.logger.info(f"✅ Answered {len(results)} memory lookups for {sender}")
+
+
 # Include protocol in agent
 memory_agent.include(memory_protocol)
 
@@ -0,0 +1,101 @@
+"""
+Case Memory Store - client legal memories from the browser extension export
+Shared by the standalone case memory agent and the law system, so the law
+system can load case memories without constructing the standalone agent.
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.memory_store import load_memory_file
+
+
+class MemoryStorageInterface:
+    """
+    Interface to case memory storage (browser extension JSON export)
+    """
+    
+    def __init__(self, storage_file=None):
+        self.storage_file = storage_file or os.path.join(os.path.dirname(os.path.abspath(__file__)), "case_memories.json")
+        self.memories = []
+        self.load_memories()
+    
+    def load_memories(self):
+        """Load case memories from JSON file"""
+        if os.path.exists(self.storage_file):
+            try:
+                self.memories = load_memory_file(self.storage_file)
+                print(f"💾 Loaded {len(self.memories)} case memories from storage")
+            except Exception as e:
+                print(f"Error loading memories: {e}")
+                self.memories = []
+        else:
+            # Create default file with sample data
+            self.create_sample_memories()
+    
+    def create_sample_memories(self):
+        """Create sample case memories"""
+        sample_data = {
+            "user_id": "user_001",
+            "memories": [
+                {
+                    "id": "mem_001",
+                    "entity": "John Smith",
+                    "category": "name",
+                    "context": "Client's full name is John Smith",
+                    "timestamp": int(datetime.now().timestamp() * 1000),
+                    "status": "local",
+                    "metadata": {"source": "registration", "confidence": 1.0}
+                },
+                {
+                    "id": "mem_002",
+                    "entity": "employment law",
+                    "category": "legal_matter",
+                    "context": "Previous employment dispute in 2022",
+                    "timestamp": int(datetime.now().timestamp() * 1000),
+                    "status": "local",
+                    "metadata": {"source": "case_history", "confidence": 0.95}
+                },
+                {
+                    "id": "mem_003",
+                    "entity": "California",
+                    "category": "jurisdiction",
+                    "context": "Client resides in California",
+                    "timestamp": int(datetime.now().timestamp() * 1000),
+                    "status": "local",
+                    "metadata": {"source": "profile", "confidence": 1.0}
+                },
+                {
+                    "id": "mem_004",
+                    "entity": "5 years employment",
+                    "category": "case_history",
+                    "context": "Current employer tenure is 5 years",
+                    "timestamp": int(datetime.now().timestamp() * 1000),
+                    "status": "local",
+                    "metadata": {"source": "intake", "confidence": 1.0}
+                }
+            ]
+        }
+        
+        with open(self.storage_file, 'w') as f:
+            json.dump(sample_data, f, indent=2)
+        
+        self.memories = sample_data["memories"]
+        print(f"✅ Created sample case memories: {self.storage_file}")
+    
+    def get_all_memories(self):
+        """Get all case memories"""
+        return self.memories
+    
+    def get_memories_by_category(self, category: str):
+        """Get memories filtered by category"""
+        if category == "all":
+            return self.memories
+        return [m for m in self.memories if m.get('category') == category]
+    
+    def get_memories_limited(self, limit: int):
+        """Get limited number of memories"""
+        return self.memories[:limit]
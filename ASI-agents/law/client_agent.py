@@ -7,7 +7,10 @@ from uagents import Agent, Context, Model, Protocol
 import asyncio
 
 # Import message models
-from lawyer_agent import LegalQuery, LegalAdvice, ConsultationRequest, ConsultationConfirmation
+from legal_messages import (
+    LegalQuery, LegalAdvice, ConsultationRequest, ConsultationConfirmation, LEGAL_PROTOCOL_VERSION
+)
+from common.scheduling import ServiceBusy
 
 
 # Initialize Client Agent
@@ -18,7 +21,7 @@ client_agent = Agent(
 )
 
 # Define Client Protocol
-client_protocol = Protocol(name="ClientConsultationProtocol", version="1.0.0")
+client_protocol = Protocol(name="ClientConsultationProtocol", version=LEGAL_PROTOCOL_VERSION)
 
 
 @client_protocol.on_interval(period=60.0)
@@ -64,6 +67,14 @@ async def receive_legal_advice(ctx: Context, sender: str, msg: LegalAdvice):
     ctx.logger.info("="*60 + "\n")
 
 
+@client_protocol.on_message(model=ServiceBusy)
+async def handle_service_busy(ctx: Context, sender: str, msg: ServiceBusy):
+    """
+    Handle busy replies from an overloaded lawyer agent
+    """
+    ctx.logger.warning(f"⏳ Lawyer busy: {msg.reason} "
+                       f"(retry after {msg.retry_after}s, queue depth {msg.queue_depth})")
+
 @client_protocol.on_message(model=ConsultationConfirmation)
 async def receive_confirmation(ctx: Context, sender: str, msg: ConsultationConfirmation):
     """
@@ -0,0 +1,72 @@
+"""
+Legal Messages - message models of the legal consultation protocol
+Kept apart from the agents so clients, memory agents and the API gateway can
+import them without constructing an agent.
+"""
+
+import os
+import sys
+from uagents import Model
+
+# Agents importing these messages use common/ from the project root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Seed of the agent answering these messages (see common.identities.agent_address)
+LAWYER_AGENT_SEED = "lawyer_agent_seed_phrase_ETHMem_2024"
+
+# Version of the lawyer's and the client's consultation protocols. Adding a
+# field changes a model's schema digest, which uAgents matches exactly, so
+# it is a breaking change. 2.0.0: LegalQuery/LegalAdvice.traceparent
+LEGAL_PROTOCOL_VERSION = "2.0.0"
+
+
+class LegalQuery(Model):
+    """Model for incoming legal queries"""
+    client_id: str
+    case_description: str
+    legal_history: str = ""
+    case_type: str = "general"  # general, criminal, civil, corporate, family
+    urgency_level: str = "normal"  # low, normal, high, urgent
+    traceparent: str = ""  # W3C trace context of the sender's span (common/tracing.py)
+
+
+class LegalAdvice(Model):
+    """Model for legal advice response"""
+    client_id: str
+    legal_analysis: str
+    recommendations: list[str]
+    next_steps: list[str]
+    consultation_required: bool
+    urgency_assessment: str
+    traceparent: str = ""  # trace context of the query being answered
+
+
+class ConsultationRequest(Model):
+    """Model for consultation scheduling"""
+    client_id: str
+    preferred_date: str
+    case_type: str
+    reason: str
+
+
+class ConsultationConfirmation(Model):
+    """Model for consultation confirmation"""
+    client_id: str
+    consultation_id: str
+    scheduled_date: str
+    status: str
+    meeting_link: str = ""
+
+
+class MemoryRequest(Model):
+    """Model for requesting user/case memories"""
+    user_id: str
+    category: str = "all"  # all, case_history, preferences, documents, etc.
+    limit: int = 10
+
+
+class MemoryResponse(Model):
+    """Model for memory response"""
+    user_id: str
+    memories: list[dict]
+    count: int
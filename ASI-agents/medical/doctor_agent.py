@@ -7,17 +7,18 @@ Uses Protocol-based communication for structured agent-to-agent interactions.
 """
 
 import os
-import requests
+import sys
 from uagents import Agent, Context, Model, Protocol, Bureau
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.llm import asi_client
+from common.prompts import layout
+from common.consultation_log import open_agent_log
+
 # Load environment variables
 load_dotenv()
 
-# ASI API Configuration
-ASI_API_URL = "https://api.asi1.ai/v1/chat/completions"
-ASI_API_KEY = os.getenv("ASI_ONE_API_KEY")
-
 
 # Define message models for communication
 class MedicalQuery(Model):
@@ -64,11 +65,14 @@ doctor_agent = Agent(
 doctor_protocol = Protocol(name="MedicalConsultationProtocol", version="1.0.0")
 
 
-@doctor_protocol.on_event("startup")
+@doctor_agent.on_event("startup")
 async def introduce(ctx: Context):
     """Protocol startup event handler"""
+    global consultation_log
+    consultation_log = open_agent_log("doctor_agent", "medical")
     ctx.logger.info(f"Doctor Agent started")
     ctx.logger.info(f"Agent address: {doctor_agent.address}")
+    ctx.logger.info(f"Consultation log: {consultation_log.directory}")
     ctx.logger.info("Medical Consultation Protocol initialized")
     ctx.logger.info("Ready to receive medical consultations...")
 
@@ -84,8 +88,8 @@ async def handle_medical_query(ctx: Context, sender: str, msg: MedicalQuery):
     
     # Process the query and generate advice
     # In a real implementation, this would use medical knowledge bases or AI models
-    diagnosis = analyze_symptoms(msg.symptoms, msg.medical_history)
-    recommendations = generate_recommendations(diagnosis, msg.urgency_level)
+    diagnosis = await analyze_symptoms(msg.symptoms, msg.medical_history)
+    recommendations = await generate_recommendations(diagnosis, msg.urgency_level)
     
     # Assess urgency
     urgency = assess_urgency(msg.symptoms, msg.urgency_level)
@@ -104,7 +108,8 @@ async def handle_medical_query(ctx: Context, sender: str, msg: MedicalQuery):
     ctx.logger.info(f"Sent medical advice to {sender}")
     
     # Log interaction for memory/blockchain storage
-    log_interaction(ctx, msg, advice)
+    await log_interaction(ctx, msg, advice)
+    await consultation_log.anchor.flush_if_due()
 
 
 @doctor_protocol.on_message(model=AppointmentRequest, replies=AppointmentConfirmation)
@@ -140,45 +145,32 @@ async def check_patient_follow_ups(ctx: Context):
 
 
 # Helper functions for medical logic
-def analyze_symptoms(symptoms: str, medical_history: str) -> str:
+# Static instructions of each template: the byte-stable system prefix, with
+# the patient's details in the user message (see common/prompts.py)
+SYMPTOMS_INSTRUCTIONS = """You are a helpful medical assistant AI providing preliminary assessments. Always emphasize the importance of consulting with healthcare professionals.
+
+Please provide a preliminary diagnosis or assessment of the patient in the user message. Be professional, cautious, and recommend seeking professional medical care when appropriate. Keep your response concise (2-3 sentences).
+
+IMPORTANT: This is for educational/informational purposes only and should not replace professional medical advice."""
+
+RECOMMENDATIONS_INSTRUCTIONS = """You are a medical assistant providing practical health recommendations. Be clear, concise, and responsible.
+
+Based on the preliminary diagnosis in the user message, provide 3-4 practical, actionable recommendations for the patient. Format as a simple list.
+Keep recommendations professional and emphasize seeking medical care when needed."""
+
+
+async def analyze_symptoms(symptoms: str, medical_history: str) -> str:
     """
     Analyze patient symptoms and medical history using ASI API
     """
     try:
-        if not ASI_API_KEY:
-            raise ValueError("ASI_ONE_API_KEY not configured")
-        
-        # Construct prompt for ASI
-        prompt = f"""You are a medical assistant AI helping with initial patient assessment.
-        
-Patient Symptoms: {symptoms}
-Medical History: {medical_history if medical_history else "No significant medical history provided"}
-
-Please provide a preliminary diagnosis or assessment. Be professional, cautious, and recommend seeking professional medical care when appropriate. Keep your response concise (2-3 sentences).
-
-IMPORTANT: This is for educational/informational purposes only and should not replace professional medical advice."""
+        # Construct prompt for ASI: static instructions first, the patient's details after
+        case = f"""Patient Symptoms: {symptoms}
+Medical History: {medical_history if medical_history else "No significant medical history provided"}"""
 
         # Make request to ASI API
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {ASI_API_KEY}"
-        }
-        
-        payload = {
-            "model": "asi1-mini",
-            "messages": [
-                {"role": "system", "content": "You are a helpful medical assistant AI providing preliminary assessments. Always emphasize the importance of consulting with healthcare professionals."},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 200,
-            "temperature": 0.7
-        }
-        
-        response = requests.post(ASI_API_URL, json=payload, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
-        diagnosis = result['choices'][0]['message']['content'].strip()
+        diagnosis = await asi_client.chat(layout(SYMPTOMS_INSTRUCTIONS, case),
+                                          max_tokens=200, template="medical.symptoms", temperature=0.7)
         return diagnosis
         
     except Exception as e:
@@ -196,41 +188,16 @@ IMPORTANT: This is for educational/informational purposes only and should not re
             return "General consultation recommended for symptom assessment. Please schedule an appointment with a healthcare provider."
 
 
-def generate_recommendations(diagnosis: str, urgency: str) -> list[str]:
+async def generate_recommendations(diagnosis: str, urgency: str) -> list[str]:
     """
     Generate medical recommendations based on diagnosis using ASI API
     """
     try:
-        if not ASI_API_KEY:
-            raise ValueError("ASI_ONE_API_KEY not configured")
-            
-        prompt = f"""Based on this preliminary diagnosis: "{diagnosis}"
-        
-Urgency Level: {urgency}
-
-Provide 3-4 practical, actionable recommendations for the patient. Format as a simple list.
-Keep recommendations professional and emphasize seeking medical care when needed."""
+        case = f"""Preliminary diagnosis: "{diagnosis}"
+Urgency Level: {urgency}"""
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {ASI_API_KEY}"
-        }
-        
-        payload = {
-            "model": "asi1-mini",
-            "messages": [
-                {"role": "system", "content": "You are a medical assistant providing practical health recommendations. Be clear, concise, and responsible."},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 250,
-            "temperature": 0.7
-        }
-        
-        response = requests.post(ASI_API_URL, json=payload, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
-        recommendations_text = result['choices'][0]['message']['content'].strip()
+        recommendations_text = await asi_client.chat(layout(RECOMMENDATIONS_INSTRUCTIONS, case),
+                                                     max_tokens=250, template="medical.recommendations", temperature=0.7)
         
         # Parse recommendations from response
         # Split by newlines and clean up
@@ -297,7 +264,13 @@ def assess_urgency(symptoms: str, declared_urgency: str) -> str:
     return declared_urgency if declared_urgency in ["low", "normal", "high"] else "normal"
 
 
-def log_interaction(ctx: Context, query: MedicalQuery, advice: MedicalAdvice):
+# Append-only, rotated consultation record (see common/consultation_log.py)
+# whose records are anchored on chain in Merkle batches (common/anchoring.py).
+# Opened on startup: data/consultations/doctor_agent, data/anchors/doctor_agent
+consultation_log = None
+
+
+async def log_interaction(ctx: Context, query: MedicalQuery, advice: MedicalAdvice):
     """
     Log medical interaction for record keeping
     In production, this would store to blockchain via ETHMem smart contracts
@@ -305,14 +278,11 @@ def log_interaction(ctx: Context, query: MedicalQuery, advice: MedicalAdvice):
     ctx.logger.info(f"Logging interaction for patient: {query.patient_id}")
     # Here you would integrate with the ETHMem smart contract to store
     # encrypted medical records on the blockchain
-    ctx.storage.set(
-        f"consultation_{query.patient_id}_{ctx.timestamp}",
-        {
-            "query": query.dict(),
-            "advice": advice.dict(),
-            "timestamp": str(ctx.timestamp)
-        }
-    )
+    await consultation_log.append_async(query.patient_id, {
+        "query": query.dict(),
+        "advice": advice.dict(),
+        "timestamp": str(ctx.timestamp)
+    })
 
 
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+"""
+Medical Messages - message models of the medical consultation protocol
+Kept apart from the agents so clients, memory agents and the API gateway can
+import them without constructing an agent.
+"""
+
+import os
+import sys
+from typing import Dict, List, Optional
+from uagents import Model
+
+# Agents importing these messages use common/ from the project root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Seed of the agent answering these messages (see common.identities.agent_address)
+DOCTOR_AGENT_SEED = "doctor_agent_seed_phrase_ETHMem_2024"
+
+
+class MedicalQuery(Model):
+    """Model for incoming medical queries"""
+    patient_id: str
+    symptoms: str
+    medical_history: str = ""
+    urgency_level: str = "normal"
+
+
+class MedicalAdvice(Model):
+    """Model for medical advice response"""
+    patient_id: str
+    diagnosis: str
+    recommendations: list[str]
+    follow_up_required: bool
+    urgency_assessment: str
+
+
+class AppointmentRequest(Model):
+    """Model for appointment scheduling"""
+    patient_id: str
+    preferred_date: str
+    reason: str
+
+
+class AppointmentConfirmation(Model):
+    """Model for appointment confirmation"""
+    patient_id: str
+    appointment_id: str
+    scheduled_date: str
+    status: str
+
+
+class MemoryRequest(Model):
+    """Model for requesting user memories"""
+    user_id: str
+    category: Optional[str] = None
+    limit: Optional[int] = 10
+
+
+class MemoryResponse(Model):
+    """Model for memory query responses"""
+    user_id: str
+    memories: List[Dict]
+    count: int
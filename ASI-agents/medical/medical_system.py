@@ -5,72 +5,37 @@ Integrates user memories from browser extension for personalized healthcare
 """
 
 import os
+import sys
 import json
-import requests
+from functools import partial
 from typing import List, Dict, Optional
 from pathlib import Path
-from uagents import Agent, Context, Model, Protocol, Bureau
+from uagents import Agent, Context, Protocol, Bureau
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.memory_protocol import (
+    MEMORY_PROTOCOL_VERSION, BatchedMemoryRequest, BatchedMemoryResponse, MemoryBatcher, answer_batch, batch_spans
+)
+from common.llm import asi_client, structured_mode_enabled
+from common.prompts import layout, pack_memories
+from common.scheduling import PriorityScheduler, ServiceBusy
+from common.memory_store import load_memory_file
+from common.health import create_health_agent
+from common.consultation_log import open_agent_log
+from medical_messages import (
+    MedicalQuery, MedicalAdvice, AppointmentRequest, AppointmentConfirmation,
+    MemoryRequest, MemoryResponse, DOCTOR_AGENT_SEED
+)
+
 # Load environment variables
 load_dotenv()
 
-# ASI API Configuration
-ASI_API_URL = "https://api.asi1.ai/v1/chat/completions"
-ASI_API_KEY = os.getenv("ASI_ONE_API_KEY")
-
-
-# ============ MESSAGE MODELS ============
-class MedicalQuery(Model):
-    """Model for incoming medical queries"""
-    patient_id: str
-    symptoms: str
-    medical_history: str = ""
-    urgency_level: str = "normal"
-
-
-class MedicalAdvice(Model):
-    """Model for medical advice response"""
-    patient_id: str
-    diagnosis: str
-    recommendations: list[str]
-    follow_up_required: bool
-    urgency_assessment: str
-
-
-class AppointmentRequest(Model):
-    """Model for appointment scheduling"""
-    patient_id: str
-    preferred_date: str
-    reason: str
-
-
-class AppointmentConfirmation(Model):
-    """Model for appointment confirmation"""
-    patient_id: str
-    appointment_id: str
-    scheduled_date: str
-    status: str
-
-
-class MemoryRequest(Model):
-    """Model for requesting user memories"""
-    user_id: str
-    category: Optional[str] = None
-    limit: Optional[int] = 10
-
-
-class MemoryResponse(Model):
-    """Model for memory query responses"""
-    user_id: str
-    memories: List[Dict]
-    count: int
-
 
 # ============ INITIALIZE AGENTS ============
 doctor_agent = Agent(
     name="doctor_agent",
-    seed="doctor_agent_seed_phrase_ETHMem_2024",
+    seed=DOCTOR_AGENT_SEED,
     port=8000,
 )
 
@@ -141,9 +106,7 @@ class MemoryStorageInterface:
     def get_all_memories(self) -> List[Dict]:
         """Retrieve all memories from storage"""
         try:
-            with open(self.storage_path, 'r') as f:
-                data = json.load(f)
-                return data.get("memories", [])
+            return load_memory_file(self.storage_path)
         except Exception as e:
             print(f"[MemoryStorage] Error reading memories: {e}")
             return []
@@ -159,7 +122,7 @@ storage = MemoryStorageInterface()
 
 
 # ============ MEMORY PROTOCOL ============
-memory_protocol = Protocol(name="MemoryManagementProtocol", version="1.0.0")
+memory_protocol = Protocol(name="MemoryManagementProtocol", version=MEMORY_PROTOCOL_VERSION)
 
 
 @memory_agent.on_event("startup")
@@ -194,43 +157,116 @@ async def handle_memory_request(ctx: Context, sender: str, msg: MemoryRequest):
     ctx.logger.info(f"✅ Sent {len(memories)} memories to {sender}")
 
 
+@memory_protocol.on_message(model=BatchedMemoryRequest, replies=BatchedMemoryResponse)
+async def handle_batched_memory_request(ctx: Context, sender: str, msg: BatchedMemoryRequest):
+    """Answer a batch of memory lookups in one pass over the store"""
+    ctx.logger.info(f"📨 Batched memory request from {sender} with {len(msg.lookups)} lookups")
+    
+    spans = batch_spans(msg.lookups, "memory_agent")
+    results = answer_batch(storage.get_all_memories(), msg.lookups)
+    
+    await ctx.send(sender, BatchedMemoryResponse(results=results))
+    for span in spans:
+        span.end()
+    ctx.logger.info(f"✅ Answered {len(results)} memory lookups for {sender}")
+
+
 # ============ DOCTOR PROTOCOL ============
 doctor_protocol = Protocol(name="MedicalConsultationProtocol", version="1.0.0")
 
+# Medical memory categories used to personalise consultations
+MEDICAL_MEMORY_CATEGORIES = ["allergy", "medication", "condition"]
+
+# Coalesces memory lookups of concurrent consultations into batched requests
+memory_batcher = MemoryBatcher(destination=memory_agent.address)
+
+# Runs consultations by urgency so emergencies don't queue behind routine ones
+scheduler = PriorityScheduler("doctor")
+
+# Append-only, rotated record of every consultation (indexed by patient),
+# anchored on the ledger in Merkle batches. Opened on startup:
+# data/consultations/medical_system, data/anchors/medical_system
+consultation_log = None
+
 
 @doctor_agent.on_event("startup")
 async def doctor_startup(ctx: Context):
+    global consultation_log
+    consultation_log = open_agent_log("medical_system", "medical")
     ctx.logger.info(f"🏥 Doctor Agent started")
     ctx.logger.info(f"📍 Address: {ctx.agent.address}")
+    ctx.logger.info(f"📚 Consultation log: {consultation_log.directory}")
     ctx.logger.info("✅ Ready to receive medical consultations...")
 
 
-@doctor_protocol.on_message(model=MedicalQuery, replies=MedicalAdvice)
+@doctor_protocol.on_message(model=MedicalQuery, replies={MedicalAdvice, ServiceBusy})
 async def handle_medical_query(ctx: Context, sender: str, msg: MedicalQuery):
     ctx.logger.info(f"📨 Received medical query from patient: {msg.patient_id}")
     ctx.logger.info(f"🤒 Symptoms: {msg.symptoms}")
     
-    # Request user memories from memory agent
-    ctx.logger.info(f"🧠 Requesting user memories from memory agent...")
-    memory_req = MemoryRequest(user_id=msg.patient_id, category=None, limit=20)
-    await ctx.send(memory_agent.address, memory_req)
-    
-    # Get medical-related memories from storage (allergy, medication, condition)
-    medical_memories = []
-    for category in ["allergy", "medication", "condition"]:
-        medical_memories.extend(storage.get_memories_by_category(category))
+    # Keyword-based urgency is cheap, so classify before any LLM work
+    urgency = assess_urgency(msg.symptoms, msg.urgency_level)
+    ctx.logger.info(f"🚦 Urgency: {urgency}")
+
+    # Shed load early rather than answering late
+    if not await scheduler.admit_or_reject(ctx, sender, msg.patient_id, urgency, memory_batcher.pending_count):
+        return
     
+    # Request medical memories (allergy, medication, condition) from memory agent
+    ctx.logger.info(f"🧠 Requesting user memories from memory agent...")
+    await memory_batcher.submit(
+        ctx,
+        msg.patient_id,
+        categories=MEDICAL_MEMORY_CATEGORIES,
+        limit=0,  # every match: pack_memories picks what fits the prompt
+        context=(sender, msg, urgency)
+    )
+
+
+@doctor_protocol.on_message(model=BatchedMemoryResponse)
+async def process_with_memories(ctx: Context, sender: str, msg: BatchedMemoryResponse):
+    """Schedule every pending consultation answered by this memory batch"""
+    for result in msg.results:
+        pending = memory_batcher.complete(result.correlation_id)
+        if pending is None:
+            continue
+        original_sender, query, urgency = pending
+        scheduler.submit(urgency, partial(send_medical_advice, ctx, original_sender, query, result.memories))
+
+
+@doctor_protocol.on_interval(period=60.0)
+async def report_scheduler_metrics(ctx: Context):
+    scheduler.log_metrics(ctx.logger)
+
+
+@doctor_protocol.on_interval(period=10.0)
+async def anchor_records(ctx: Context):
+    """Anchor pending consultation records once a batch is full or old enough"""
+    if consultation_log is None:
+        return
+    batch = await consultation_log.anchor.flush_if_due()
+    if batch:
+        ctx.logger.info(f"⚓ Anchored {batch['count']} consultations in batch {batch['batch']} "
+                        f"(root {batch['root'][:16]}..., block {batch['receipt']['block']})")
+
+
+async def send_medical_advice(ctx: Context, sender: str, msg: MedicalQuery, medical_memories: List[Dict]):
+    """Build and send medical advice for a query enriched with user memories"""
     # Build enhanced medical history
     enhanced_history = msg.medical_history
+    prompt_memories = medical_memories
     if medical_memories:
         ctx.logger.info(f"💾 Found {len(medical_memories)} medical memories")
-        memory_context = "\n".join([f"- {m['context']}" for m in medical_memories])
-        enhanced_history = f"{msg.medical_history}\n\nKnown Medical Information:\n{memory_context}"
-        ctx.logger.info(f"📋 Enhanced medical history with user memories")
+        # Most valuable memories that fit the domain's token budget, redundant ones collapsed
+        packed = pack_memories(medical_memories, "medical", query=msg.symptoms, line=lambda m: f"- {m['context']}")
+        prompt_memories = packed.memories
+        enhanced_history = f"{msg.medical_history}\n\nKnown Medical Information:\n{packed.text}"
+        ctx.logger.info(f"📋 Enhanced medical history with user memories ({packed.summary()})")
     
     # Analyze using ASI API with enhanced history
-    diagnosis = analyze_symptoms_asi(msg.symptoms, enhanced_history)
-    recommendations = generate_recommendations_asi(diagnosis, msg.urgency_level, medical_memories)
+    diagnosis, recommendations = await analyze_and_recommend_asi(
+        msg.symptoms, enhanced_history, msg.urgency_level, prompt_memories
+    )
     urgency = assess_urgency(msg.symptoms, msg.urgency_level)
     
     advice = MedicalAdvice(
@@ -243,6 +279,8 @@ async def handle_medical_query(ctx: Context, sender: str, msg: MedicalQuery):
     
     await ctx.send(sender, advice)
     ctx.logger.info(f"✅ Sent medical advice to {sender}")
+    await consultation_log.append_async(msg.patient_id, {"query": msg.dict(), "advice": advice.dict()})
+    await anchor_records(ctx)
 
 
 @doctor_protocol.on_message(model=AppointmentRequest, replies=AppointmentConfirmation)
@@ -308,6 +346,12 @@ async def handle_advice(ctx: Context, sender: str, msg: MedicalAdvice):
         await ctx.send(sender, appointment)
 
 
+@patient_protocol.on_message(model=ServiceBusy)
+async def handle_service_busy(ctx: Context, sender: str, msg: ServiceBusy):
+    ctx.logger.warning(f"⏳ Doctor busy: {msg.reason} "
+                       f"(retry after {msg.retry_after}s, queue depth {msg.queue_depth})")
+
+
 @patient_protocol.on_message(model=AppointmentConfirmation)
 async def handle_confirmation(ctx: Context, sender: str, msg: AppointmentConfirmation):
     ctx.logger.info(f"\n🎉 APPOINTMENT CONFIRMED!")
@@ -317,36 +361,80 @@ async def handle_confirmation(ctx: Context, sender: str, msg: AppointmentConfirm
 
 
 # ============ ASI API HELPER FUNCTIONS ============
-def analyze_symptoms_asi(symptoms: str, medical_history: str) -> str:
-    """Analyze symptoms using ASI API"""
-    try:
-        if not ASI_API_KEY:
-            raise ValueError("ASI_ONE_API_KEY not configured")
-        
-        prompt = f"""You are a medical assistant AI. Analyze these symptoms:
-Symptoms: {symptoms}
-Medical History: {medical_history or "None provided"}
+async def analyze_and_recommend_asi(symptoms: str, medical_history: str, urgency: str,
+                                    medical_memories: List[Dict] = None,
+                                    structured: Optional[bool] = None) -> tuple[str, list[str]]:
+    """
+    Assessment and recommendations for a consultation. Uses a single structured
+    completion when enabled for the medical domain, otherwise (or if that fails)
+    the two-call analyze -> recommend chain.
+    """
+    if structured is None:
+        structured = structured_mode_enabled("medical")
+    if structured:
+        try:
+            return await consult_structured_asi(symptoms, medical_history, urgency, medical_memories)
+        except Exception as e:
+            print(f"ASI structured generation error: {e}. Using two-call path.")
+    diagnosis = await analyze_symptoms_asi(symptoms, medical_history)
+    recommendations = await generate_recommendations_asi(diagnosis, urgency, medical_memories)
+    return diagnosis, recommendations
+
+
+# Static instructions of each template: the byte-stable system prefix, with
+# the patient's symptoms and memories in the user message (see common/prompts.py)
+STRUCTURED_INSTRUCTIONS = """You are a medical assistant AI providing preliminary assessments. Analyze the symptoms in the user message.
+
+Respond with a JSON object only, in this form:
+{"assessment": "brief preliminary assessment (2-3 sentences)", "recommendations": ["3-4 practical, personalized recommendations"]}
+Be professional and cautious.
+IMPORTANT: Avoid recommending anything that conflicts with known allergies or conditions."""
+
+SYMPTOMS_INSTRUCTIONS = """You are a medical assistant AI providing preliminary assessments. Analyze the symptoms in the user message.
 
 Provide a brief preliminary assessment (2-3 sentences). Be professional and cautious."""
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {ASI_API_KEY}"
-        }
-        
-        payload = {
-            "model": "asi1-mini",
-            "messages": [
-                {"role": "system", "content": "You are a medical assistant providing preliminary assessments."},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 200
-        }
+RECOMMENDATIONS_INSTRUCTIONS = """Based on the assessment in the user message, provide 3-4 practical, personalized recommendations considering the patient's medical history. Format as a simple list.
+IMPORTANT: Avoid recommending anything that conflicts with known allergies or conditions."""
+
+
+async def consult_structured_asi(symptoms: str, medical_history: str, urgency: str,
+                                 medical_memories: List[Dict] = None) -> tuple[str, list[str]]:
+    """Assessment and recommendations in one JSON completion (raises on failure)"""
+    case = f"""Symptoms: {symptoms}
+Medical History: {medical_history or "None provided"}
+Urgency: {urgency}"""
+
+    result = await asi_client.chat_json(
+        layout(STRUCTURED_INSTRUCTIONS, case, medical_memory_context(medical_memories).strip()),
+        max_tokens=400, template="medical.structured", required={"assessment": str, "recommendations": list})
+    return str(result["assessment"]).strip(), [str(r).strip() for r in result["recommendations"]][:4]
+
+
+def medical_memory_context(medical_memories: List[Dict] = None) -> str:
+    """Summarise allergy, condition and medication memories for a prompt"""
+    memory_context = ""
+    if medical_memories:
+        allergies = [m['entity'] for m in medical_memories if m['category'] == 'allergy']
+        conditions = [m['entity'] for m in medical_memories if m['category'] == 'condition']
+        medications = [m['entity'] for m in medical_memories if m['category'] == 'medication']
         
-        response = requests.post(ASI_API_URL, json=payload, headers=headers, timeout=30)
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['message']['content'].strip()
+        if allergies:
+            memory_context += f"\nPatient Allergies: {', '.join(allergies)}"
+        if conditions:
+            memory_context += f"\nExisting Conditions: {', '.join(conditions)}"
+        if medications:
+            memory_context += f"\nCurrent Medications: {', '.join(medications)}"
+    return memory_context
+
+
+async def analyze_symptoms_asi(symptoms: str, medical_history: str) -> str:
+    """Analyze symptoms using ASI API"""
+    try:
+        case = f"""Symptoms: {symptoms}
+Medical History: {medical_history or "None provided"}"""
+
+        return await asi_client.chat(layout(SYMPTOMS_INSTRUCTIONS, case), max_tokens=200, template="medical.symptoms")
         
     except Exception as e:
         print(f"ASI API error: {e}")
@@ -355,50 +443,15 @@ Provide a brief preliminary assessment (2-3 sentences). Be professional and caut
         return "General consultation recommended. Please schedule an appointment."
 
 
-def generate_recommendations_asi(diagnosis: str, urgency: str, medical_memories: List[Dict] = None) -> list[str]:
+async def generate_recommendations_asi(diagnosis: str, urgency: str, medical_memories: List[Dict] = None) -> list[str]:
     """Generate recommendations using ASI API, considering user's medical memories"""
     try:
-        if not ASI_API_KEY:
-            raise ValueError("ASI_ONE_API_KEY not configured")
-        
-        # Build context from medical memories
-        memory_context = ""
-        if medical_memories:
-            allergies = [m['entity'] for m in medical_memories if m['category'] == 'allergy']
-            conditions = [m['entity'] for m in medical_memories if m['category'] == 'condition']
-            medications = [m['entity'] for m in medical_memories if m['category'] == 'medication']
-            
-            if allergies:
-                memory_context += f"\nPatient Allergies: {', '.join(allergies)}"
-            if conditions:
-                memory_context += f"\nExisting Conditions: {', '.join(conditions)}"
-            if medications:
-                memory_context += f"\nCurrent Medications: {', '.join(medications)}"
-            
-        prompt = f"""Based on: "{diagnosis}"
-Urgency: {urgency}
-{memory_context}
-
-Provide 3-4 practical, personalized recommendations considering the patient's medical history. Format as a simple list.
-IMPORTANT: Avoid recommending anything that conflicts with known allergies or conditions."""
+        case = f"""Assessment: "{diagnosis}"
+Urgency: {urgency}"""
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {ASI_API_KEY}"
-        }
-        
-        payload = {
-            "model": "asi1-mini",
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 200
-        }
-        
-        response = requests.post(ASI_API_URL, json=payload, headers=headers, timeout=30)
-        response.raise_for_status()
-        result = response.json()
-        text = result['choices'][0]['message']['content'].strip()
+        text = await asi_client.chat(
+            layout(RECOMMENDATIONS_INSTRUCTIONS, case, medical_memory_context(medical_memories).strip()),
+            max_tokens=200, template="medical.recommendations")
         recommendations = [line.strip().lstrip('•-*123456789. ') for line in text.split('\n') if line.strip()]
         return recommendations[:4]
         
@@ -435,19 +488,22 @@ def assess_urgency(symptoms: str, declared_urgency: str) -> str:
 
 
 # ============ BUREAU SETUP ============
+# Include protocols with published manifests
+doctor_agent.include(doctor_protocol, publish_manifest=True)
+patient_agent.include(patient_protocol, publish_manifest=True)
+memory_agent.include(memory_protocol, publish_manifest=True)
+
+# Agents hosted by this system's Bureau (or by runtime.py next to other domains)
+agents = [doctor_agent, patient_agent, memory_agent]
+
+
 if __name__ == "__main__":
     # Initialize Bureau with endpoint
-    bureau = Bureau(endpoint=["http://127.0.0.1:8000/submit"])
-    
-    # Include protocols with published manifests
-    doctor_agent.include(doctor_protocol, publish_manifest=True)
-    patient_agent.include(patient_protocol, publish_manifest=True)
-    memory_agent.include(memory_protocol, publish_manifest=True)
-    
-    # Add agents to bureau
-    bureau.add(doctor_agent)
-    bureau.add(patient_agent)
-    bureau.add(memory_agent)
+    bureau = Bureau(port=8000, endpoint=["http://127.0.0.1:8000/submit"])
+    for agent in agents:
+        bureau.add(agent)
+    # /healthz and /readyz on the Bureau port
+    bureau.add(create_health_agent("medical", {scheduler.name: scheduler}, [memory_batcher]))
     
     print("\n" + "="*70)
     print("🏥 MEDICAL CONSULTATION SYSTEM WITH MEMORY INTEGRATION")
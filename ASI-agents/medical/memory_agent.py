@@ -5,6 +5,7 @@ and broadcasts them to other agents in the system via protocols.
 """
 
 import os
+import sys
 import json
 import sqlite3
 from pathlib import Path
@@ -12,6 +13,12 @@ from typing import List, Dict, Optional
 from uagents import Agent, Context, Model, Protocol
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.memory_protocol import (
+    MEMORY_PROTOCOL_VERSION, BatchedMemoryRequest, BatchedMemoryResponse, answer_batch, batch_spans
+)
+from common.memory_store import load_memory_file
+
 # Load environment variables
 load_dotenv()
 
@@ -119,9 +126,7 @@ class MemoryStorageInterface:
     def get_all_memories(self) -> List[Dict]:
         """Retrieve all memories from storage"""
         try:
-            with open(self.storage_path, 'r') as f:
-                data = json.load(f)
-                return data.get("memories", [])
+            return load_memory_file(self.storage_path)
         except Exception as e:
             print(f"[MemoryAgent] Error reading memories: {e}")
             return []
@@ -179,7 +184,7 @@ memory_agent = Agent(
 storage = MemoryStorageInterface()
 
 # Define Memory Protocol
-memory_protocol = Protocol(name="MemoryManagementProtocol", version="1.0.0")
+memory_protocol = Protocol(name="MemoryManagementProtocol", version=MEMORY_PROTOCOL_VERSION)
 
 
 @memory_agent.on_event("startup")
@@ -248,6 +253,20 @@ async def handle_memory_request(ctx: Context, sender: str, msg: MemoryRequest):
     ctx.logger.info(f"✅ Sent {len(memories)} memories to {sender}")
 
 
+@memory_protocol.on_message(model=BatchedMemoryRequest, replies=BatchedMemoryResponse)
+async def handle_batched_memory_request(ctx: Context, sender: str, msg: BatchedMemoryRequest):
+    """Answer a batch of memory lookups with a single read of the storage file"""
+    ctx.logger.info(f"📨 Batched memory request from {sender} with {len(msg.lookups)} lookups")
+    
+    spans = batch_spans(msg.lookups, "memory_agent")
+    results = answer_batch(storage.get_all_memories(), msg.lookups)
+    
+    await ctx.send(sender, BatchedMemoryResponse(results=results))
+    for span in spans:
+        span.end()
+    ctx.logger.info(f"✅ Answered {len(results)} memory lookups for {sender}")
+
+
 @memory_protocol.on_interval(period=300.0)
 async def sync_status(ctx: Context):
     """Periodic status update"""
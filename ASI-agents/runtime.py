@@ -0,0 +1,146 @@
+"""
+Multi-Domain Runtime - host several agent systems in one process
+Runs any subset of the medical, law, support, education and financial agent
+systems in a single Bureau: one event loop, one HTTP server, one pooled ASI
+client and one parsed copy of each memory file, instead of one Python process
+per domain.
+
+With --memory-shards N each system's memories are split over N memory agent
+shards by consistent hashing on user_id (see common/sharding.py), which is
+how sharded lookups are exercised locally. Shards serve partitions of the
+system's memory file, or with --memory-shard-dir the per-shard files written
+by `python common/sharding.py --out-dir`.
+
+Usage:
+    python runtime.py [--systems medical,law | all] [--port 8000] [--memory-shards 3] [--memory-shard-dir shards/]
+
+RUNTIME_SYSTEMS, RUNTIME_PORT, RUNTIME_MEMORY_SHARDS and RUNTIME_MEMORY_SHARD_DIR
+set the defaults.
+"""
+
+import argparse
+import importlib
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+
+from uagents import Bureau
+from common.health import create_health_agent
+from common.llm import asi_client
+from common.memory_store import cache_stats
+from common.sharding import create_memory_shards
+
+# Domain -> (directory, system module exposing an `agents` list)
+SYSTEMS = {
+    "medical": ("medical", "medical_system"),
+    "law": ("law", "law_system"),
+    "support": ("customer-support", "support_system"),
+    "education": ("education", "education_system"),
+    "financial": ("financial", "financial_system"),
+}
+
+
+def parse_systems(value: str) -> list:
+    """Turn a comma separated list (or "all") into known system names"""
+    if value.strip().lower() == "all":
+        return list(SYSTEMS)
+    names = [name.strip().lower() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SYSTEMS]
+    if unknown:
+        raise ValueError(f"Unknown systems: {', '.join(unknown)} (choose from {', '.join(SYSTEMS)})")
+    return names
+
+
+def load_system(name: str):
+    """Import a system module; its agents and protocols are set up on import"""
+    directory, module = SYSTEMS[name]
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.append(path)
+    return importlib.import_module(module)
+
+
+def add_memory_shards(bureau: Bureau, name: str, system, count: int, shard_dir: str = ""):
+    """Serve a system's memory lookups from `count` consistent-hash shards"""
+    # medical_system names its store `storage` (with a `storage_path`), the
+    # other systems `memory_storage` (with a `storage_file`)
+    storage = getattr(system, "memory_storage", None) or system.storage
+    path = getattr(storage, "storage_file", None) or storage.storage_path
+    ring, shards = create_memory_shards(name, path, count, shard_dir=shard_dir or None)
+    system.memory_batcher.use_shards(ring, {node: agent.address for node, agent in shards.items()})
+    for agent in shards.values():
+        bureau.add(agent)
+
+
+def build_bureau(names: list, port: int, memory_shards: int = 0, memory_shard_dir: str = "") -> Bureau:
+    """Create one Bureau holding the agents of every selected system"""
+    bureau = Bureau(port=port, endpoint=[f"http://127.0.0.1:{port}/submit"])
+    schedulers, batchers = {}, []
+    for name in names:
+        system = load_system(name)
+        for agent in system.agents:
+            bureau.add(agent)
+        if memory_shards > 0:
+            add_memory_shards(bureau, name, system, memory_shards, memory_shard_dir)
+        schedulers[system.scheduler.name] = system.scheduler
+        batchers.append(system.memory_batcher)
+    # One health agent reports on every hosted system (/healthz, /readyz)
+    bureau.add(create_health_agent("runtime", schedulers, batchers))
+    return bureau
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run several agent systems in one process")
+    parser.add_argument("--systems", default=os.getenv("RUNTIME_SYSTEMS", "all"),
+                        help="Comma separated systems to host, or 'all'")
+    parser.add_argument("--port", type=int, default=int(os.getenv("RUNTIME_PORT", "8000")),
+                        help="Port of the shared Bureau HTTP server")
+    parser.add_argument("--memory-shards", type=int, default=int(os.getenv("RUNTIME_MEMORY_SHARDS", "0")),
+                        help="Split each system's memory agent into this many shards (0 = unsharded)")
+    parser.add_argument("--memory-shard-dir", default=os.getenv("RUNTIME_MEMORY_SHARD_DIR", ""),
+                        help="Serve each shard from its file written by common/sharding.py --out-dir")
+    args = parser.parse_args()
+
+    try:
+        systems = parse_systems(args.systems)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    started = time.perf_counter()
+    try:
+        bureau = build_bureau(systems, args.port, args.memory_shards, args.memory_shard_dir)
+    except ValueError as e:
+        sys.exit(str(e))
+    startup = time.perf_counter() - started
+    memory_cache = cache_stats()
+
+    print("\n" + "="*70)
+    print("🧩 MULTI-DOMAIN AGENT RUNTIME")
+    print("="*70)
+    print(f"📦 Systems:  {', '.join(systems)}")
+    print(f"🤖 Agents:   {len(bureau._agents)}")
+    if args.memory_shards:
+        print(f"🧠 Memory shards per system: {args.memory_shards}")
+    print(f"🌐 Endpoint: http://127.0.0.1:{args.port}/submit")
+    print(f"🩺 Health:   http://127.0.0.1:{args.port}/healthz, /readyz")
+    print(f"⏱️  Startup:  {startup:.2f}s")
+    print(f"💾 Memory cache: {memory_cache['files']} files, {memory_cache['memories']} memories")
+    print(f"📈 Peak RSS: {peak_rss_mb():.1f} MB")
+    print("="*70 + "\n")
+
+    try:
+        bureau.run()
+    finally:
+        # The pooled ASI session belongs to the Bureau loop
+        if not bureau._loop.is_closed():
+            bureau._loop.run_until_complete(asi_client.close())
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from common.anchoring import AnchorBatcher
+from common.consultation_log import ConsultationLog, open_agent_log
+
+
+def test_add_buffers_until_the_next_flush_check(tmp_path):
+    batcher = AnchorBatcher(directory=str(tmp_path), batch_size=10, max_wait=60)
+    batcher.add("1:0", {"patient_id": "patient_001"})
+    assert not (tmp_path / "pending.jsonl").exists()
+
+    assert asyncio.run(batcher.flush_if_due()) is None  # saved, not due yet
+    assert len((tmp_path / "pending.jsonl").read_text().splitlines()) == 1
+    assert AnchorBatcher(directory=str(tmp_path)).pending_count == 1
+
+
+def test_proofs_follow_the_log_retention(tmp_path):
+    log = ConsultationLog("medical", str(tmp_path / "log"), segment_bytes=200, compression="none", max_segments=2)
+    log.anchor = AnchorBatcher(directory=str(tmp_path / "anchors"), batch_size=1, max_wait=60)
+    first = log.append("patient_001", {"notes": "x" * 150})
+    asyncio.run(log.anchor.flush_if_due())
+    assert log.anchor.proof_for(first) is not None
+
+    for i in range(3):  # rotates segment 1 out of the log
+        log.append("patient_002", {"notes": "x" * 150})
+    asyncio.run(log.anchor.flush_if_due())
+    assert log.anchor.proof_for(first) is None
+    assert first not in (tmp_path / "anchors" / "proofs.jsonl").read_text()
+    batches = AnchorBatcher(directory=str(tmp_path / "anchors"))
+    assert batches.batches == log.anchor.batches  # numbering continues after compaction
+    log.close()
+
+
+def test_agent_logs_are_per_owner_and_single_writer(tmp_path, monkeypatch):
+    monkeypatch.setenv("CONSULTATION_LOG_DIR", str(tmp_path / "consultations"))
+    monkeypatch.setenv("ANCHOR_DIR", str(tmp_path / "anchors"))
+    log = open_agent_log("medical_system", "medical")
+    assert log.directory == str(tmp_path / "consultations" / "medical_system")
+    assert log.anchor.directory == str(tmp_path / "anchors" / "medical_system")
+    with pytest.raises(RuntimeError):
+        open_agent_log("medical_system", "medical")
+    open_agent_log("doctor_agent", "medical").close()
+    log.close()
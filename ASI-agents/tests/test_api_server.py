@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import api_server
+from common.gateway import GatewayError, GatewayTimeout
+from common.scheduling import ServiceBusy
+
+
+def test_both_modes_give_the_tutor_the_topic_of_the_question(monkeypatch):
+    request = api_server.EducationRequest(student_id="student_001", subject="Mathematics",
+                                          question="How do I factor quadratic equations? I keep mixing up the signs.")
+    sent = []
+
+    async def ask_agent(agent_type, message, reply_model):
+        sent.append(message)
+        return reply_model(student_id=message.student_id, subject=message.subject, explanation="...", examples=[],
+                           practice_problems=[], additional_resources=[], mastery_assessment="beginner")
+
+    monkeypatch.setattr(api_server, "ask_agent", ask_agent)
+    asyncio.run(api_server.education_via_gateway(request))
+    _, direct_prompt = api_server.education_prompts(request, [])
+
+    assert sent[0].topic == "How do I factor quadratic equations"
+    assert f"Topic: {sent[0].topic}\n" in direct_prompt
+    assert sent[0].subject == "Mathematics"
+
+
+class FakeGateway:
+    def __init__(self, outcome):
+        self.outcome = outcome
+
+    async def request(self, domain, message, replies):
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return self.outcome
+
+
+@pytest.mark.parametrize("outcome, status, detail", [
+    (GatewayTimeout("No reply from the legal agent within 60s"), 504, "No reply from the legal agent within 60s"),
+    (GatewayError("legal Bureau returned 500: boom"), 502, "legal Bureau returned 500: boom"),
+    (ServiceBusy(user_id="client_001", reason="legal is at capacity", retry_after=2.1, queue_depth=40),
+     503, "legal is at capacity"),
+])
+def test_gateway_failures_map_to_http_errors(monkeypatch, outcome, status, detail):
+    monkeypatch.setattr(api_server, "get_gateway", lambda: FakeGateway(outcome))
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(api_server.ask_agent("legal", object(), dict))
+    assert (raised.value.status_code, raised.value.detail) == (status, detail)
+    if status == 503:
+        assert raised.value.headers == {"Retry-After": "3"}  # rounded up to whole seconds
+
+
+def test_gateway_replies_are_returned_as_is(monkeypatch):
+    monkeypatch.setattr(api_server, "get_gateway", lambda: FakeGateway({"advice": "..."}))
+    assert asyncio.run(api_server.ask_agent("legal", object(), dict)) == {"advice": "..."}
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from common.consultation_log import ConsultationLog, ConsultationLogReader
+
+
+def test_reader_never_writes_to_the_active_segment(tmp_path):
+    log = ConsultationLog("medical", str(tmp_path), compression="none")
+    log.append("patient_001", {"symptoms": "fever"})
+    log.close()
+    active = tmp_path / "medical-000001.jsonl"
+    with open(active, "ab") as f:
+        f.write(b'{"patient_id": "patient_001", "sympt')  # a writer mid-append
+    before = active.read_bytes()
+
+    reader = ConsultationLogReader("medical", str(tmp_path))
+    assert [r["symptoms"] for r in reader.recent("patient_001")] == ["fever"]
+    assert reader.stats()["patients"] == 1
+    assert active.read_bytes() == before
+
+
+def test_reader_of_a_missing_directory_is_empty(tmp_path):
+    reader = ConsultationLogReader("medical", str(tmp_path / "missing"))
+    assert reader.recent("patient_001") == []
+    assert not os.path.exists(tmp_path / "missing")
+
+
+def test_retention_survives_segments_removed_concurrently(tmp_path):
+    log = ConsultationLog("medical", str(tmp_path), segment_bytes=200, compression="none",
+                          max_segments=0, retention_days=30)
+    for i in range(3):
+        log.append(f"patient_{i}", {"notes": "x" * 150})
+    os.remove(tmp_path / "medical-000001.jsonl")  # e.g. an operator pruning old segments
+
+    log.append("patient_3", {"notes": "x" * 150})  # rotates and applies retention
+    assert 1 not in log._closed_index
+    assert log.recent("patient_3")[0]["notes"] == "x" * 150
+    log.close()
+
+
+class SlowFile:
+    """The active segment's file on a disk that takes 0.2s per write"""
+
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, data):
+        time.sleep(0.2)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def test_append_async_keeps_the_event_loop_responsive(tmp_path):
+    log = ConsultationLog("medical", str(tmp_path), compression="none")
+    log._file = SlowFile(log._file)
+
+    async def scenario():
+        max_lag, done = 0.0, asyncio.Event()
+
+        async def ticker():
+            nonlocal max_lag
+            while not done.is_set():
+                expected = time.monotonic() + 0.01
+                await asyncio.sleep(0.01)
+                max_lag = max(max_lag, time.monotonic() - expected)
+
+        tick = asyncio.create_task(ticker())
+        ids = [await log.append_async(f"patient_{i}", {"symptoms": "fever"}) for i in range(3)]
+        done.set()
+        await tick
+        return ids, max_lag
+
+    ids, max_lag = asyncio.run(scenario())
+    assert max_lag < 0.1
+    assert [log.read(record_id)["patient_id"] for record_id in ids] == ["patient_0", "patient_1", "patient_2"]
+    log.close()
+
+
+def wait_for_compression(log):
+    deadline = time.monotonic() + 5
+    while log._compressing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_full_segments_rotate_and_are_compressed(tmp_path):
+    log = ConsultationLog("medical", str(tmp_path), segment_bytes=400, compression="gzip", max_segments=0)
+    ids = [log.append("patient_001", {"visit": i, "notes": "x" * 100}) for i in range(6)]
+    wait_for_compression(log)
+
+    assert [record_id.split(":")[0] for record_id in ids] == ["1", "1", "2", "2", "3", "3"]
+    assert sorted(os.listdir(tmp_path)) == [
+        "medical-000001.idx.json", "medical-000001.jsonl.gz",
+        "medical-000002.idx.json", "medical-000002.jsonl.gz",
+        "medical-000003.jsonl", "medical.lock",
+    ]
+    assert [r["visit"] for r in log.recent("patient_001", limit=5)] == [5, 4, 3, 2, 1]
+    assert log.read(ids[0])["visit"] == 0  # read back from the compressed segment
+    log.close()
+
+    reopened = ConsultationLog("medical", str(tmp_path), segment_bytes=400, compression="gzip", max_segments=0)
+    assert reopened.stats() == {"segments": 3, "active_segment": 3, "patients": 1, "active_bytes": os.path.getsize(
+        tmp_path / "medical-000003.jsonl")}
+    assert [r["visit"] for r in reopened.recent("patient_001")] == [5, 4, 3, 2, 1, 0]
+    reopened.close()
+
+
+def test_max_segments_drops_the_oldest_segments(tmp_path):
+    log = ConsultationLog("medical", str(tmp_path), segment_bytes=200, compression="none", max_segments=3)
+    for i in range(6):
+        log.append(f"patient_{i}", {"notes": "x" * 150})  # one record per segment
+
+    assert log.stats()["segments"] == 3
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith(".jsonl")) == [
+        "medical-000004.jsonl", "medical-000005.jsonl", "medical-000006.jsonl"]
+    assert log.recent("patient_2") == []
+    assert log.recent("patient_3")[0]["notes"] == "x" * 150
+    log.close()
+
+
+def test_retention_days_drops_old_closed_segments(tmp_path):
+    log = ConsultationLog("medical", str(tmp_path), segment_bytes=200, compression="none",
+                          max_segments=0, retention_days=30)
+    for i in range(3):
+        log.append(f"patient_{i}", {"notes": "x" * 150})
+    old = time.time() - 31 * 86400
+    os.utime(tmp_path / "medical-000001.jsonl", (old, old))
+
+    log.append("patient_3", {"notes": "x" * 150})  # rotates and applies retention
+    assert sorted(log._closed_index) == [2, 3]
+    assert not os.path.exists(tmp_path / "medical-000001.idx.json")
+    assert log.recent("patient_0") == [] and log.recent("patient_1") != []
+    log.close()
+
+
+def test_reopening_terminates_a_torn_last_line(tmp_path):
+    log = ConsultationLog("medical", str(tmp_path), compression="none")
+    log.append("patient_001", {"symptoms": "fever"})
+    log.close()
+    with open(tmp_path / "medical-000001.jsonl", "ab") as f:
+        f.write(b'{"patient_id": "patient_001", "sympt')  # crashed mid-append
+
+    log = ConsultationLog("medical", str(tmp_path), compression="none")
+    log.append("patient_001", {"symptoms": "cough"})
+    assert [r["symptoms"] for r in log.recent("patient_001")] == ["cough", "fever"]
+    log.close()
+
+
+def test_one_writer_per_log_directory(tmp_path):
+    log = ConsultationLog("medical", str(tmp_path), compression="none")
+    with pytest.raises(RuntimeError, match="already open in another process"):
+        ConsultationLog("medical", str(tmp_path), compression="none")
+    log.close()
+    with pytest.raises(ValueError, match="Unknown compression 'zip'"):
+        ConsultationLog("medical", str(tmp_path / "other"), compression="zip")
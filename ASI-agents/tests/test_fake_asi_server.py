@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import json
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from benchmarks.fake_asi_server import build_app, parse_distribution
+
+AUTH = {"Authorization": "Bearer offline"}
+
+
+def options(**overrides):
+    settings = dict(latency="fixed:0", token_delay=0.0, length="normal:60,20", error_rate=0.0,
+                    throttle_rate=0.0, rpm=0, responses=None, seed=7)
+    settings.update(overrides)
+    return argparse.Namespace(**settings)
+
+
+def body(content="Symptoms: fever and cough. Medical History: asthma", system="You are a medical assistant.",
+         **params):
+    return {"model": "asi1-mini", "max_tokens": 500, **params,
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": content}]}
+
+
+def exchange(requests, headers=AUTH, **overrides):
+    """POST each body to a fresh server; returns (status, headers, payload) per request"""
+    async def scenario():
+        async with TestClient(TestServer(build_app(options(**overrides)))) as client:
+            replies = []
+            for request in requests:
+                response = await client.post("/v1/chat/completions", json=request, headers=headers)
+                text = await response.text()
+                payload = text if request.get("stream") else json.loads(text)
+                replies.append((response.status, response.headers, payload))
+            return replies
+
+    return asyncio.run(scenario())
+
+
+def contents(replies):
+    return [payload["choices"][0]["message"]["content"] for _, _, payload in replies]
+
+
+def test_a_seed_makes_runs_reproducible():
+    first = contents(exchange([body(), body(), body(content="Symptoms: rash")]))
+    assert first == contents(exchange([body(), body(), body(content="Symptoms: rash")]))
+    assert first[0] != first[1]  # a repeated body is the next draw, not the same reply
+    assert first != contents(exchange([body(), body(), body(content="Symptoms: rash")], seed=8))
+
+
+def test_replies_follow_the_prompts_domain_and_format():
+    medical, legal, structured = contents(exchange([
+        body(),
+        body("Case: my landlord kept the deposit. List the next steps.", "You are a legal advisor."),
+        body(system='Respond with a JSON object only, in this form:\n'
+                    '{"assessment": "brief assessment", "recommendations": ["recommendations"], "urgent": false}'),
+    ]))
+    assert "fever and cough" in medical
+    assert legal.splitlines()[0].startswith("1. ") and len(legal.splitlines()) == 4
+    reply = json.loads(structured)
+    assert isinstance(reply["assessment"], str) and isinstance(reply["urgent"], bool)
+    assert len(reply["recommendations"]) == 4
+
+
+def test_replies_are_cut_at_max_tokens():
+    [(status, _, payload)] = exchange([body(max_tokens=5)], length="fixed:200")
+    assert status == 200
+    assert payload["choices"][0]["finish_reason"] == "length"
+    assert payload["usage"]["completion_tokens"] == 5
+
+
+@pytest.mark.parametrize("overrides, status, kind", [
+    ({"error_rate": 1.0}, 500, "server_error"),
+    ({"throttle_rate": 1.0}, 429, "rate_limit_error"),
+])
+def test_injected_failures(overrides, status, kind):
+    [(code, headers, payload)] = exchange([body()], **overrides)
+    assert (code, payload["error"]["type"]) == (status, kind)
+    if status == 429:
+        assert headers["Retry-After"] == "1"
+
+
+def test_the_rpm_budget_answers_real_429s():
+    replies = exchange([body(), body(), body()], rpm=2)
+    assert [status for status, _, _ in replies] == [200, 200, 429]
+    assert int(replies[2][1]["Retry-After"]) >= 1
+
+
+def test_requests_without_a_token_or_messages_are_rejected():
+    [(status, _, _)] = exchange([body()], headers={})
+    assert status == 401
+    [(status, _, payload)] = exchange([{"model": "asi1-mini"}])
+    assert (status, payload["error"]["type"]) == (400, "invalid_request_error")
+
+
+def test_a_repeated_prefix_is_reported_as_cached():
+    replies = exchange([body(), body(content="Symptoms: rash"), body(system="You are a legal advisor.")])
+    cached = [payload["usage"]["prompt_tokens_details"]["cached_tokens"] for _, _, payload in replies]
+    assert cached == [0, 5, 0]  # "You are a medical assistant." seen before
+
+
+def test_streamed_replies_end_with_their_usage():
+    [(status, headers, events)] = exchange([body(stream=True, stream_options={"include_usage": True},
+                                                 max_tokens=12)], length="fixed:40")
+    assert status == 200 and headers["Content-Type"] == "text/event-stream"
+    assert events.rstrip().endswith("data: [DONE]")
+    chunks = [json.loads(line[len("data: "):]) for line in events.splitlines()
+              if line.startswith("data: ") and line != "data: [DONE]"]
+    text = "".join(c["choices"][0]["delta"].get("content", "") for c in chunks if c["choices"])
+    assert len(text.split()) == chunks[-1]["usage"]["completion_tokens"] == 12
+    assert [c["choices"][0]["finish_reason"] for c in chunks if c["choices"]][-1] == "length"
+
+
+def test_invalid_distributions_are_rejected():
+    with pytest.raises(ValueError, match="Invalid distribution 'gamma:1,2'"):
+        parse_distribution("gamma:1,2")
+    with pytest.raises(ValueError):
+        parse_distribution("uniform:0.1")
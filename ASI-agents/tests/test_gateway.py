@@ -0,0 +1,119 @@
+import asyncio
+import uuid
+
+import pytest
+from aiohttp import web
+from uagents import Model
+from uagents_core.envelope import Envelope
+from uagents_core.identity import Identity
+from uagents_core.models import ErrorMessage
+
+from conftest import serve
+from common.gateway import AgentGateway, GatewayError, GatewayTimeout
+from common.scheduling import ServiceBusy
+
+
+class Question(Model):
+    text: str
+
+
+class Answer(Model):
+    text: str
+
+
+class Bureau:
+    """A Bureau /submit endpoint whose agent answers as `reply` says"""
+
+    def __init__(self):
+        self.agent = Identity.generate()
+        self.reply = "answer"
+        self.delay = 0.0
+
+    async def handler(self, request: web.Request) -> web.Response:
+        envelope = Envelope.model_validate_json(await request.text())
+        assert request.headers["x-uagents-connection"] == "sync"
+        await asyncio.sleep(self.delay)
+        if self.reply == "http 500":
+            return web.Response(status=500, text="internal error")
+        question = Question.model_validate_json(envelope.decode_payload())
+        message = {
+            "answer": Answer(text=question.text.upper()),
+            "busy": ServiceBusy(user_id="user_1", reason="agent is at capacity", retry_after=2.5, queue_depth=9),
+            "error": ErrorMessage(error="invalid query"),
+            "unexpected": Question(text="?"),
+        }[self.reply]
+        reply = Envelope(version=1, sender=self.agent.address, target=envelope.sender, session=uuid.uuid4(),
+                         schema_digest=Model.build_schema_digest(message))
+        reply.encode_payload(message.model_dump_json())
+        reply.sign(self.agent)
+        return web.Response(text=reply.model_dump_json(), content_type="application/json")
+
+
+@pytest.fixture(scope="module")
+def bureau():
+    bureau = Bureau()
+    for url in serve(bureau.handler, "/submit"):
+        bureau.url = url
+        yield bureau
+
+
+def ask(bureau, reply="answer", delay=0.0, timeout=5, requests=1, endpoint=None):
+    bureau.reply, bureau.delay = reply, delay
+    gateway = AgentGateway(timeout=timeout, max_concurrency=1)
+    gateway.register("legal", bureau.agent.address, endpoint or bureau.url)
+
+    async def scenario():
+        try:
+            return await asyncio.gather(
+                *(gateway.request("legal", Question(text="lease"), (Answer, ServiceBusy)) for _ in range(requests)),
+                return_exceptions=True)
+        finally:
+            await gateway.close()
+
+    return asyncio.run(scenario()), gateway
+
+
+def test_the_reply_is_parsed_as_the_matching_model(bureau):
+    [answer], gateway = ask(bureau)
+    assert answer == Answer(text="LEASE")
+    [busy], _ = ask(bureau, "busy")
+    assert isinstance(busy, ServiceBusy) and busy.retry_after == 2.5
+    assert gateway.stats["legal"] == {"requests": 1, "timeouts": 0, "errors": 0}
+    assert gateway.in_flight == 0
+
+
+@pytest.mark.parametrize("reply, error", [
+    ("http 500", "legal Bureau returned 500: internal error"),
+    ("error", "invalid query"),
+    ("unexpected", "Unexpected reply type from the legal agent"),
+])
+def test_failed_exchanges_raise_gateway_errors(bureau, reply, error):
+    [raised], gateway = ask(bureau, reply)
+    assert type(raised) is GatewayError and str(raised) == error
+    assert gateway.stats["legal"] == {"requests": 1, "timeouts": 0, "errors": 1}
+
+
+def test_an_unreachable_bureau_is_a_gateway_error(bureau):
+    [raised], gateway = ask(bureau, endpoint="http://127.0.0.1:9/submit")
+    assert type(raised) is GatewayError and "Could not reach the legal Bureau" in str(raised)
+
+
+def test_unknown_domains_are_rejected():
+    gateway = AgentGateway(timeout=1)
+    with pytest.raises(GatewayError, match="No agent registered for domain 'medical'"):
+        asyncio.run(gateway.request("medical", Question(text="fever"), (Answer,)))
+
+
+def test_a_slow_agent_times_out(bureau):
+    [raised], gateway = ask(bureau, delay=1, timeout=0.2)
+    assert isinstance(raised, GatewayTimeout) and "No reply from the legal agent within 0.2s" in str(raised)
+    assert gateway.stats["legal"] == {"requests": 1, "timeouts": 1, "errors": 0}
+    assert gateway.in_flight == 0
+
+
+def test_waiting_for_a_free_slot_counts_against_the_timeout(bureau):
+    # one slot: the second request waits behind the first and runs out of time
+    results, gateway = ask(bureau, delay=0.3, timeout=0.45, requests=2)
+    assert results[0] == Answer(text="LEASE")
+    assert isinstance(results[1], GatewayTimeout)
+    assert gateway.stats["legal"]["timeouts"] == 1
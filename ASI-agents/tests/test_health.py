@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+
+from common.health import create_health_agent
+from common.scheduling import PriorityScheduler
+
+
+class FakeBatcher:
+    def __init__(self, pending_count):
+        self.pending_count = pending_count
+
+
+class FakeContext:
+    logger = logging.getLogger("test")
+
+
+def probe(path, scenario=None, schedulers=None, batchers=()):
+    """Create a health agent in a running loop, run `scenario` and call a GET endpoint"""
+    async def run():
+        agent = create_health_agent("test", schedulers, batchers)
+        handler = agent._rest_handlers[("GET", path)]
+        await handler(FakeContext())  # the first probe starts the loop monitor
+        if scenario is not None:
+            await scenario()
+        return await handler(FakeContext())
+
+    return asyncio.run(run())
+
+
+async def idle():
+    await asyncio.sleep(0.12)
+
+
+def test_healthz_reports_liveness():
+    status = probe("/healthz")
+    assert status.status == "ok" and status.uptime >= 0
+
+
+def test_an_idle_bureau_is_ready():
+    scheduler = PriorityScheduler("doctor", max_queue=4)
+    status = probe("/readyz", idle, {"doctor": scheduler}, [FakeBatcher(2), FakeBatcher(1)])
+    assert status.ready and status.reasons == []
+    assert (status.queue_depth, status.queues, status.running) == (0, {"doctor": 0}, 0)
+    assert status.memory_pending == 3
+
+
+def test_a_full_work_queue_is_not_ready():
+    scheduler = PriorityScheduler("lawyer", max_concurrency=1, reserved_urgent=0, max_queue=2)
+
+    async def fill():
+        release = asyncio.Event()
+        for _ in range(3):
+            scheduler.submit("normal", release.wait)  # one runs, two wait
+        await asyncio.sleep(0)
+
+    status = probe("/readyz", fill, {"lawyer": scheduler, "doctor": PriorityScheduler("doctor", max_queue=4)})
+    assert not status.ready
+    assert status.reasons == ["lawyer queue full (2)"]
+    assert (status.queue_depth, status.running) == (2, 1)
+
+
+def test_event_loop_lag_above_the_limit_is_not_ready(monkeypatch):
+    monkeypatch.setenv("HEALTH_MAX_LOOP_LAG_MS", "50")
+
+    async def block():
+        await asyncio.sleep(0.01)  # let the first heartbeat start
+        time.sleep(0.2)
+        await asyncio.sleep(0.01)  # the heartbeat wakes up late and records the lag
+
+    status = probe("/readyz", block)
+    assert not status.ready
+    assert status.loop_lag_ms > 50 and status.loop_lag_max_ms >= status.loop_lag_ms
+    [reason] = status.reasons
+    assert reason.startswith("event loop lag ") and reason.endswith("ms > 50ms")
+
+
+def test_lag_below_the_limit_stays_ready(monkeypatch):
+    monkeypatch.setenv("HEALTH_MAX_LOOP_LAG_MS", "500")
+
+    async def block():
+        await asyncio.sleep(0.01)
+        time.sleep(0.2)
+        await asyncio.sleep(0.01)
+
+    status = probe("/readyz", block)
+    assert status.ready and status.loop_lag_ms > 50
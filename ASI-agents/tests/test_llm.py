@@ -0,0 +1,310 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from conftest import serve
+from common.llm import ASIClient, OutputLimits, fan_out
+from runtime import load_system
+
+SLOW_REPLY = 0.5  # seconds the local endpoint takes per completion
+
+
+async def slow_completion(request: web.Request) -> web.Response:
+    await asyncio.sleep(SLOW_REPLY)
+    return web.json_response({
+        "choices": [{"message": {"role": "assistant", "content": "Rest and fluids."}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 12, "completion_tokens": 4, "total_tokens": 16},
+    })
+
+
+@pytest.fixture(scope="module")
+def slow_asi_url():
+    """A completions endpoint answering after SLOW_REPLY seconds"""
+    yield from serve(slow_completion)
+
+
+def test_slow_completions_keep_the_event_loop_responsive(slow_asi_url, monkeypatch):
+    monkeypatch.setenv("ASI_ONE_API_KEY", "offline")
+    client = ASIClient(url=slow_asi_url, max_concurrency=8)
+    calls = 8
+
+    async def ticker(stop: asyncio.Event, interval: float = 0.02) -> float:
+        max_lag = 0.0
+        while not stop.is_set():
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            max_lag = max(max_lag, time.monotonic() - expected)
+        return max_lag
+
+    async def scenario():
+        stop = asyncio.Event()
+        lag = asyncio.create_task(ticker(stop))
+        started = time.monotonic()
+        try:
+            replies = await asyncio.gather(*(
+                client.chat([{"role": "user", "content": f"Explain medical symptom {i}"}], max_tokens=100)
+                for i in range(calls)
+            ))
+        finally:
+            elapsed = time.monotonic() - started
+            stop.set()
+            await client.close()
+        return replies, elapsed, await lag
+
+    replies, elapsed, max_lag = asyncio.run(scenario())
+    assert replies == ["Rest and fluids."] * calls
+    # Calls overlap instead of running one after another...
+    assert elapsed < calls * SLOW_REPLY / 2
+    # ...and the loop keeps serving other coroutines while they wait
+    assert max_lag < 0.1
+
+
+def learned_limits(monkeypatch, **env):
+    monkeypatch.setenv("ASI_MAX_TOKENS_MIN_SAMPLES", "10")
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return OutputLimits()
+
+
+def test_learned_limit_stays_within_the_requested_max_tokens_by_default(monkeypatch):
+    limits = learned_limits(monkeypatch)
+    limits.limit("t", 100)
+    for _ in range(10):
+        limits.observe("t", 95, "stop")
+    assert limits.limit("t", 100) == 100  # 95 * 1.25 headroom is clamped
+    for _ in range(10):
+        limits.observe("t", 40, "stop")
+    assert limits.limit("t", 100) == 100
+    assert limits.limit("t", 60) == 60
+
+
+def test_replies_without_usage_are_not_samples(monkeypatch):
+    limits = learned_limits(monkeypatch)
+    limits.limit("t", 400)
+    for _ in range(20):
+        limits.observe("t", None, "stop")
+    assert not limits.templates["t"].lengths
+    for _ in range(10):
+        limits.observe("t", 80, "stop")
+    assert limits.limit("t", 400) == 100
+
+
+def test_truncated_replies_count_towards_the_guardrail_not_the_lengths(monkeypatch):
+    limits = learned_limits(monkeypatch, ASI_MAX_TOKENS_TRUNCATION="0.5")
+    limits.limit("t", 400)
+    for _ in range(10):
+        limits.observe("t", 80, "stop")
+    for _ in range(5):
+        limits.observe("t", 100, "length")
+    outputs = limits.templates["t"]
+    assert outputs.lengths.count(100) == 0
+    assert outputs.truncation_rate == 5 / 15
+    assert limits.limit("t", 400) == 100
+    for _ in range(10):
+        limits.observe("t", 100, "length")
+    assert limits.limit("t", 400) == 400 and outputs.guardrail
+
+
+def test_ceiling_lets_an_undersized_template_grow(monkeypatch):
+    limits = learned_limits(monkeypatch, ASI_MAX_TOKENS_CEILING="2")
+    limits.limit("t", 100)
+    for _ in range(10):
+        limits.observe("t", 60, "stop")
+    for _ in range(5):
+        limits.observe("t", 100, "length")  # the call site asks for too little
+    assert limits.limit("t", 100) == 200 and limits.templates["t"].guardrail
+    for _ in range(300):
+        limits.observe("t", 150, "stop")  # the raised limit lets replies finish
+    assert limits.limit("t", 100) == 188  # 150 * 1.25 headroom, under the ceiling
+    assert not limits.templates["t"].guardrail
+
+
+@pytest.fixture
+def truncating_asi():
+    """A completions endpoint that always stops at max_tokens; yields its URL and the max_tokens it was sent"""
+    sent = []
+
+    async def truncated_completion(request: web.Request) -> web.Response:
+        max_tokens = (await request.json())["max_tokens"]
+        sent.append(max_tokens)
+        return web.json_response({
+            "choices": [{"message": {"role": "assistant", "content": "Cut off"}, "finish_reason": "length"}],
+            "usage": {"prompt_tokens": 12, "completion_tokens": max_tokens, "total_tokens": 12 + max_tokens},
+        })
+
+    for url in serve(truncated_completion):
+        yield url, sent
+
+
+def test_truncation_is_retried_only_below_the_requested_max_tokens(truncating_asi, monkeypatch):
+    url, sent = truncating_asi
+    monkeypatch.setenv("ASI_ONE_API_KEY", "offline")
+    monkeypatch.setenv("ASI_MAX_TOKENS_MIN_SAMPLES", "10")
+    monkeypatch.setenv("ASI_MAX_TOKENS_TRUNCATION", "0.5")
+    client = ASIClient(url=url)
+    messages = [{"role": "user", "content": "Explain medical symptom"}]
+
+    async def call(template, length):
+        client.limits.limit(template, 100)
+        for _ in range(10):
+            client.limits.observe(template, length, "stop")
+        sent.clear()
+        try:
+            await client.complete(messages, max_tokens=100, template=template)
+        finally:
+            await client.close()
+        return list(sent), client.limits.templates[template].retries
+
+    # Learned 40 * 1.25 = 50: cut off below the call site's limit, retried with it
+    assert asyncio.run(call("short", 40)) == ([50, 100], 1)
+    # Learned limit equal to the call site's: the cut-off reply is the answer
+    assert asyncio.run(call("long", 95)) == ([100], 0)
+
+
+async def step(value, delay, log=None):
+    try:
+        await asyncio.sleep(delay)
+    except asyncio.CancelledError:
+        if log is not None:
+            log.append("cancelled")
+        raise
+    return value
+
+
+def test_fan_out_runs_steps_concurrently():
+    async def scenario():
+        started = time.monotonic()
+        results = await fan_out({name: (step(name, 0.2), lambda: "fallback")
+                                 for name in ("explanation", "examples", "practice")}, deadline=5)
+        return results, time.monotonic() - started
+
+    results, elapsed = asyncio.run(scenario())
+    assert results == {"explanation": "explanation", "examples": "examples", "practice": "practice"}
+    assert elapsed < 0.4  # the slowest step, not the sum of all three
+
+
+def test_fan_out_deadline_falls_back_only_for_the_late_step():
+    async def scenario():
+        log = []
+        started = time.monotonic()
+        results = await fan_out({
+            "explanation": (step("explained", 0.01), lambda: "no explanation"),
+            "examples": (step("examples", 5, log), lambda: ["fallback example"]),
+        }, deadline=0.2)
+        return results, log, time.monotonic() - started
+
+    results, log, elapsed = asyncio.run(scenario())
+    assert results == {"explanation": "explained", "examples": ["fallback example"]}
+    assert log == ["cancelled"]  # the late step does not keep running behind the reply
+    assert elapsed < 1
+
+
+def test_fan_out_failed_step_falls_back_without_failing_the_others():
+    async def broken():
+        raise RuntimeError("ASI API returned 500")
+
+    results = asyncio.run(fan_out({
+        "explanation": (broken(), lambda: "no explanation"),
+        "practice": (step(["problem"], 0.01), lambda: []),
+    }, deadline=5))
+    assert results == {"explanation": "no explanation", "practice": ["problem"]}
+
+
+def test_fan_out_deadline_defaults_to_the_environment(monkeypatch):
+    monkeypatch.setenv("ASI_FANOUT_DEADLINE", "0.05")
+    results = asyncio.run(fan_out({"examples": (step("examples", 5), lambda: "fallback")}))
+    assert results == {"examples": "fallback"}
+
+
+class ScriptedASI:
+    """A completions endpoint answering with queued replies, recording each prompt"""
+
+    def __init__(self):
+        self.replies, self.prompts = [], []
+
+    async def handler(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.prompts.append(body["messages"][0]["content"])
+        content = self.replies.pop(0)
+        return web.json_response({
+            "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 20, "completion_tokens": 10, "total_tokens": 30},
+        })
+
+
+@pytest.fixture
+def scripted_asi(monkeypatch):
+    monkeypatch.setenv("ASI_ONE_API_KEY", "offline")
+    asi = ScriptedASI()
+    for url in serve(asi.handler):
+        asi.client = ASIClient(url=url)
+        yield asi
+        asyncio.run(asi.client.close())
+
+
+def chat_json(asi, reply):
+    asi.replies.append(reply)
+    return asyncio.run(asi.client.chat_json([{"role": "user", "content": "consult"}], max_tokens=100,
+                                            required={"assessment": str, "recommendations": list}))
+
+
+def test_chat_json_tolerates_code_fences_and_chatter(scripted_asi):
+    reply = 'Here you go:\n```json\n{"assessment": "Likely flu.", "recommendations": ["Rest"]}\n```'
+    assert chat_json(scripted_asi, reply) == {"assessment": "Likely flu.", "recommendations": ["Rest"]}
+
+
+@pytest.mark.parametrize("reply, error", [
+    ('{"assessment": "Likely flu."}', "'recommendations' is missing"),
+    ('{"assessment": "Likely flu.", "recommendations": "Rest"}', "'recommendations' is missing or not a list"),
+    ('{"assessment": "Likely flu.", "recommendations": ["Rest"]', "No JSON object"),
+    ('["Likely flu.", ["Rest"]]', "No JSON object"),
+    ('{"assessment": "Likely flu.", "recommendations": [Rest]}', "Expecting value"),
+])
+def test_chat_json_rejects_malformed_replies(scripted_asi, reply, error):
+    with pytest.raises(ValueError, match=error):
+        chat_json(scripted_asi, reply)
+
+
+@pytest.fixture
+def medical_system(scripted_asi, monkeypatch):
+    # uagents binds each agent to the current event loop when the system is imported
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    system = load_system("medical")
+    asyncio.set_event_loop(None)
+    monkeypatch.setattr(system, "asi_client", scripted_asi.client)
+    return system
+
+
+def consult(system, structured):
+    return asyncio.run(system.analyze_and_recommend_asi(
+        "fever and cough", "asthma", "normal", [{"category": "allergy", "entity": "penicillin"}],
+        structured=structured))
+
+
+def test_structured_mode_answers_in_one_completion(scripted_asi, medical_system):
+    scripted_asi.replies.append('{"assessment": "Likely flu.", "recommendations": ["Rest", "Fluids"]}')
+    assert consult(medical_system, True) == ("Likely flu.", ["Rest", "Fluids"])
+    [prompt] = scripted_asi.prompts
+    assert prompt == medical_system.STRUCTURED_INSTRUCTIONS
+
+
+def test_malformed_structured_reply_falls_back_to_the_two_call_chain(scripted_asi, medical_system):
+    scripted_asi.replies += ['{"assessment": "Likely flu."}', "Likely flu.", "- Rest\n- Fluids"]
+    assert consult(medical_system, True) == ("Likely flu.", ["Rest", "Fluids"])
+    assert scripted_asi.prompts == [medical_system.STRUCTURED_INSTRUCTIONS,
+                                    medical_system.SYMPTOMS_INSTRUCTIONS,
+                                    medical_system.RECOMMENDATIONS_INSTRUCTIONS]
+
+
+def test_structured_mode_is_off_unless_the_domain_is_listed(scripted_asi, medical_system, monkeypatch):
+    monkeypatch.setenv("ASI_STRUCTURED_MODE", "legal, support")
+    scripted_asi.replies += ["Likely flu.", "1. Rest"]
+    assert consult(medical_system, None) == ("Likely flu.", ["Rest"])
+    assert len(scripted_asi.prompts) == 2
+
+    monkeypatch.setenv("ASI_STRUCTURED_MODE", "all")
+    scripted_asi.replies.append('{"assessment": "Likely flu.", "recommendations": ["Rest"]}')
+    assert consult(medical_system, None) == ("Likely flu.", ["Rest"])
+    assert len(scripted_asi.prompts) == 3
@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import json
+
+import pytest
+from aiohttp.test_utils import TestServer
+
+from benchmarks.fake_asi_server import build_app
+from common.llm import ASIClient
+from common.llm_metrics import Histogram, LLMMetrics, llm_metrics, load_usage
+
+
+def test_histogram_buckets_are_per_bucket_with_an_unbounded_last_one():
+    histogram = Histogram([10, 100])
+    for value in (5, 10, 11, 100, 250):
+        histogram.observe(value)
+    summary = histogram.to_dict()
+    assert summary["buckets"] == {"10": 2, "100": 2, "+Inf": 1}
+    assert (summary["count"], summary["sum"], summary["mean"], summary["max"]) == (5, 376, 75.2, 250)
+
+
+def test_quantiles_interpolate_inside_their_bucket():
+    histogram = Histogram([100, 200])
+    for _ in range(4):
+        histogram.observe(150)
+    assert histogram.quantile(0.5) == 125  # halfway through 100-150: the bucket is capped at the max
+    assert histogram.quantile(1.0) == 150
+    assert Histogram([100]).quantile(0.95) == 0.0
+
+
+def test_errors_count_as_calls_but_not_as_token_samples(monkeypatch):
+    monkeypatch.setenv("ASI_PRICE_PROMPT_PER_1K", "0.5")
+    monkeypatch.setenv("ASI_PRICE_COMPLETION_PER_1K", "2")
+    metrics = LLMMetrics(path="")
+    metrics.record("legal.analysis", "asi1-mini", 800, 1000, 200, "stop", 400)
+    metrics.record("legal.analysis", "asi1-mini", 1200, 1000, 400, "length", 400)
+    metrics.record("legal.analysis", "asi1-mini", 30, max_tokens=600)
+    metrics.record("", "asi1-mini", 100, 10, 5, "stop", 50)
+
+    snapshot = metrics.snapshot()["templates"]
+    legal = snapshot["legal.analysis"]
+    assert (legal["domain"], legal["calls"], legal["max_tokens"]) == ("legal", 3, 600)
+    assert legal["finish_reasons"] == {"stop": 1, "length": 1, "error": 1}
+    assert (legal["prompt_tokens"]["count"], legal["completion_tokens"]["sum"]) == (2, 600)
+    assert legal["cost"] == 2.2  # 2000 x 0.5/1K + 600 x 2/1K
+    assert snapshot["untagged"]["calls"] == 1
+
+
+def test_the_usage_log_rebuilds_the_same_snapshot(tmp_path):
+    path = tmp_path / "llm" / "usage.jsonl"
+    metrics = LLMMetrics(path=str(path))
+    metrics.record("medical.symptoms", "asi1-mini", 420, 120, 60, "stop", 200)
+    metrics.record("medical.symptoms", "asi1-mini", 35, max_tokens=200)
+    with open(path, "a") as f:
+        f.write('{"template": "medical.sympt')  # a writer killed mid-line
+
+    assert load_usage(str(path))["templates"] == metrics.snapshot()["templates"]
+    assert json.loads(path.read_text().splitlines()[0])["finish_reason"] == "stop"
+
+
+@pytest.mark.parametrize("overrides, finish_reason", [
+    ({"length": "fixed:5"}, "stop"),
+    ({"length": "fixed:200"}, "length"),
+    ({"error_rate": 1.0}, "error"),
+])
+def test_the_client_records_each_calls_finish_reason(monkeypatch, overrides, finish_reason):
+    monkeypatch.setenv("ASI_ONE_API_KEY", "offline")
+    template = f"test.{finish_reason}"
+    options = dict(latency="fixed:0", token_delay=0.0, length="fixed:5", error_rate=0.0,
+                   throttle_rate=0.0, rpm=0, responses=None, seed=1)
+    options.update(overrides)
+
+    async def scenario():
+        async with TestServer(build_app(argparse.Namespace(**options))) as server:
+            client = ASIClient(url=str(server.make_url("/v1/chat/completions")))
+            try:
+                await client.complete([{"role": "user", "content": "Symptoms: fever"}], 20, template=template)
+            except Exception:
+                pass
+            finally:
+                await client.close()
+
+    asyncio.run(scenario())
+    stats = llm_metrics.snapshot()["templates"][template]
+    assert stats["finish_reasons"] == {finish_reason: 1}
+    assert stats["max_tokens"] == 20
+    assert stats["completion_tokens"]["count"] == (0 if finish_reason == "error" else 1)
@@ -0,0 +1,84 @@
+import json
+import time
+
+import pytest
+
+from common.memory_index import MemoryIndex, build_index, watch_sources
+
+
+def write_memories(path, memories):
+    path.write_text(json.dumps({"memories": memories}))
+    return str(path)
+
+
+@pytest.fixture
+def sources(tmp_path):
+    return {
+        "medical": write_memories(tmp_path / "medical.json", [
+            {"patient_id": "patient_001", "category": "allergy", "entity": "penicillin"},
+            {"patient_id": "patient_002", "category": "condition", "entity": "asthma"},
+            {"patient_id": "patient_001", "category": "medication", "entity": "ibuprofen"},
+        ]),
+        "legal": write_memories(tmp_path / "legal.json", [
+            {"user_id": "patient_001", "patient_id": "patient_001", "category": "case", "entity": "lease"},
+            {"user_id": "client_007", "category": "case", "entity": "contract"},
+        ]),
+    }
+
+
+def test_lookup_returns_one_users_records_per_domain(tmp_path, sources):
+    stats = build_index(sources, str(tmp_path / "memories.idx"))
+    index = MemoryIndex(str(tmp_path / "memories.idx"))
+
+    assert stats["entries"] == index.entries == 4
+    assert [m["entity"] for m in index.lookup("medical", "patient_001")] == ["penicillin", "ibuprofen"]
+    # a record owned through both user_id and patient_id is indexed once per owner
+    assert [m["entity"] for m in index.lookup("legal", "patient_001")] == ["lease"]
+    assert index.lookup("legal", "client_007")[0]["entity"] == "contract"
+    assert index.lookup("legal", "patient_002") == []
+    assert index.lookup("financial", "patient_001") == []
+    index.close()
+
+
+def test_missing_and_unreadable_sources_are_skipped(tmp_path, sources):
+    sources["support"] = str(tmp_path / "missing.json")
+    (tmp_path / "broken.json").write_text('{"memories": [')
+    sources["financial"] = str(tmp_path / "broken.json")
+
+    assert build_index(sources, str(tmp_path / "memories.idx"))["entries"] == 4
+    index = MemoryIndex(str(tmp_path / "memories.idx"))
+    assert index.lookup("support", "patient_001") == []
+    index.close()
+
+
+def test_readers_pick_up_a_rebuilt_index(tmp_path, sources):
+    path = str(tmp_path / "memories.idx")
+    build_index(sources, path)
+    index = MemoryIndex(path)
+    assert index.lookup("medical", "patient_003") == []
+
+    write_memories(tmp_path / "medical.json", [{"patient_id": "patient_003", "category": "allergy", "entity": "latex"}])
+    build_index(sources, path)
+    assert [m["entity"] for m in index.lookup("medical", "patient_003")] == ["latex"]
+    assert index.lookup("medical", "patient_001") == []
+    index.close()
+
+
+def test_a_file_that_is_not_an_index_is_rejected(tmp_path):
+    (tmp_path / "memories.idx").write_bytes(b"JSON" + bytes(28))
+    with pytest.raises(ValueError, match="not a version 1 memory index"):
+        MemoryIndex(str(tmp_path / "memories.idx"))
+
+
+def test_watcher_rebuilds_when_a_source_changes(tmp_path, sources):
+    path = str(tmp_path / "memories.idx")
+    build_index(sources, path)
+    index = MemoryIndex(path)
+    watch_sources(sources, path, interval=0.02)
+
+    write_memories(tmp_path / "legal.json", [{"user_id": "client_008", "category": "case", "entity": "will"}])
+    deadline = time.monotonic() + 5
+    while not index.lookup("legal", "client_008") and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert [m["entity"] for m in index.lookup("legal", "client_008")] == ["will"]
+    index.close()
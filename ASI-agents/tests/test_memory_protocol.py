@@ -0,0 +1,104 @@
+import asyncio
+import json
+import logging
+
+from common.memory_protocol import MemoryBatcher, MemoryLookup, answer_batch
+from common.tracing import Tracer
+
+
+class FakeContext:
+    def __init__(self):
+        self.sent = []
+        self.logger = logging.getLogger("test")
+
+    async def send(self, destination, message):
+        self.sent.append((destination, message))
+
+
+def test_expired_lookup_ends_its_span_with_an_error(tmp_path):
+    tracer = Tracer(path=str(tmp_path / "spans.jsonl"), enabled=True)
+    batcher = MemoryBatcher(destination="agent1memory", pending_ttl=0.01)
+    ctx = FakeContext()
+
+    async def scenario():
+        lookup = tracer.start_span("memory lookup", "lawyer_agent")
+        await batcher.submit(ctx, "client_001", context="query", traceparent=lookup.traceparent, span=lookup)
+        await batcher.flush()
+        await asyncio.sleep(0.05)
+        await batcher.submit(ctx, "client_002")  # the next flush expires the first lookup
+        await batcher.flush()
+        return lookup
+
+    lookup = asyncio.run(scenario())
+    assert lookup.end_ns is not None and "TimeoutError" in lookup.error
+    assert batcher.pending_count == 1
+    tracer.flush()
+    exported = json.loads((tmp_path / "spans.jsonl").read_text())
+    span = exported["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert span["name"] == "memory lookup" and span["status"]["code"] == 2
+
+
+def test_uncapped_lookups_return_every_match_of_their_user():
+    memories = [{"user_id": "user_a", "category": "allergy", "context": f"record {i}"} for i in range(30)]
+    memories += [{"user_id": "user_b", "category": "allergy", "context": "other user"},
+                 {"user_id": "user_a", "category": "name", "context": "Alice"}]
+    lookups = [MemoryLookup(correlation_id="capped", user_id="user_a", categories=["allergy"], limit=10),
+               MemoryLookup(correlation_id="all", user_id="user_a", categories=["allergy"], limit=0)]
+    capped, uncapped = answer_batch(memories, lookups)
+    assert capped.memories == memories[:10]
+    assert uncapped.memories == memories[:30]  # the newest records reach the packer too
+
+
+def test_each_lookup_gets_its_own_user_categories_and_limit():
+    memories = [
+        {"user_id": "user_a", "category": "allergy", "context": "peanuts"},
+        {"user_id": "user_b", "category": "allergy", "context": "latex"},
+        {"category": "medication", "context": "single-user export, no owner"},
+        {"patient_id": "user_a", "category": "medication", "context": "ibuprofen"},
+        {"user_id": "user_a", "category": "condition", "context": "asthma"},
+        {"user_id": "user_a", "category": "allergy", "context": "penicillin"},
+    ]
+    lookups = [MemoryLookup(correlation_id="1", user_id="user_a", categories=["allergy"], limit=10),
+               MemoryLookup(correlation_id="2", user_id="user_a", categories=["allergy", "medication"], limit=2),
+               MemoryLookup(correlation_id="3", user_id="user_b", limit=0),
+               MemoryLookup(correlation_id="4", user_id="user_c", categories=["condition"], limit=10)]
+    results = {r.correlation_id: [m["context"] for m in r.memories] for r in answer_batch(memories, lookups)}
+    assert results == {
+        "1": ["peanuts", "penicillin"],
+        "2": ["peanuts", "single-user export, no owner"],
+        "3": ["latex", "single-user export, no owner"],
+        "4": [],
+    }
+    assert answer_batch(memories, []) == []
+
+
+def test_lookups_within_the_window_share_one_batch():
+    batcher = MemoryBatcher(destination="agent1memory", window=0.02, max_batch=32)
+    ctx = FakeContext()
+
+    async def scenario():
+        ids = [await batcher.submit(ctx, f"user_{i}", ["allergy"], context=i) for i in range(3)]
+        assert ctx.sent == []  # still inside the window
+        await asyncio.sleep(0.05)
+        return ids
+
+    ids = asyncio.run(scenario())
+    assert len(ctx.sent) == 1
+    destination, request = ctx.sent[0]
+    assert destination == "agent1memory"
+    assert [lookup.correlation_id for lookup in request.lookups] == ids
+    assert [batcher.complete(cid) for cid in ids] == [0, 1, 2]
+    assert batcher.complete(ids[0]) is None and batcher.pending_count == 0
+
+
+def test_a_full_batch_is_sent_without_waiting_for_the_window():
+    batcher = MemoryBatcher(destination="agent1memory", window=60, max_batch=4)
+    ctx = FakeContext()
+
+    async def scenario():
+        for i in range(9):
+            await batcher.submit(ctx, f"user_{i}")
+        return [len(request.lookups) for _, request in ctx.sent]
+
+    assert asyncio.run(scenario()) == [4, 4]
+    assert batcher.pending_count == 9
@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+import pytest
+
+from common.profiler import CPROFILE_SCOPE, check_token, render_flamegraph, run_profile
+
+
+def busy_handler(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        sum(range(1000))
+
+
+def test_token_is_required(monkeypatch):
+    monkeypatch.delenv("PROFILER_TOKEN", raising=False)
+    assert "disabled" in check_token("anything")
+    monkeypatch.setenv("PROFILER_TOKEN", "secret")
+    assert check_token("guess") == "invalid profiler token"
+    assert check_token("secret") is None
+
+
+def test_profile_samples_the_blocked_event_loop():
+    async def scenario():
+        async def handler():
+            await asyncio.sleep(0.05)
+            busy_handler(0.3)
+
+        task = asyncio.create_task(handler())
+        result = await run_profile(0.4, interval=0.005, cprofile=True)
+        await task
+        return result
+
+    result = asyncio.run(scenario())
+    busy = sum(int(line.rpartition(" ")[2]) for line in result["collapsed"].splitlines() if "busy_handler" in line)
+    assert result["samples"] > 20 and busy >= result["samples"] / 3
+    assert "busy_handler" in result["cprofile"]
+    assert "sample_stacks" not in result["cprofile"]  # the sampler leaves itself out
+    assert result["cprofile_scope"] == CPROFILE_SCOPE
+    assert "busy_handler" in render_flamegraph(result["collapsed"])
+
+
+def test_one_profile_at_a_time():
+    async def scenario():
+        first = asyncio.create_task(run_profile(0.2))
+        await asyncio.sleep(0.05)
+        with pytest.raises(RuntimeError):
+            await run_profile(0.1)
+        return await first
+
+    assert asyncio.run(scenario())["samples"] > 0
@@ -0,0 +1,83 @@
+from common import prompts
+from common.prompts import PrefixTracker, collapse_redundant, layout, pack_memories, split_prefix
+
+
+def memory(entity, category, context, confidence=0.9):
+    return {"entity": entity, "category": category, "context": context, "metadata": {"confidence": confidence}}
+
+
+def confidence(m):
+    return m["metadata"]["confidence"]
+
+
+def test_exact_copies_keep_their_most_valuable_record():
+    copies = [memory("Penicillin", "allergy", "Allergic to penicillin.", 0.7),
+              memory("penicillin ", "allergy", "allergic to  penicillin", 0.95)]
+    assert collapse_redundant(copies, confidence) == [copies[1]]
+
+
+def test_distinct_facts_about_one_entity_are_kept():
+    facts = [memory("Acme Corp", "legal_matter", "Acme Corp terminated the client's contract"),
+             memory("Acme Corp", "legal_matter", "Acme Corp owes the client two months of wages")]
+    assert collapse_redundant(facts, confidence) == facts
+
+
+def test_memories_without_an_entity_collapse_only_exact_copies():
+    allergies = [memory("", "allergy", "Allergic to peanuts", 0.6), memory(None, "allergy", "Allergic to peanuts.", 0.9),
+                 memory("", "allergy", "Allergic to latex"), memory("", "condition", "Allergic to latex")]
+    assert collapse_redundant(allergies, confidence) == allergies[1:]
+    packed = pack_memories(allergies, "medical", budget=300)
+    assert packed.collapsed == 1 and len(packed.memories) == 3
+
+
+INSTRUCTIONS = "You are a medical assistant AI. Analyze the symptoms in the user message."
+
+
+def test_layout_keeps_per_request_content_out_of_the_system_prefix():
+    messages = layout(INSTRUCTIONS, "Symptoms: fever", "", "Patient Allergies: penicillin")
+    assert messages == [
+        {"role": "system", "content": INSTRUCTIONS},
+        {"role": "user", "content": "Symptoms: fever\n\nPatient Allergies: penicillin"},
+    ]
+
+
+def test_the_prefix_hash_ignores_the_last_message_only():
+    first, prefix_bytes, prompt_bytes = split_prefix(layout(INSTRUCTIONS, "Symptoms: fièvre"))
+    second, _, _ = split_prefix(layout(INSTRUCTIONS, "Symptoms: rash and itching"))
+    assert first == second
+    assert (prefix_bytes, prompt_bytes) == (len(INSTRUCTIONS), len(INSTRUCTIONS) + len("Symptoms: fièvre".encode()))
+    assert split_prefix(layout(INSTRUCTIONS + " ", "Symptoms: fever"))[0] != first
+    # the role is part of the prefix: the same text as a user turn is another prefix
+    assert split_prefix([{"role": "user", "content": INSTRUCTIONS}, {"role": "user", "content": "x"}])[0] != first
+
+
+def test_repeated_prefixes_count_as_cacheable_bytes(capsys):
+    tracker = PrefixTracker()
+    for symptoms in ("fever", "cough", "rash"):
+        tracker.observe("medical.symptoms", layout(INSTRUCTIONS, f"Symptoms: {symptoms}"))
+    tracker.observe("", layout("Summarise.", "text"))
+
+    stats = tracker.snapshot()["medical.symptoms"]
+    assert (stats["calls"], stats["variants"]) == (3, 1)
+    assert stats["cacheable_bytes"] == 2 * len(INSTRUCTIONS)
+    assert stats["cacheable_share"] == round(stats["cacheable_bytes"] / stats["prompt_bytes"], 4)
+    assert tracker.snapshot()["untagged"]["calls"] == 1
+    assert capsys.readouterr().out == ""
+
+
+def test_a_changing_prefix_warns_as_variants_pile_up(capsys, monkeypatch):
+    monkeypatch.setattr(prompts, "MAX_PREFIX_VARIANTS", 4)
+    tracker = PrefixTracker()
+    for patient in range(12):
+        # a per-request detail leaked into the instructions
+        tracker.observe("legal.analysis", layout(f"{INSTRUCTIONS} Client: client_{patient:03d}", "Case: lease"))
+    tracker.observe("legal.analysis", layout(f"{INSTRUCTIONS} Client: client_000", "Case: deposit"))
+
+    stats = tracker.snapshot()["legal.analysis"]
+    assert stats["variants"] == 12  # 4 remembered, 8 counted as overflow
+    assert len(stats["prefixes"]) == 4 and stats["prefixes"][split_prefix(
+        layout(f"{INSTRUCTIONS} Client: client_000", ""))[0]] == 2
+    warnings = capsys.readouterr().out.splitlines()
+    assert [line.split("(")[1].split(" ")[0] for line in warnings] == ["2", "10"]
+    assert all("legal.analysis" in line for line in warnings)
+
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+
+from common.scheduling import PriorityScheduler, ServiceBusy
+
+
+def make_job(name, order, release=None):
+    async def job():
+        order.append(name)
+        if release is not None:
+            await release.wait()
+    return job
+
+
+class FakeContext:
+    def __init__(self):
+        self.sent = []
+        self.logger = logging.getLogger("test")
+
+    async def send(self, destination, message):
+        self.sent.append((destination, message))
+
+
+def full_scheduler(release):
+    """One running job and four waiting: a queue exactly at max_queue=4"""
+    scheduler = PriorityScheduler("test", max_concurrency=1, reserved_urgent=0, aging_interval=60, max_queue=4)
+    for i in range(5):
+        scheduler.submit("normal", make_job(f"normal-{i}", [], release))
+    return scheduler
+
+
+async def drain(scheduler):
+    while scheduler.running or scheduler.queue_depth:
+        await asyncio.sleep(0.005)
+
+
+def test_aged_routine_work_never_outranks_new_urgent_work():
+    async def scenario():
+        scheduler = PriorityScheduler("test", max_concurrency=1, reserved_urgent=0, aging_interval=0.01)
+        order, release = [], asyncio.Event()
+        scheduler.submit("normal", make_job("blocker", order, release))
+        scheduler.submit("low", make_job("low", order))
+        await asyncio.sleep(0.1)  # ten aging intervals: far past the urgent level without the clamp
+        scheduler.submit("emergency", make_job("emergency", order))
+        release.set()
+        await drain(scheduler)
+        return order
+
+    assert asyncio.run(scenario()) == ["blocker", "emergency", "low"]
+
+
+def test_aging_lets_old_low_work_overtake_new_high_work():
+    async def scenario(aging_interval):
+        scheduler = PriorityScheduler("test", max_concurrency=1, reserved_urgent=0, aging_interval=aging_interval)
+        order, release = [], asyncio.Event()
+        scheduler.submit("normal", make_job("blocker", order, release))
+        scheduler.submit("low", make_job("low", order))
+        await asyncio.sleep(0.1)
+        scheduler.submit("high", make_job("high", order))
+        release.set()
+        await drain(scheduler)
+        return order
+
+    assert asyncio.run(scenario(0.01)) == ["blocker", "low", "high"]
+    assert asyncio.run(scenario(60)) == ["blocker", "high", "low"]
+
+
+def test_reserved_capacity_only_runs_urgent_work():
+    async def scenario():
+        scheduler = PriorityScheduler("test", max_concurrency=2, reserved_urgent=1, aging_interval=60)
+        order, release = [], asyncio.Event()
+        scheduler.submit("normal", make_job("normal-1", order, release))
+        scheduler.submit("normal", make_job("normal-2", order, release))
+        await asyncio.sleep(0)
+        assert (scheduler.running, scheduler.queue_depth) == (1, 1)  # the reserved slot stays free
+
+        scheduler.submit("urgent", make_job("urgent", order, release))
+        await asyncio.sleep(0)
+        assert (scheduler.running, scheduler.queue_depth) == (2, 1)
+        release.set()
+        await drain(scheduler)
+        return order
+
+    assert asyncio.run(scenario()) == ["normal-1", "urgent", "normal-2"]
+
+
+def test_a_full_queue_rejects_routine_work_with_service_busy():
+    async def scenario():
+        release, ctx = asyncio.Event(), FakeContext()
+        scheduler = full_scheduler(release)
+        assert (scheduler.running, scheduler.queue_depth) == (1, 4)
+
+        admitted = await scheduler.admit_or_reject(ctx, "agent1sender", "user_1", "high")
+        release.set()
+        await drain(scheduler)
+        return admitted, ctx.sent, scheduler.snapshot()
+
+    admitted, sent, snapshot = asyncio.run(scenario())
+    assert not admitted
+    [(destination, busy)] = sent
+    assert destination == "agent1sender"
+    assert isinstance(busy, ServiceBusy)
+    assert (busy.user_id, busy.queue_depth) == ("user_1", 4)
+    assert busy.retry_after == 20.0  # 4 waiting x 5s assumed service time / 1 slot
+    assert snapshot["high"]["rejected"] == 1
+    assert snapshot["normal"]["rejected"] == 0
+
+
+def test_urgent_work_is_admitted_into_the_overflow_headroom():
+    async def scenario():
+        release, ctx = asyncio.Event(), FakeContext()
+        scheduler = full_scheduler(release)
+        admitted = await scheduler.admit_or_reject(ctx, "agent1sender", "user_1", "emergency")
+        # max_queue // 4 = one extra urgent slot: the next urgent query is turned away
+        scheduler.submit("emergency", make_job("emergency", [], release))
+        overflow = await scheduler.admit_or_reject(ctx, "agent1sender", "user_2", "urgent")
+        release.set()
+        await drain(scheduler)
+        return admitted, overflow, ctx.sent, scheduler.snapshot()
+
+    admitted, overflow, sent, snapshot = asyncio.run(scenario())
+    assert admitted and not overflow
+    assert [busy.user_id for _, busy in sent] == ["user_2"]
+    assert sent[0][1].queue_depth == 5
+    assert snapshot["urgent"]["rejected"] == 1
+    assert snapshot["urgent"]["completed"] == 1
+
+
+def test_backlog_counts_against_the_queue_limit():
+    scheduler = PriorityScheduler("test", max_concurrency=1, reserved_urgent=0, aging_interval=60, max_queue=4)
+    assert scheduler.admit("normal", backlog=3)
+    assert not scheduler.admit("normal", backlog=4)
+    assert scheduler.admit("urgent", backlog=4)
+    assert scheduler.retry_after(backlog=4) == 20.0
+    assert scheduler.retry_after() == 1.0  # an empty queue still asks for a short pause
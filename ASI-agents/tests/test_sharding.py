@@ -0,0 +1,82 @@
+import json
+import os
+import random
+
+from common.memory_protocol import MemoryLookup, answer_batch
+from common.sharding import HashRing, ShardedMemories, partition_memories, plan_moves, shard_file
+
+
+def sample_memories(users=50, per_user=6, seed=7):
+    rng = random.Random(seed)
+    categories = ["allergy", "medication", "condition", "name"]
+    memories = []
+    for i in range(users * per_user):
+        memories.append({"id": f"mem_{i}", "user_id": f"user_{rng.randrange(users):03d}",
+                         "category": rng.choice(categories), "context": f"record {i}"})
+        if i % 40 == 0:  # single-user export records without an owner
+            memories.append({"id": f"shared_{i}", "category": rng.choice(categories), "context": "no owner"})
+    return memories
+
+
+def lookups_for(users):
+    lookups = []
+    for user in users:
+        lookups.append(MemoryLookup(correlation_id=f"{user}-all", user_id=user, limit=0))
+        lookups.append(MemoryLookup(correlation_id=f"{user}-meds", user_id=user,
+                                    categories=["medication", "allergy"], limit=3 + sum(map(ord, user)) % 4))
+    return lookups
+
+
+def test_owning_shard_answers_like_the_unsharded_store():
+    memories = sample_memories()
+    ring = HashRing.with_shards(4)
+    shards = partition_memories(memories, ring)
+    users = sorted({m["user_id"] for m in memories if "user_id" in m}) + ["user_without_records"]
+
+    expected = answer_batch(memories, lookups_for(users))
+    sharded = [result for user in users
+               for result in answer_batch(shards[ring.node_for(user)], lookups_for([user]))]
+    assert [r.model_dump() for r in sharded] == [r.model_dump() for r in expected]
+    assert all(any(m["context"] == "no owner" for m in records) for records in shards.values())
+
+
+def test_adding_a_shard_moves_about_its_share_of_users():
+    users = [f"user_{i}" for i in range(20_000)]
+    for count in (2, 4, 8):
+        old, new = HashRing.with_shards(count), HashRing.with_shards(count + 1)
+        moves = plan_moves(users, old, new)
+        assert abs(len(moves) / len(users) - 1 / (count + 1)) < 0.05
+        # Users only move onto the new shard, never between existing ones
+        assert {after for _, after in moves.values()} == {f"shard-{count}"}
+
+
+def write_export(path, memories):
+    with open(path, "w") as f:
+        json.dump({"memories": memories}, f)
+
+
+def test_shards_pick_up_new_memories_without_a_restart(tmp_path):
+    path = str(tmp_path / "case_memories.json")
+    memories = sample_memories(users=10)
+    write_export(path, memories)
+    ring = HashRing.with_shards(3)
+    sharded = ShardedMemories(path, ring)
+    node = ring.node_for("user_new")
+    before = len(sharded.records(node))
+    assert sharded.records(node) is sharded.records(node)  # unchanged file, no repartition
+
+    write_export(path, memories + [{"user_id": "user_new", "category": "allergy", "context": "latex"}])
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 10**9,) * 2)
+    records = sharded.records(node)
+    assert len(records) == before + 1 and records[-1]["user_id"] == "user_new"
+
+
+def test_shards_serve_the_rebalancing_tool_files(tmp_path):
+    path = str(tmp_path / "case_memories.json")
+    memories = sample_memories(users=10)
+    ring = HashRing.with_shards(2)
+    for node, records in partition_memories(memories, ring).items():
+        write_export(shard_file(path, node, str(tmp_path)), records)
+    sharded = ShardedMemories(path, ring, shard_dir=str(tmp_path))
+    for node, records in partition_memories(memories, ring).items():
+        assert sharded.records(node) == records
@@ -0,0 +1,44 @@
+import json
+import time
+
+from common.tracing import Tracer, read_spans
+
+
+def test_ending_spans_only_buffers_them(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer(path=str(path), enabled=True, flush_interval=60)
+    with tracer.span("handle LegalQuery", "lawyer_agent") as root:
+        with tracer.span("memory lookup", None):
+            pass
+    assert not path.exists()  # nothing written on the caller's thread
+
+    tracer.flush()
+    spans = read_spans(str(path))[root.trace_id]
+    assert [s["name"] for s in spans] == ["memory lookup", "handle LegalQuery"]
+    assert spans[0]["parentSpanId"] == root.span_id and spans[0]["service"] == "lawyer_agent"
+
+
+def test_writer_thread_flushes_full_buffers_and_on_interval(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer(path=str(path), enabled=True, flush_interval=60, flush_spans=3)
+    for i in range(3):
+        tracer.start_span(f"step {i}", "client_agent").end()
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline and not (path.exists() and len(path.read_text().splitlines()) == 3):
+        time.sleep(0.01)
+    assert len(path.read_text().splitlines()) == 3
+
+    tracer.flush_interval = 0.05
+    tracer._wake.set()  # pick up the shorter interval
+    tracer.start_span("late", "client_agent").end()
+    time.sleep(0.3)
+    names = [json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["name"]
+             for line in path.read_text().splitlines()]
+    assert names == ["step 0", "step 1", "step 2", "late"]
+
+
+def test_unsampled_spans_are_not_exported(tmp_path):
+    tracer = Tracer(path=str(tmp_path / "spans.jsonl"), enabled=True, sample_rate=0.0)
+    tracer.start_span("consultation", "client_agent").end()
+    tracer.flush()
+    assert not (tmp_path / "spans.jsonl").exists()
@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+from common.watchdog import LoopWatchdog
+
+
+def blocking_parse(seconds):
+    time.sleep(seconds)  # stands in for a synchronous json.load or HTTP call
+
+
+def watch(*blocks, threshold_ms=100):
+    """Run a watchdog while the loop is blocked for each of `blocks` seconds in turn"""
+    async def scenario():
+        monitor = LoopWatchdog(interval=0.02, threshold_ms=threshold_ms)
+        monitor.start()
+        for seconds in blocks:
+            await asyncio.sleep(0.05)
+            blocking_parse(seconds)
+        await asyncio.sleep(0.1)  # the heartbeat reports the last stall when it wakes up
+        return monitor
+
+    return asyncio.run(scenario())
+
+
+def test_a_block_above_the_threshold_names_the_blocking_call():
+    report = watch(0.3).report()
+    assert report["stalls"] == 1
+    [site] = report["sites"]
+    assert site["site"].startswith("tests/test_watchdog.py:") and site["site"].endswith("in blocking_parse")
+    assert site["blocked_in"] == site["site"]
+    assert site["count"] == 1 and 250 <= site["max_ms"] < 1000
+    assert site["stack"][-2].endswith("in watch.<locals>.scenario")  # the coroutine that made the call
+    assert report["lag_ms"]["max"] >= 250
+
+
+def test_blocks_below_the_threshold_are_lag_but_not_stalls():
+    monitor = watch(0.05, 0.05)
+    report = monitor.report()
+    assert report["stalls"] == 0 and report["sites"] == []
+    assert report["lag_ms"]["max"] >= 40 and monitor.worst >= 0.04
+
+
+def test_repeated_stalls_add_up_per_call_site():
+    report = watch(0.15, 0.25, threshold_ms=50).report()
+    [site] = report["sites"]
+    assert (report["stalls"], site["count"]) == (2, 2)
+    assert site["total_ms"] >= 350 and site["max_ms"] >= 200